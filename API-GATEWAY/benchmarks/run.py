@@ -0,0 +1,316 @@
+# API-GATEWAY/benchmarks/run.py
+# Benchmark del gateway senza rete: app in-process, servizi simulati e generatore di carico asyncio
+#
+# Uso (dalla cartella API-GATEWAY):
+#   python -m benchmarks.run --duration 20 --users 50 --output results.json
+#   python -m benchmarks.run --output new.json --compare results.json
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Valori di default per un benchmark riproducibile; le variabili già impostate hanno la precedenza.
+# Il rate limiting è disattivato perché tutti gli utenti virtuali condividono pochi IP.
+BENCHMARK_ENV = {
+    "RATE_LIMIT_ENABLED": "false",
+    "TRACE_EXPORTER": "none",
+}
+for _name, _value in BENCHMARK_ENV.items():
+    os.environ.setdefault(_name, _value)
+
+import httpx  # noqa: E402
+
+from .stubs import StubProfile, build_stubs  # noqa: E402
+
+SERVICES = ("auth", "users", "booking", "catalog", "payment", "notification")
+
+# Peso relativo di ciascuno scenario nel mix di traffico
+DEFAULT_MIX = "browse_catalog:5,dashboard:3,create_booking:1,login:1"
+
+
+class Recorder:
+    """Raccoglie latenze ed esiti per scenario."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+        self.failures: Dict[str, int] = {}
+
+    def record(self, scenario: str, latency: float, status: int, ok: bool) -> None:
+        self.latencies.setdefault(scenario, []).append(latency)
+        counts = self.statuses.setdefault(scenario, {})
+        counts[str(status)] = counts.get(str(status), 0) + 1
+        if not ok:
+            self.failures[scenario] = self.failures.get(scenario, 0) + 1
+
+    def reset(self) -> None:
+        self.__init__()
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentile con interpolazione lineare su valori già ordinati."""
+    if not values:
+        return 0.0
+    position = (len(values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class VirtualUser:
+    """Utente simulato a ciclo chiuso: esegue uno scenario alla volta, con un eventuale tempo di pausa."""
+
+    def __init__(self, index: int, client: httpx.AsyncClient, recorder: Recorder):
+        self.index = index
+        self.client = client
+        self.recorder = recorder
+        self.email = f"bench{index}@example.com"
+        self.token: Optional[str] = None
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"} if self.token else {}
+
+    async def _timed(self, scenario: str, call: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = await call()
+        except httpx.HTTPError:
+            self.recorder.record(scenario, time.perf_counter() - start, 0, False)
+            raise
+        self.recorder.record(scenario, time.perf_counter() - start, response.status_code, response.status_code < 400)
+        return response
+
+    async def login(self) -> None:
+        response = await self._timed("login", lambda: self.client.post(
+            "/api/v1/auth/login", json={"email": self.email, "password": "password"}
+        ))
+        if response.status_code == 200:
+            self.token = response.json()["access_token"]
+
+    async def browse_catalog(self) -> None:
+        await self._timed("browse_catalog", lambda: self.client.get(
+            "/api/v1/catalog/services", headers=self.headers
+        ))
+        await self._timed("browse_catalog", lambda: self.client.get(
+            f"/api/v1/catalog/services/{random.randint(1, 20)}", headers=self.headers
+        ))
+
+    async def create_booking(self) -> None:
+        day = random.randint(1, 28)
+        await self._timed("create_booking", lambda: self.client.post(
+            "/api/v1/bookings/complete",
+            json={
+                "professional_id": random.randint(1, 50),
+                "service_id": random.randint(1, 20),
+                "service_name": "Visita",
+                "date_time": f"2030-02-{day:02d}T{random.randint(8, 18):02d}:00:00",
+                "amount": 80,
+            },
+            headers={**self.headers, "Idempotency-Key": str(uuid.uuid4())},
+        ))
+
+    async def dashboard(self) -> None:
+        await self._timed("dashboard", lambda: self.client.get("/api/v1/me/dashboard", headers=self.headers))
+
+    async def run(self, mix: List[Tuple[str, float]], stop_at: float, think_time: float) -> None:
+        names = [name for name, _ in mix]
+        weights = [weight for _, weight in mix]
+        while time.monotonic() < stop_at:
+            try:
+                if self.token is None:
+                    await self.login()
+                    continue
+                await getattr(self, random.choices(names, weights)[0])()
+            except httpx.HTTPError:
+                pass
+            if think_time:
+                await asyncio.sleep(random.expovariate(1 / think_time))
+
+
+def parse_mix(value: str) -> List[Tuple[str, float]]:
+    mix = []
+    for pair in value.split(","):
+        name, _, weight = pair.partition(":")
+        name = name.strip()
+        if not hasattr(VirtualUser, name) or name in ("run", "headers"):
+            raise SystemExit(f"Scenario sconosciuto: {name}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    from src.main import app
+
+    profile = StubProfile(args.latency, args.jitter, args.error_rate, args.payload_bytes)
+    profiles = {name: profile for name in SERVICES}
+    stubs = build_stubs(profiles)
+    app.state.upstream_transports = {name: httpx.ASGITransport(app=stub) for name, stub in stubs.items()}
+
+    random.seed(args.seed)
+    mix = parse_mix(args.mix)
+    recorder = Recorder()
+
+    async with app.router.lifespan_context(app):
+        clients = [
+            # Ogni gruppo di utenti ha un proprio indirizzo di origine, come client distinti
+            httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app, client=(f"10.0.{i // 256}.{i % 256}", 40000 + i)),
+                base_url="http://gateway",
+                timeout=args.timeout,
+            )
+            for i in range(args.users)
+        ]
+        users = [VirtualUser(i, clients[i], recorder) for i in range(args.users)]
+        try:
+            if args.warmup > 0:
+                stop_at = time.monotonic() + args.warmup
+                await asyncio.gather(*(user.run(mix, stop_at, args.think_time) for user in users))
+                recorder.reset()
+
+            cpu_start = time.process_time()
+            wall_start = time.perf_counter()
+            stop_at = time.monotonic() + args.duration
+            await asyncio.gather(*(user.run(mix, stop_at, args.think_time) for user in users))
+            elapsed = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+        finally:
+            for client in clients:
+                await client.aclose()
+
+    scenarios = {}
+    total = 0
+    for name in sorted(recorder.latencies):
+        values = sorted(recorder.latencies[name])
+        total += len(values)
+        scenarios[name] = {
+            "requests": len(values),
+            "rps": round(len(values) / elapsed, 2),
+            "errors": recorder.failures.get(name, 0),
+            "statuses": recorder.statuses[name],
+            "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3),
+        }
+
+    all_values = sorted(value for values in recorder.latencies.values() for value in values)
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": {
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "users": args.users,
+            "think_time": args.think_time,
+            "mix": args.mix,
+            "seed": args.seed,
+            "stub": profile.to_dict(),
+        },
+        "total": {
+            "requests": total,
+            "rps": round(total / elapsed, 2),
+            "errors": sum(recorder.failures.values()),
+            "p50_ms": round(percentile(all_values, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(all_values, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(all_values, 0.99) * 1000, 3),
+            # Include anche il tempo CPU dei servizi simulati e del generatore di carico
+            "cpu_ms_per_request": round(cpu / total * 1000, 4) if total else None,
+        },
+        "scenarios": scenarios,
+        "upstream_requests": {name: stub.requests for name, stub in stubs.items()},
+    }
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    header = f"{'scenario':<16}{'requests':>10}{'rps':>10}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    rows = list(results["scenarios"].items()) + [("TOTAL", results["total"])]
+    for name, row in rows:
+        print(
+            f"{name:<16}{row['requests']:>10}{row['rps']:>10.1f}{row['errors']:>8}"
+            f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}"
+        )
+    print(f"CPU per richiesta: {results['total']['cpu_ms_per_request']} ms")
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> bool:
+    """Stampa le variazioni rispetto a un risultato precedente; False se c'è una regressione oltre la soglia."""
+    print(f"\nConfronto con {baseline.get('commit') or 'baseline'} (soglia {threshold:.0%})")
+    regressed = False
+    rows = [("TOTAL", results["total"], baseline.get("total", {}))] + [
+        (name, row, baseline.get("scenarios", {}).get(name, {})) for name, row in results["scenarios"].items()
+    ]
+    # Per rps un valore più alto è migliore, per le altre metriche il contrario
+    metrics = (("rps", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False), ("cpu_ms_per_request", False))
+    for name, current, previous in rows:
+        for metric, higher_is_better in metrics:
+            if not current.get(metric) or not previous.get(metric):
+                continue
+            change = (current[metric] - previous[metric]) / previous[metric]
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                flag = "  REGRESSIONE"
+                regressed = True
+            print(f"  {name:<16}{metric:<20}{previous[metric]:>10}  ->{current[metric]:>10}  ({change:+.1%}){flag}")
+    return not regressed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark del gateway con servizi simulati, senza rete")
+    parser.add_argument("--duration", type=float, default=20.0, help="durata della misura in secondi")
+    parser.add_argument("--warmup", type=float, default=3.0, help="secondi di riscaldamento esclusi dai risultati")
+    parser.add_argument("--users", type=int, default=50, help="utenti virtuali concorrenti")
+    parser.add_argument("--think-time", type=float, default=0.0, help="pausa media tra due scenari (secondi)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenari e pesi, es. browse_catalog:5,dashboard:3")
+    parser.add_argument("--latency", type=float, default=5.0, help="latenza media dei servizi simulati (ms)")
+    parser.add_argument("--jitter", type=float, default=0.5, help="variazione relativa della latenza")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="frazione di risposte 500 dei servizi simulati")
+    parser.add_argument("--payload-bytes", type=int, default=2048, help="dimensione indicativa delle liste restituite")
+    parser.add_argument("--timeout", type=float, default=30.0, help="timeout delle richieste al gateway")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="file JSON in cui salvare i risultati")
+    parser.add_argument("--compare", help="file JSON di un'esecuzione precedente da confrontare")
+    parser.add_argument("--threshold", type=float, default=0.10, help="peggioramento relativo considerato regressione")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run_benchmark(args))
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Risultati salvati in {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+# API-GATEWAY/benchmarks/stubs.py
+# Microservizi simulati (app ASGI minimali) con latenza, tasso di errore e dimensione delle risposte configurabili
+
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+
+class StubProfile:
+    """Comportamento di un servizio simulato."""
+
+    def __init__(self, latency_ms: float = 5.0, jitter: float = 0.5, error_rate: float = 0.0, payload_bytes: int = 2048):
+        self.latency_ms = latency_ms
+        # Variazione relativa della latenza: 0.5 significa ±50% attorno al valore medio
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.payload_bytes = payload_bytes
+
+    def delay(self) -> float:
+        spread = self.latency_ms * self.jitter
+        return max(0.0, random.uniform(self.latency_ms - spread, self.latency_ms + spread)) / 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "latency_ms": self.latency_ms,
+            "jitter": self.jitter,
+            "error_rate": self.error_rate,
+            "payload_bytes": self.payload_bytes,
+        }
+
+
+def _items(count_bytes: int, make: Callable[[int], Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Genera una lista di elementi la cui serializzazione occupa circa `count_bytes` byte."""
+    sample = len(json.dumps(make(0))) + 1
+    return [make(i) for i in range(max(1, count_bytes // sample))]
+
+
+Handler = Callable[[Dict[str, Any], "re.Match"], Tuple[int, bytes]]
+
+
+class StubService:
+    """App ASGI che risponde alle route note di un microservizio con corpi precalcolati.
+
+    Le risposte vengono serializzate una sola volta, così il costo dei servizi simulati
+    resta trascurabile rispetto a quello del gateway misurato.
+    """
+
+    def __init__(self, name: str, profile: StubProfile, routes: List[Tuple[str, str, Any]]):
+        self.name = name
+        self.profile = profile
+        self.requests = 0
+        self.errors = 0
+        self._routes = []
+        for method, pattern, body in routes:
+            handler = body if callable(body) else self._static(body)
+            self._routes.append((method, re.compile(f"^{pattern}$"), handler))
+
+    @staticmethod
+    def _static(body: Any) -> Handler:
+        encoded = json.dumps(body).encode()
+        return lambda request, match: (200, encoded)
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return
+        self.requests += 1
+        # Il corpo della richiesta va comunque consumato
+        request_body = b""
+        while True:
+            message = await receive()
+            request_body += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+
+        await asyncio.sleep(self.profile.delay())
+
+        status, body = 404, b'{"detail":"Not Found"}'
+        if random.random() < self.profile.error_rate:
+            self.errors += 1
+            status, body = 500, b'{"detail":"Errore simulato"}'
+        else:
+            for method, pattern, handler in self._routes:
+                match = pattern.match(scope["path"])
+                if match and method == scope["method"]:
+                    status, body = handler({"scope": scope, "body": request_body}, match)
+                    break
+            else:
+                # Sonda del monitor di salute
+                if scope["path"].endswith("/status"):
+                    status, body = 200, b'{"status":"online"}'
+
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def build_stubs(profiles: Dict[str, StubProfile]) -> Dict[str, StubService]:
+    """Crea i servizi simulati per tutti i microservizi chiamati dal gateway."""
+    # Chiave di firma dei token del servizio Auth simulato, pubblicata come JWKS
+    signing_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = RSAAlgorithm.to_jwk(signing_key.public_key(), as_dict=True)
+    jwk.update({"kid": "bench", "alg": "RS256", "use": "sig"})
+
+    def login(request, match) -> Tuple[int, bytes]:
+        try:
+            email = json.loads(request["body"] or b"{}").get("email", "bench@example.com")
+        except ValueError:
+            email = "bench@example.com"
+        user_id = abs(hash(email)) % 100000 + 1
+        token = jwt.encode(
+            {"sub": email, "id": user_id, "role": "client", "exp": int(time.time()) + 3600},
+            signing_key, algorithm="RS256", headers={"kid": "bench"},
+        )
+        return 200, json.dumps({"access_token": token, "token_type": "bearer"}).encode()
+
+    booking_ids = iter(range(1, 10 ** 9))
+
+    def create_booking(request, match) -> Tuple[int, bytes]:
+        booking = json.loads(request["body"] or b"{}")
+        booking.update({"id": next(booking_ids), "status": "pending"})
+        return 200, json.dumps(booking).encode()
+
+    def size(name: str) -> int:
+        return profiles[name].payload_bytes
+
+    catalog_service = lambda i: {"id": i, "name": f"Servizio {i}", "price": 50 + i, "duration": 30, "specialty": "Cardiologia"}
+    booking = lambda i: {"id": i, "client_id": 1, "professional_id": 2, "service_id": 3,
+                         "date_time": f"2030-01-{1 + i % 28:02d}T10:00:00", "status": "confirmed"}
+    notification = lambda i: {"id": i, "recipient_id": 1, "type": "booking", "title": "Promemoria",
+                              "message": "Hai un appuntamento domani", "is_read": False}
+    health_record = lambda i: {"id": i, "user_id": 1, "title": f"Referto {i}", "record_type": "report"}
+
+    routes = {
+        "auth": [
+            ("POST", "/api/v1/auth/login", login),
+            ("GET", "/api/v1/auth/revocations", {"revocations": [], "last_seq": 0, "more": False}),
+            ("GET", "/.well-known/jwks.json", {"keys": [jwk]}),
+        ],
+        "catalog": [
+            ("GET", "/api/v1/categories", _items(size("catalog") // 4, lambda i: {"id": i, "name": f"Categoria {i}"})),
+            ("GET", "/api/v1/specialties", _items(size("catalog") // 4, lambda i: {"id": i, "name": f"Specialità {i}"})),
+            ("GET", "/api/v1/services", _items(size("catalog"), catalog_service)),
+            ("GET", r"/api/v1/services/\d+", catalog_service(1)),
+        ],
+        "booking": [
+            ("GET", r"/api/v1/availability/\d+/check", {"is_available": True}),
+            ("POST", "/api/v1/bookings/", create_booking),
+            ("GET", r"/api/v1/bookings/user/\d+", _items(size("booking"), booking)),
+            ("GET", r"/api/v1/bookings/\d+", booking(1)),
+            ("DELETE", r"/api/v1/bookings/\d+", {"message": "Prenotazione eliminata"}),
+        ],
+        "payment": [
+            ("POST", "/api/v1/stripe/create-payment-intent", {"id": "pi_bench", "client_secret": "pi_bench_secret", "status": "requires_confirmation"}),
+        ],
+        "notification": [
+            ("POST", "/api/v1/notifications", {"message": "Notification created successfully"}),
+            ("GET", r"/api/v1/notifications/user/\d+/count", {"unread_count": 3}),
+            ("GET", r"/api/v1/notifications/user/\d+", _items(size("notification"), notification)),
+        ],
+        "users": [
+            ("GET", r"/api/v1/users/\d+", {"id": 1, "email": "bench@example.com", "first_name": "Mario", "last_name": "Rossi"}),
+            ("GET", r"/api/v1/health-records/user/\d+", _items(size("users"), health_record)),
+        ],
+    }
+    return {name: StubService(name, profiles[name], service_routes) for name, service_routes in routes.items()}
@@ -1,10 +1,18 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-import httpx
 from typing import Dict, Any
+from healthmatch_common.token_verifier import TokenError, token_verifier
+from .. import config
+from .token_cache import VerifiedTokenCache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
-AUTH_SERVICE_URL = "http://auth-service:8001/api/v1"
+
+# Token già verificati, validi fino al loro claim exp
+token_cache = VerifiedTokenCache(max_size=config.JWT_CACHE_SIZE)
+
+def decode_token(token: str) -> Dict[str, Any]:
+    """Verifica localmente firma e scadenza del token con le chiavi JWKS già in cache."""
+    return token_verifier.decode(token)
 
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
     """Verifica il token JWT e restituisce l'utente corrente."""
@@ -14,23 +22,23 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    user_data = token_cache.get(token)
+    if user_data is not None:
+        # Anche i token in cache vanno confrontati con le revoche, sincronizzate da Auth in background
+        try:
+            await token_verifier.check_revoked(user_data)
+        except TokenError:
+            token_cache.invalidate(token)
+            raise credentials_exception
+        return user_data
+    
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{AUTH_SERVICE_URL}/auth/verify",
-                json={"token": token}
-            )
-            
-            if response.status_code != 200:
-                raise credentials_exception
-                
-            user_data = response.json()
-            if not user_data:
-                raise credentials_exception
-                
-            return user_data
-    except httpx.RequestError:
-        raise HTTPException(status_code=503, detail="Servizio di autenticazione non disponibile")
+        user_data = await token_verifier.verify(token)
+    except TokenError:
+        raise credentials_exception
+    
+    token_cache.put(token, user_data, float(user_data["exp"]))
+    return user_data
 
 async def get_current_active_user(current_user: Dict[str, Any] = Depends(get_current_user)) -> Dict[str, Any]:
     """Verifica che l'utente sia attivo."""
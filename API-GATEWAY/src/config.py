@@ -0,0 +1,149 @@
+import os
+
+# Configurazione centralizzata del gateway, letta dalle variabili d'ambiente
+
+def parse_mapping(value: str, cast=str) -> dict:
+    """Converte una stringa "chiave:valore,chiave:valore" in un dizionario."""
+    return {
+        key.strip(): cast(item.strip())
+        for key, item in (pair.split(":", 1) for pair in value.split(",") if ":" in pair)
+    }
+
+# URL base dei microservizi
+AUTH_SERVICE_URL = os.getenv("AUTH_SERVICE_URL", "http://auth-service:8001/api/v1")
+USERS_SERVICE_URL = os.getenv("USERS_SERVICE_URL", "http://users-service:8006/api/v1")
+BOOKING_SERVICE_URL = os.getenv("BOOKING_SERVICE_URL", "http://booking-service:8002/api/v1")
+CATALOG_SERVICE_URL = os.getenv("CATALOG_SERVICE_URL", "http://catalog-service:8003/api/v1")
+PAYMENT_SERVICE_URL = os.getenv("PAYMENT_SERVICE_URL", "http://payment-service:8005/api/v1")
+NOTIFICATION_SERVICE_URL = os.getenv("NOTIFICATION_SERVICE_URL", "http://notification-service:8004/api/v1")
+
+# Mappa nome servizio -> URL base, usata per creare i pool di connessioni
+SERVICE_URLS = {
+    "auth": AUTH_SERVICE_URL,
+    "users": USERS_SERVICE_URL,
+    "booking": BOOKING_SERVICE_URL,
+    "catalog": CATALOG_SERVICE_URL,
+    "payment": PAYMENT_SERVICE_URL,
+    "notification": NOTIFICATION_SERVICE_URL,
+}
+
+# Pool di connessioni verso i microservizi (uno per servizio)
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "true").lower() in ("1", "true", "yes")
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+
+# Timeout (in secondi) delle chiamate verso i microservizi
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "2"))
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "10"))
+UPSTREAM_WRITE_TIMEOUT = float(os.getenv("UPSTREAM_WRITE_TIMEOUT", "10"))
+UPSTREAM_POOL_TIMEOUT = float(os.getenv("UPSTREAM_POOL_TIMEOUT", "5"))
+
+# Verifica locale dei token JWT: le chiavi pubbliche di Auth sono configurate in healthmatch_common/token_verifier.py
+# Numero massimo di token già verificati mantenuti in cache (LRU)
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+
+# Health check aggregato dei microservizi
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "2"))
+# Tempo massimo complessivo per sondare tutti i servizi
+HEALTH_DEADLINE = float(os.getenv("HEALTH_DEADLINE", "2.5"))
+# Validità (in secondi) del risultato in cache e intervallo di aggiornamento in background
+HEALTH_CACHE_TTL = float(os.getenv("HEALTH_CACHE_TTL", "5"))
+HEALTH_REFRESH_INTERVAL = float(os.getenv("HEALTH_REFRESH_INTERVAL", "3"))
+
+def service_setting(name: str, service: str, default: str, cast=float):
+    """Legge un parametro specifico di un servizio (es. BULKHEAD_MAX_CONCURRENCY_BOOKING), con fallback globale (BULKHEAD_MAX_CONCURRENCY)."""
+    return cast(os.getenv(f"{name}_{service.upper()}", os.getenv(name, default)))
+
+# Parametri del circuit breaker e del bulkhead, configurabili per servizio tramite service_setting():
+# CIRCUIT_FAILURE_RATE (0.5), CIRCUIT_MIN_CALLS (10), CIRCUIT_WINDOW_SECONDS (30),
+# CIRCUIT_COOLDOWN_SECONDS (15), CIRCUIT_HALF_OPEN_MAX_CALLS (1),
+# BULKHEAD_MAX_CONCURRENCY (50), BULKHEAD_MAX_WAIT (0.5)
+
+# Coalescenza delle GET identiche concorrenti (single-flight).
+# Formato: "route:scope,...", dove scope è "shared" (chiave comune a tutti gli utenti)
+# oppure "user" (una chiamata condivisa per utente)
+SINGLEFLIGHT_ROUTES = parse_mapping(os.getenv(
+    "SINGLEFLIGHT_ROUTES",
+    "catalog.services:shared,catalog.service:shared,catalog.specialties:shared,"
+    "catalog.categories:shared,catalog.professional_services:shared,users.professionals:shared"
+))
+
+# Cache delle risposte del catalogo: TTL in secondi per route ("route:ttl,...") e limiti di dimensione
+CATALOG_CACHE_TTLS = parse_mapping(os.getenv(
+    "CATALOG_CACHE_TTLS",
+    "catalog.services:60,catalog.service:300,catalog.specialties:3600,"
+    "catalog.categories:3600,catalog.professional_services:120"
+), float)
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "1024"))
+CATALOG_CACHE_MAX_BYTES = int(os.getenv("CATALOG_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+CATALOG_CACHE_MAX_ENTRY_BYTES = int(os.getenv("CATALOG_CACHE_MAX_ENTRY_BYTES", str(1024 * 1024)))
+
+
+# Saga della prenotazione completa: timeout per passo (in secondi) e conservazione dello stato per il polling
+SAGA_STEP_TIMEOUTS = parse_mapping(os.getenv(
+    "SAGA_STEP_TIMEOUTS",
+    "availability:2,create_booking:5,payment_intent:10,compensate_create_booking:5,"
+    "notify_client:5,notify_professional:5"
+), float)
+SAGA_DEFAULT_TIMEOUT = float(os.getenv("SAGA_DEFAULT_TIMEOUT", "5"))
+SAGA_TTL = float(os.getenv("SAGA_TTL", "900"))
+SAGA_MAX_ENTRIES = int(os.getenv("SAGA_MAX_ENTRIES", "10000"))
+
+# Attività in background (es. notifiche) eseguite dopo l'invio della risposta
+BACKGROUND_MAX_CONCURRENCY = int(os.getenv("BACKGROUND_MAX_CONCURRENCY", "100"))
+# Endpoint batch: numero massimo di sotto-richieste e scadenza complessiva (in secondi)
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+BATCH_DEADLINE = float(os.getenv("BATCH_DEADLINE", "10"))
+
+# Rate limiting a token bucket. RATE_LIMITS: "gruppo:token_al_secondo/capacità,...";
+# RATE_LIMIT_ROUTES associa "[METODO ]prefisso_percorso" a un gruppo, le altre route usano "default"
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMITS = parse_mapping(os.getenv(
+    "RATE_LIMITS",
+    "default:20/40,auth:0.2/5,booking_complete:0.2/3"
+))
+RATE_LIMIT_ROUTES = parse_mapping(os.getenv(
+    "RATE_LIMIT_ROUTES",
+    "POST /api/v1/auth/login:auth,POST /api/v1/auth/register:auth,"
+    "POST /api/v1/bookings/complete:booking_complete"
+))
+RATE_LIMIT_EXEMPT = [path.strip() for path in os.getenv("RATE_LIMIT_EXEMPT", "/status,/metrics,/api/v1/health").split(",") if path.strip()]
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+# Usa X-Forwarded-For per identificare il client solo se il gateway è dietro un proxy fidato
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() in ("1", "true", "yes")
+
+# Limite adattivo di concorrenza e scarto del carico per classe di priorità.
+# LOAD_SHED_PRIORITIES associa "[METODO ]prefisso_percorso" a una classe (le altre route sono "normal");
+# LOAD_SHED_SHARES indica la quota del limite utilizzabile da ciascuna classe
+LOAD_SHED_ENABLED = os.getenv("LOAD_SHED_ENABLED", "true").lower() in ("1", "true", "yes")
+CONCURRENCY_INITIAL_LIMIT = int(os.getenv("CONCURRENCY_INITIAL_LIMIT", "200"))
+CONCURRENCY_MIN_LIMIT = int(os.getenv("CONCURRENCY_MIN_LIMIT", "20"))
+CONCURRENCY_MAX_LIMIT = int(os.getenv("CONCURRENCY_MAX_LIMIT", "2000"))
+CONCURRENCY_LATENCY_TOLERANCE = float(os.getenv("CONCURRENCY_LATENCY_TOLERANCE", "2.0"))
+LOAD_SHED_PRIORITIES = parse_mapping(os.getenv(
+    "LOAD_SHED_PRIORITIES",
+    "POST /api/v1/auth/login:critical,POST /api/v1/auth/refresh:critical,"
+    "POST /api/v1/bookings:critical,GET /api/v1/catalog:low,GET /api/v1/notifications:low"
+))
+LOAD_SHED_SHARES = parse_mapping(os.getenv("LOAD_SHED_SHARES", "critical:1.0,normal:0.85,low:0.6"), float)
+LOAD_SHED_EXEMPT = [path.strip() for path in os.getenv("LOAD_SHED_EXEMPT", "/status,/metrics,/api/v1/health").split(",") if path.strip()]
+LOAD_SHED_RETRY_AFTER = int(os.getenv("LOAD_SHED_RETRY_AFTER", "1"))
+
+# Idempotency-Key sulle richieste POST: durata e numero massimo delle chiavi ricordate,
+# dimensione massima delle risposte memorizzate e attesa massima dei duplicati concorrenti
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() in ("1", "true", "yes")
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+IDEMPOTENCY_MAX_RESPONSE_BYTES = int(os.getenv("IDEMPOTENCY_MAX_RESPONSE_BYTES", str(64 * 1024)))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "30"))
+
+# Dashboard aggregata (/me/dashboard): scadenza in secondi per sezione e numero di elementi restituiti
+DASHBOARD_TIMEOUTS = parse_mapping(os.getenv(
+    "DASHBOARD_TIMEOUTS",
+    "profile:1,upcoming_bookings:1.5,unread_notifications:0.5,latest_notifications:1,health_records:1.5"
+), float)
+DASHBOARD_DEFAULT_TIMEOUT = float(os.getenv("DASHBOARD_DEFAULT_TIMEOUT", "1"))
+DASHBOARD_UPCOMING_BOOKINGS = int(os.getenv("DASHBOARD_UPCOMING_BOOKINGS", "5"))
+DASHBOARD_LATEST_NOTIFICATIONS = int(os.getenv("DASHBOARD_LATEST_NOTIFICATIONS", "5"))
+DASHBOARD_HEALTH_RECORDS = int(os.getenv("DASHBOARD_HEALTH_RECORDS", "5"))
@@ -1,29 +1,105 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from healthmatch_common.tracing import setup_tracing
+from healthmatch_common.token_verifier import token_verifier
 from .routes.gateway_routes import router as api_router
-import os
+from .upstream.client import UpstreamRegistry
+from .upstream.health import HealthMonitor
+from .orchestration.dispatcher import BackgroundDispatcher
+from .middleware.idempotency import IdempotencyMiddleware, IdempotencyStore
+from .middleware.rate_limit import InMemoryBackend, RateLimitMiddleware
+from .middleware.metrics import MetricsMiddleware
+from .middleware.load_shedding import GradientLimiter, LoadSheddingMiddleware
+from .metrics.registry import registry
+from . import config
+from .config import SERVICE_URLS, BACKGROUND_MAX_CONCURRENCY
 
-# Configurazione variabili d'ambiente con valori di default
-AUTH_SERVICE_URL = os.getenv("AUTH_SERVICE_URL", "http://auth-service:8001/api/v1")
-USERS_SERVICE_URL = os.getenv("USERS_SERVICE_URL", "http://users-service:8006/api/v1")
-BOOKING_SERVICE_URL = os.getenv("BOOKING_SERVICE_URL", "http://booking-service:8002/api/v1")
-CATALOG_SERVICE_URL = os.getenv("CATALOG_SERVICE_URL", "http://catalog-service:8003/api/v1")
-PAYMENT_SERVICE_URL = os.getenv("PAYMENT_SERVICE_URL", "http://payment-service:8005/api/v1")
-NOTIFICATION_SERVICE_URL = os.getenv("NOTIFICATION_SERVICE_URL", "http://notification-service:8004/api/v1")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Crea i pool di connessioni condivisi all'avvio e li chiude allo spegnimento."""
+    # app.state.upstream_transports permette di sostituire la rete con servizi simulati (vedi benchmarks/)
+    transports = getattr(app.state, "upstream_transports", None) or {}
+    upstreams = UpstreamRegistry(SERVICE_URLS, transports=transports)
+    upstreams.start()
+    # Le chiavi pubbliche dei JWT arrivano da Auth: stesso trasporto alternativo, se configurato
+    if "auth" in transports:
+        token_verifier.transport = transports["auth"]
+    app.state.upstreams = upstreams
+    health_monitor = HealthMonitor(upstreams)
+    health_monitor.start()
+    app.state.health_monitor = health_monitor
+    dispatcher = BackgroundDispatcher(max_concurrency=BACKGROUND_MAX_CONCURRENCY)
+    app.state.dispatcher = dispatcher
+    try:
+        yield
+    finally:
+        # Le attività in background usano i pool: vanno completate prima di chiuderli
+        await dispatcher.aclose()
+        await health_monitor.stop()
+        await upstreams.aclose()
+        await token_verifier.aclose()
 
 app = FastAPI(
     title="HealthMatch API Gateway",
     description="API Gateway per HealthMatch",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Middleware CORS
+# Idempotency-Key: i tentativi ripetuti di una POST non vengono rieseguiti verso i servizi
+if config.IDEMPOTENCY_ENABLED:
+    app.add_middleware(
+        IdempotencyMiddleware,
+        store=IdempotencyStore(ttl=config.IDEMPOTENCY_TTL, max_entries=config.IDEMPOTENCY_MAX_ENTRIES),
+        max_body_bytes=config.IDEMPOTENCY_MAX_RESPONSE_BYTES,
+        wait_timeout=config.IDEMPOTENCY_WAIT_TIMEOUT,
+        trust_forwarded=config.RATE_LIMIT_TRUST_FORWARDED,
+    )
+
+# Rate limiting per utente/IP e gruppo di route
+if config.RATE_LIMIT_ENABLED:
+    app.add_middleware(
+        RateLimitMiddleware,
+        backend=InMemoryBackend(max_buckets=config.RATE_LIMIT_MAX_BUCKETS),
+        limits=config.RATE_LIMITS,
+        routes=config.RATE_LIMIT_ROUTES,
+        exempt=config.RATE_LIMIT_EXEMPT,
+        trust_forwarded=config.RATE_LIMIT_TRUST_FORWARDED,
+    )
+
+# Limite adattivo di concorrenza: in sovraccarico scarta prima il traffico a bassa priorità
+if config.LOAD_SHED_ENABLED:
+    app.add_middleware(
+        LoadSheddingMiddleware,
+        limiter=GradientLimiter(
+            initial_limit=config.CONCURRENCY_INITIAL_LIMIT,
+            min_limit=config.CONCURRENCY_MIN_LIMIT,
+            max_limit=config.CONCURRENCY_MAX_LIMIT,
+            tolerance=config.CONCURRENCY_LATENCY_TOLERANCE,
+        ),
+        priorities=config.LOAD_SHED_PRIORITIES,
+        shares=config.LOAD_SHED_SHARES,
+        exempt=config.LOAD_SHED_EXEMPT,
+        retry_after=config.LOAD_SHED_RETRY_AFTER,
+    )
+
+# Metriche delle richieste (aggiunto dopo i limiti: misura anche le loro risposte)
+app.add_middleware(MetricsMiddleware)
+
+# Tracing distribuito: il traceparent viene propagato alle chiamate verso i servizi
+setup_tracing(app, "api-gateway")
+
+# Middleware CORS, aggiunto per ultimo così è il più esterno: anche le risposte 429 e 503 dei
+# limiti hanno gli header CORS e il browser vede il Retry-After invece di un errore di rete
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # In produzione, limita alle origini specifiche
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "X-Next-Cursor"],
 )
 
 # Registra il router principale
@@ -31,4 +107,9 @@ app.include_router(api_router, prefix="/api/v1")
 
 @app.get("/status")
 async def status():
-    return {"status": "API Gateway is running"}
\ No newline at end of file
+    return {"status": "API Gateway is running"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Metriche del gateway in formato testuale Prometheus."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
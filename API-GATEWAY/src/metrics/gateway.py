@@ -0,0 +1,62 @@
+from .registry import registry
+
+# Metriche esposte dal gateway su /metrics
+
+HTTP_REQUEST_DURATION = registry.histogram(
+    "gateway_http_request_duration_seconds",
+    "Durata delle richieste servite dal gateway",
+    ("route", "method", "status"),
+)
+
+UPSTREAM_REQUEST_DURATION = registry.histogram(
+    "gateway_upstream_request_duration_seconds",
+    "Durata delle chiamate ai microservizi fino alla ricezione degli header",
+    ("service", "route", "method"),
+)
+UPSTREAM_RESPONSES = registry.counter(
+    "gateway_upstream_responses_total",
+    "Risposte dei microservizi per codice di stato (error per gli errori di rete)",
+    ("service", "route", "method", "status"),
+)
+UPSTREAM_TIMEOUTS = registry.counter(
+    "gateway_upstream_timeouts_total",
+    "Chiamate ai microservizi terminate per timeout",
+    ("service", "route"),
+)
+UPSTREAM_REJECTED = registry.counter(
+    "gateway_upstream_rejected_total",
+    "Chiamate rifiutate dal gateway senza contattare il servizio",
+    ("service", "reason"),
+)
+
+# Gauge aggiornati al momento dell'esportazione (vedi UpstreamRegistry.collect_metrics)
+UPSTREAM_IN_FLIGHT = registry.gauge(
+    "gateway_upstream_in_flight",
+    "Chiamate in corso verso ciascun microservizio",
+    ("service",),
+)
+UPSTREAM_POOL_CONNECTIONS = registry.gauge(
+    "gateway_upstream_pool_connections",
+    "Connessioni nel pool verso ciascun microservizio, per stato",
+    ("service", "state"),
+)
+UPSTREAM_CIRCUIT_STATE = registry.gauge(
+    "gateway_upstream_circuit_state",
+    "Stato del circuit breaker verso ciascun microservizio (1 per lo stato corrente)",
+    ("service", "state"),
+)
+
+# Limite adattivo di concorrenza e scarto del carico
+GATEWAY_CONCURRENCY_LIMIT = registry.gauge(
+    "gateway_concurrency_limit",
+    "Limite adattivo corrente di richieste concorrenti",
+)
+GATEWAY_IN_FLIGHT = registry.gauge(
+    "gateway_in_flight_requests",
+    "Richieste in corso soggette al limite di concorrenza",
+)
+GATEWAY_SHED = registry.counter(
+    "gateway_shed_requests_total",
+    "Richieste scartate per sovraccarico, per classe di priorità",
+    ("priority",),
+)
@@ -0,0 +1,203 @@
+# API-GATEWAY/src/middleware/idempotency.py
+# Gestione dell'header Idempotency-Key sulle richieste POST: i duplicati ricevono la risposta già prodotta
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .identity import client_key
+
+
+class StoredResponse:
+    """Risposta completa di una richiesta idempotente, pronta per essere restituita ai duplicati."""
+
+    __slots__ = ("status_code", "headers", "body")
+
+    def __init__(self, status_code: int, headers: List[Tuple[bytes, bytes]], body: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+
+class IdempotencyEntry:
+    __slots__ = ("fingerprint", "expires_at", "done", "response")
+
+    def __init__(self, fingerprint: str, expires_at: float):
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        # Completato quando la prima esecuzione termina; response resta None se non è memorizzabile
+        self.done = asyncio.Event()
+        self.response: Optional[StoredResponse] = None
+
+
+class IdempotencyStore:
+    """Registro in memoria delle chiavi di idempotenza, limitato per numero di voci e durata."""
+
+    def __init__(self, ttl: float = 86400.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, IdempotencyEntry]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[IdempotencyEntry]:
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            return None
+        return entry
+
+    def begin(self, key: str, fingerprint: str) -> IdempotencyEntry:
+        """Registra la prima esecuzione di una chiave."""
+        now = time.monotonic()
+        self._evict(now)
+        entry = IdempotencyEntry(fingerprint, now + self.ttl)
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def discard(self, key: str, entry: IdempotencyEntry) -> None:
+        """Dimentica la chiave, così che un nuovo tentativo venga eseguito di nuovo."""
+        if self._entries.get(key) is entry:
+            del self._entries[key]
+
+    def _evict(self, now: float) -> None:
+        # Le voci sono in ordine di creazione: basta rimuovere quelle scadute in testa
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry.expires_at > now:
+                break
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class IdempotencyMiddleware:
+    """Middleware ASGI che esegue una sola volta le POST con la stessa Idempotency-Key.
+
+    La chiave vale per singolo client (utente del JWT o IP). Un duplicato concorrente attende
+    la prima esecuzione; quelli successivi ricevono la risposta memorizzata con l'header
+    Idempotent-Replayed. Riutilizzare la chiave con un corpo diverso restituisce 422.
+    Le risposte 5xx e 429 non vengono memorizzate, così il client può riprovare.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        store: IdempotencyStore,
+        methods: Iterable[str] = ("POST",),
+        max_body_bytes: int = 64 * 1024,
+        wait_timeout: float = 30.0,
+        trust_forwarded: bool = False,
+    ):
+        self.app = app
+        self.store = store
+        self.methods = {method.upper() for method in methods}
+        self.max_body_bytes = max_body_bytes
+        self.wait_timeout = wait_timeout
+        self.trust_forwarded = trust_forwarded
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in self.methods:
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = dict(scope["headers"]).get(b"idempotency-key")
+        if not idempotency_key:
+            await self.app(scope, receive, send)
+            return
+
+        body = await self._read_body(receive)
+        fingerprint = hashlib.sha256(
+            b"\n".join([scope["method"].encode(), scope["path"].encode(), scope["query_string"], body])
+        ).hexdigest()
+        key = f"{client_key(scope, self.trust_forwarded)}:{idempotency_key.decode('latin-1')}"
+
+        while True:
+            entry = self.store.get(key)
+            if entry is None:
+                await self._execute(key, fingerprint, body, scope, receive, send)
+                return
+            if entry.fingerprint != fingerprint:
+                await JSONResponse(
+                    status_code=422,
+                    content={"detail": "Idempotency-Key già utilizzata per una richiesta diversa"},
+                )(scope, receive, send)
+                return
+            try:
+                await asyncio.wait_for(entry.done.wait(), timeout=self.wait_timeout)
+            except asyncio.TimeoutError:
+                await JSONResponse(
+                    status_code=409,
+                    content={"detail": "Una richiesta con la stessa Idempotency-Key è ancora in corso"},
+                )(scope, receive, send)
+                return
+            if entry.response is not None:
+                await self._replay(entry.response, scope, receive, send)
+                return
+            # La prima esecuzione non ha prodotto una risposta riutilizzabile ed è stata scartata:
+            # il primo duplicato a riprendere la esegue di nuovo, gli altri attendono quella
+
+    async def _execute(self, key: str, fingerprint: str, body: bytes, scope: Scope, receive: Receive, send: Send) -> None:
+        entry = self.store.begin(key, fingerprint)
+        status_code = 500
+        headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+        size = 0
+        storable = True
+        body_sent = False
+
+        async def replay_receive() -> Message:
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # Il corpo è già stato letto: resta solo da segnalare l'eventuale disconnessione del client
+            return await receive()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, headers, size, storable
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body" and storable:
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if size > self.max_body_bytes:
+                    storable = False
+                    chunks.clear()
+                else:
+                    chunks.append(chunk)
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, send_wrapper)
+        finally:
+            if storable and status_code < 500 and status_code != 429:
+                entry.response = StoredResponse(status_code, headers, b"".join(chunks))
+            else:
+                self.store.discard(key, entry)
+            entry.done.set()
+
+    async def _replay(self, stored: StoredResponse, scope: Scope, receive: Receive, send: Send) -> None:
+        response = Response(content=stored.body, status_code=stored.status_code)
+        response.raw_headers = [
+            (name, value) for name, value in stored.headers if name.lower() != b"content-length"
+        ] + [(b"content-length", str(len(stored.body)).encode()), (b"idempotent-replayed", b"true")]
+        await response(scope, receive, send)
+
+    @staticmethod
+    async def _read_body(receive: Receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
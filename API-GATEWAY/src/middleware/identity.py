@@ -0,0 +1,29 @@
+# API-GATEWAY/src/middleware/identity.py
+# Identificazione del client di una richiesta, condivisa dai middleware del gateway
+
+from healthmatch_common.token_verifier import TokenError
+from starlette.types import Scope
+
+from ..auth.jwt_auth import decode_token, token_cache
+
+
+def client_key(scope: Scope, trust_forwarded: bool = False) -> str:
+    """Restituisce "user:<id>" se la richiesta porta un JWT valido, altrimenti "ip:<indirizzo>"."""
+    headers = dict(scope["headers"])
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        user = token_cache.get(token)
+        if user is None:
+            try:
+                user = decode_token(token)
+            except TokenError:
+                user = None
+        if user is not None and user.get("id") is not None:
+            return f"user:{user['id']}"
+
+    forwarded = headers.get(b"x-forwarded-for")
+    if trust_forwarded and forwarded:
+        return "ip:" + forwarded.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
@@ -0,0 +1,143 @@
+# API-GATEWAY/src/middleware/load_shedding.py
+# Limite adattivo di richieste concorrenti e scarto del traffico meno importante in caso di sovraccarico
+
+import math
+import time
+from typing import Dict, Iterable, Optional
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..metrics.gateway import GATEWAY_CONCURRENCY_LIMIT, GATEWAY_IN_FLIGHT, GATEWAY_SHED
+from ..metrics.registry import registry
+from .routing import RouteGroups
+
+
+class GradientLimiter:
+    """Limite di concorrenza adattivo basato sul rapporto tra latenza di lungo e di breve periodo.
+
+    Finché la latenza recente resta entro `tolerance` volte quella di riferimento il limite cresce
+    (di circa la radice quadrata del limite stesso); quando le richieste iniziano ad accodarsi la
+    latenza recente sale e il limite si riduce in proporzione. I timeout (504) riducono il limite
+    in modo moltiplicativo.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 200,
+        min_limit: int = 20,
+        max_limit: int = 2000,
+        tolerance: float = 2.0,
+        smoothing: float = 0.2,
+        backoff: float = 0.9,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.backoff = backoff
+        self.in_flight = 0
+        self._short_rtt: Optional[float] = None
+        self._long_rtt: Optional[float] = None
+
+    def try_acquire(self, share: float = 1.0) -> bool:
+        """Occupa uno slot se le richieste in corso sono sotto la quota `share` del limite."""
+        if self.in_flight >= self.limit * share:
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, latency: Optional[float], overloaded: bool = False) -> None:
+        """Libera lo slot e aggiorna il limite con la latenza osservata (None se non significativa)."""
+        in_flight = self.in_flight
+        self.in_flight -= 1
+        if overloaded:
+            self._set_limit(self.limit * self.backoff)
+            return
+        if latency is None:
+            return
+
+        self._short_rtt = latency if self._short_rtt is None else 0.9 * self._short_rtt + 0.1 * latency
+        self._long_rtt = latency if self._long_rtt is None else 0.99 * self._long_rtt + 0.01 * latency
+        # La latenza di riferimento non deve restare ancorata a un periodo di sovraccarico passato
+        if self._long_rtt > self._short_rtt:
+            self._long_rtt = self._short_rtt
+
+        # Con poche richieste in corso la latenza non dice nulla sulla capacità disponibile
+        if in_flight < self.limit / 2:
+            return
+
+        gradient = max(0.5, min(1.0, self.tolerance * self._long_rtt / self._short_rtt))
+        new_limit = self.limit * gradient + math.sqrt(self.limit)
+        self._set_limit(self.limit * (1 - self.smoothing) + new_limit * self.smoothing)
+
+    def _set_limit(self, value: float) -> None:
+        self.limit = max(float(self.min_limit), min(float(self.max_limit), value))
+
+
+class LoadSheddingMiddleware:
+    """Middleware ASGI che applica il limite adattivo, con quote diverse per classe di priorità.
+
+    Le classi con quota più bassa (es. navigazione del catalogo) vengono scartate per prime; le
+    richieste scartate ricevono subito un 503 con Retry-After, senza accodarsi.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limiter: GradientLimiter,
+        priorities: Dict[str, str],
+        shares: Dict[str, float],
+        exempt: Iterable[str] = (),
+        retry_after: int = 1,
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.priorities = RouteGroups(priorities, default="normal")
+        self.shares = shares
+        self.exempt = tuple(exempt)
+        self.retry_after = retry_after
+        registry.add_collector(self.collect_metrics)
+
+    def collect_metrics(self) -> None:
+        GATEWAY_CONCURRENCY_LIMIT.set(value=round(self.limiter.limit, 2))
+        GATEWAY_IN_FLIGHT.set(value=self.limiter.in_flight)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Le richieste OPTIONS (preflight CORS) non occupano slot di concorrenza
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"].startswith(self.exempt):
+            await self.app(scope, receive, send)
+            return
+
+        priority = self.priorities.match(scope["method"], scope["path"])
+        if not self.limiter.try_acquire(self.shares.get(priority, 1.0)):
+            GATEWAY_SHED.inc(priority)
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Gateway sovraccarico, riprova più tardi"},
+                headers={"Retry-After": str(self.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        latency: Optional[float] = None
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal latency, status_code
+            if message["type"] == "http.response.start":
+                # Tempo fino agli header: per le risposte in streaming esclude il trasferimento del corpo
+                latency = time.perf_counter() - start
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Le risposte di errore (es. 4xx, circuito aperto) arrivano in fretta senza dire nulla
+            # sul carico: non aggiornano la latenza osservata
+            if status_code >= 400:
+                latency = None
+            self.limiter.release(latency, overloaded=status_code == 504)
@@ -0,0 +1,40 @@
+# API-GATEWAY/src/middleware/metrics.py
+# Misura la durata delle richieste servite dal gateway e rende disponibile la route corrente alle chiamate ai servizi
+
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..metrics.gateway import HTTP_REQUEST_DURATION
+from ..metrics.registry import current_scope, route_template
+
+
+class MetricsMiddleware:
+    """Middleware ASGI che registra durata e codice di stato di ogni richiesta per template di route."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+        token = current_scope.set(scope)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_DURATION.observe(
+                route_template(), scope["method"], str(status_code),
+                value=time.perf_counter() - start,
+            )
+            current_scope.reset(token)
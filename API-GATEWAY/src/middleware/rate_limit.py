@@ -0,0 +1,126 @@
+# API-GATEWAY/src/middleware/rate_limit.py
+# Limita la frequenza delle richieste con un token bucket per utente (o IP) e gruppo di route
+
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .identity import client_key
+from .routing import RouteGroups
+
+
+def parse_limit(value: str) -> Tuple[float, float]:
+    """Converte "rate/burst" (token al secondo / capacità del bucket) in una tupla di float."""
+    rate, _, burst = value.partition("/")
+    return float(rate), float(burst or rate)
+
+
+class RateLimitBackend:
+    """Interfaccia dei backend che conservano lo stato dei bucket.
+
+    L'implementazione in memoria vale per una singola istanza del gateway; un backend
+    condiviso (es. Redis) permette di applicare gli stessi limiti a più repliche.
+    """
+
+    async def acquire(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        """Consuma `cost` token dal bucket: restituisce 0 se la richiesta è ammessa,
+        altrimenti i secondi da attendere prima di riprovare."""
+        raise NotImplementedError
+
+
+class InMemoryBackend(RateLimitBackend):
+    """Token bucket in memoria con numero massimo di bucket ed eliminazione di quelli inattivi.
+
+    Le operazioni sul bucket non contengono await, quindi sono atomiche rispetto all'event
+    loop e non serve alcun lock. I bucket sono in ordine di ultimo utilizzo: quelli in testa
+    che si sono già ricaricati del tutto equivalgono a bucket nuovi e vengono rimossi.
+    """
+
+    def __init__(self, max_buckets: int = 100000):
+        self.max_buckets = max_buckets
+        # chiave -> [token disponibili, istante dell'ultimo aggiornamento, secondi per la ricarica completa]
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    async def acquire(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = burst
+        else:
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+
+        if tokens >= cost:
+            tokens -= cost
+            retry_after = 0.0
+        else:
+            retry_after = (cost - tokens) / rate
+
+        if bucket is None:
+            self._buckets[key] = [tokens, now, burst / rate]
+        else:
+            bucket[0], bucket[1] = tokens, now
+            self._buckets.move_to_end(key)
+        self._evict(now)
+        return retry_after
+
+    def _evict(self, now: float) -> None:
+        while self._buckets:
+            tokens, updated_at, refill_seconds = next(iter(self._buckets.values()))
+            if len(self._buckets) <= self.max_buckets and now - updated_at < refill_seconds:
+                break
+            self._buckets.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RateLimitMiddleware:
+    """Middleware ASGI che risponde 429 con Retry-After quando il bucket del client è vuoto.
+
+    Il client è identificato dall'id utente del JWT, se valido, altrimenti dall'indirizzo IP.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        backend: RateLimitBackend,
+        limits: Dict[str, str],
+        routes: Dict[str, str],
+        exempt: Iterable[str] = (),
+        trust_forwarded: bool = False,
+    ):
+        self.app = app
+        self.backend = backend
+        self.limits = {group: parse_limit(value) for group, value in limits.items()}
+        self.routes = RouteGroups(routes)
+        self.exempt = tuple(exempt)
+        self.trust_forwarded = trust_forwarded
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Le richieste OPTIONS (preflight CORS) non consumano token
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"].startswith(self.exempt):
+            await self.app(scope, receive, send)
+            return
+
+        group = self.routes.match(scope["method"], scope["path"])
+        limit = self.limits.get(group)
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        rate, burst = limit
+        retry_after = await self.backend.acquire(f"{group}:{client_key(scope, self.trust_forwarded)}", rate, burst)
+        if retry_after > 0:
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Troppe richieste, riprova più tardi"},
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
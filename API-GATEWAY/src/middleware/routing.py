@@ -0,0 +1,31 @@
+# API-GATEWAY/src/middleware/routing.py
+# Associazione delle richieste a gruppi di route, condivisa dai middleware del gateway
+
+from typing import Dict, Optional, Tuple
+
+
+class RouteGroups:
+    """Associa una richiesta a un gruppo in base al metodo (opzionale) e al prefisso del percorso.
+
+    Le regole hanno la forma "[METODO ]prefisso" e vince quella con il prefisso più lungo;
+    le richieste che non corrispondono a nessuna regola appartengono al gruppo di default.
+    """
+
+    def __init__(self, rules: Dict[str, str], default: str = "default"):
+        self.default = default
+        self.rules = sorted(
+            (self._parse_rule(rule) + (group,) for rule, group in rules.items()),
+            key=lambda rule: len(rule[1]),
+            reverse=True,
+        )
+
+    @staticmethod
+    def _parse_rule(rule: str) -> Tuple[Optional[str], str]:
+        method, _, path = rule.strip().rpartition(" ")
+        return (method.upper() or None), path
+
+    def match(self, method: str, path: str) -> str:
+        for rule_method, prefix, group in self.rules:
+            if (rule_method is None or rule_method == method) and path.startswith(prefix):
+                return group
+        return self.default
@@ -0,0 +1,37 @@
+import asyncio
+import logging
+from typing import Awaitable, Set
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundDispatcher:
+    """Esegue in background il lavoro che non deve ritardare la risposta al client (es. notifiche)."""
+
+    def __init__(self, max_concurrency: int = 100):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def submit(self, job: Awaitable[None]) -> None:
+        task = asyncio.ensure_future(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: Awaitable[None]) -> None:
+        async with self._semaphore:
+            try:
+                await job
+            except Exception as e:
+                logger.warning(f"Errore in un'attività in background: {str(e) or type(e).__name__}")
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    async def aclose(self, timeout: float = 10.0) -> None:
+        """Attende il completamento delle attività in corso, annullando quelle oltre il timeout."""
+        if not self._tasks:
+            return
+        done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
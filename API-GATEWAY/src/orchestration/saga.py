@@ -0,0 +1,132 @@
+import asyncio
+import datetime
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Action = Callable[[], Awaitable[Any]]
+
+
+class Saga:
+    """Transazione distribuita composta da passi con timeout e azioni di compensazione.
+
+    Se un passo fallisce, le compensazioni registrate vengono eseguite in ordine inverso.
+    """
+
+    RUNNING = "running"
+    COMPLETED = "completed"
+    COMPENSATING = "compensating"
+    ABORTED = "aborted"
+
+    def __init__(self, name: str, owner_id: Any = None, step_timeouts: Optional[Dict[str, float]] = None,
+                 default_timeout: float = 5.0):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.owner_id = owner_id
+        self.status = self.RUNNING
+        self.error: Optional[str] = None
+        self.step_timeouts = step_timeouts or {}
+        self.default_timeout = default_timeout
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.data: Dict[str, Any] = {}
+        self.created_at = datetime.datetime.now()
+        self._compensations: List[Tuple[str, Action]] = []
+
+    def timeout_for(self, step: str) -> float:
+        return self.step_timeouts.get(step, self.default_timeout)
+
+    async def step(self, name: str, action: Action) -> Any:
+        """Esegue un passo entro il suo timeout, registrandone esito e durata."""
+        record = self.steps[name] = {"status": "running", "duration_ms": None, "error": None}
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(action(), timeout=self.timeout_for(name))
+        except asyncio.TimeoutError:
+            record.update(status="timeout", error=f"Timeout dopo {self.timeout_for(name)}s")
+            raise
+        except Exception as e:
+            record.update(status="failed", error=str(e) or type(e).__name__)
+            raise
+        finally:
+            record["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        record["status"] = "completed"
+        return result
+
+    async def background_step(self, name: str, action: Action) -> None:
+        """Come step(), ma gli errori vengono solo registrati: usato per i passi fuori dal percorso critico."""
+        self.steps.setdefault(name, {"status": "queued", "duration_ms": None, "error": None})
+        try:
+            await self.step(name, action)
+        except Exception as e:
+            logger.warning(f"Saga {self.id}: passo '{name}' non riuscito: {str(e) or type(e).__name__}")
+
+    def compensate_with(self, name: str, action: Action) -> None:
+        """Registra l'azione che annulla gli effetti del passo indicato.
+
+        Per un passo il cui esito può restare incerto (es. un timeout dopo che il servizio ha già
+        scritto) va registrata prima di eseguirlo, e deve saper verificare se c'è qualcosa da annullare.
+        """
+        self._compensations.append((name, action))
+
+    def complete(self) -> None:
+        self.status = self.COMPLETED
+
+    async def abort(self, reason: str) -> None:
+        """Interrompe la saga ed esegue le compensazioni registrate in ordine inverso."""
+        if self.status in (self.COMPENSATING, self.ABORTED):
+            return
+        self.status = self.COMPENSATING
+        self.error = reason
+        while self._compensations:
+            name, action = self._compensations.pop()
+            try:
+                await self.step(f"compensate_{name}", action)
+            except Exception as e:
+                logger.error(f"Saga {self.id}: compensazione di '{name}' non riuscita: {str(e) or type(e).__name__}")
+        self.status = self.ABORTED
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "saga_id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "error": self.error,
+            "steps": self.steps,
+            "data": self.data,
+            "created_at": self.created_at.isoformat(),
+        }
+
+
+class SagaStore:
+    """Registro in memoria delle saghe recenti, limitato per numero e durata, per il polling dello stato."""
+
+    def __init__(self, ttl: float = 900.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._sagas: "OrderedDict[str, Tuple[float, Saga]]" = OrderedDict()
+
+    def create(self, name: str, **kwargs: Any) -> Saga:
+        saga = Saga(name, **kwargs)
+        self._evict(time.monotonic())
+        self._sagas[saga.id] = (time.monotonic() + self.ttl, saga)
+        while len(self._sagas) > self.max_entries:
+            self._sagas.popitem(last=False)
+        return saga
+
+    def get(self, saga_id: str) -> Optional[Saga]:
+        entry = self._sagas.get(saga_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def _evict(self, now: float) -> None:
+        # Le saghe sono in ordine di creazione: basta rimuovere quelle scadute in testa
+        while self._sagas:
+            expires_at, _ = next(iter(self._sagas.values()))
+            if expires_at > now:
+                break
+            self._sagas.popitem(last=False)
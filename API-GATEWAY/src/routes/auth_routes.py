@@ -1,64 +1,134 @@
 from fastapi import APIRouter, HTTPException, Depends
 import httpx
 from typing import Dict, Any
+from healthmatch_common.token_verifier import TokenError, token_verifier
+from ..auth.jwt_auth import get_current_user, oauth2_scheme, token_cache
+from ..upstream.client import UpstreamClient, get_upstream
 
 router = APIRouter()
 
-# URL del servizio di autenticazione
-AUTH_SERVICE_URL = "http://auth-service:8001/api/v1"
-
 @router.post("/login")
-async def login(user_data: Dict[str, Any]):
+async def login(user_data: Dict[str, Any], auth_service: UpstreamClient = Depends(get_upstream("auth"))):
     """Effettua il login di un utente."""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(f"{AUTH_SERVICE_URL}/auth/login", json=user_data)
+        response = await auth_service.post("/auth/login", json=user_data)
+        
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.json())
             
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail=response.json())
-                
-            return response.json()
+        return response.json()
     except httpx.RequestError:
         raise HTTPException(status_code=503, detail="Servizio di autenticazione non disponibile")
 
 @router.post("/register")
-async def register(user_data: Dict[str, Any]):
+async def register(user_data: Dict[str, Any], auth_service: UpstreamClient = Depends(get_upstream("auth"))):
     """Registra un nuovo utente."""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(f"{AUTH_SERVICE_URL}/auth/register", json=user_data)
+        response = await auth_service.post("/auth/register", json=user_data)
+        
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.json())
             
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail=response.json())
-                
-            return response.json()
+        return response.json()
     except httpx.RequestError:
         raise HTTPException(status_code=503, detail="Servizio di autenticazione non disponibile")
 
 @router.post("/verify-token")
-async def verify_token(token_data: Dict[str, Any]):
+async def verify_token(token_data: Dict[str, Any], auth_service: UpstreamClient = Depends(get_upstream("auth"))):
     """Verifica un token JWT."""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(f"{AUTH_SERVICE_URL}/auth/verify", json=token_data)
+        response = await auth_service.post("/auth/verify", json=token_data)
+        
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.json())
             
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail=response.json())
-                
-            return response.json()
+        return response.json()
     except httpx.RequestError:
         raise HTTPException(status_code=503, detail="Servizio di autenticazione non disponibile")
 
 @router.post("/refresh-token")
-async def refresh_token(token_data: Dict[str, Any]):
+async def refresh_token(token_data: Dict[str, Any], auth_service: UpstreamClient = Depends(get_upstream("auth"))):
     """Rinnova un token JWT."""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(f"{AUTH_SERVICE_URL}/auth/refresh", json=token_data)
+        response = await auth_service.post("/auth/refresh", json=token_data)
+        
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.json())
             
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail=response.json())
-                
-            return response.json()
+        return response.json()
+    except httpx.RequestError:
+        raise HTTPException(status_code=503, detail="Servizio di autenticazione non disponibile")
+
+@router.post("/revoke")
+async def revoke_token(token_data: Dict[str, Any], auth_service: UpstreamClient = Depends(get_upstream("auth"))):
+    """Revoca un token JWT prima della scadenza (logout)."""
+    try:
+        response = await auth_service.post("/auth/revoke", json=token_data)
+        
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.json())
+        
+        # Effetto immediato su questa istanza; le altre lo apprendono alla prossima sincronizzazione
+        token = str(token_data.get("token", ""))
+        try:
+            token_verifier.mark_revoked(token_verifier.decode(token))
+        except TokenError:
+            pass
+        token_cache.invalidate(token)
+        return response.json()
+    except httpx.RequestError:
+        raise HTTPException(status_code=503, detail="Servizio di autenticazione non disponibile")
+
+@router.get("/sessions")
+async def get_sessions(
+    token: str = Depends(oauth2_scheme),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    auth_service: UpstreamClient = Depends(get_upstream("auth"))
+):
+    """Elenca le sessioni attive dell'utente corrente."""
+    try:
+        response = await auth_service.get("/auth/sessions", headers={"Authorization": f"Bearer {token}"})
+        
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.json())
+        
+        return response.json()
     except httpx.RequestError:
-        raise HTTPException(status_code=503, detail="Servizio di autenticazione non disponibile")
\ No newline at end of file
+        raise HTTPException(status_code=503, detail="Servizio di autenticazione non disponibile")
+
+@router.delete("/sessions/{session_id}")
+async def revoke_session(
+    session_id: str,
+    token: str = Depends(oauth2_scheme),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    auth_service: UpstreamClient = Depends(get_upstream("auth"))
+):
+    """Revoca una sessione dell'utente corrente: il suo refresh token smette di valere."""
+    try:
+        response = await auth_service.delete(
+            f"/auth/sessions/{session_id}", headers={"Authorization": f"Bearer {token}"}
+        )
+        
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.json())
+        
+        return response.json()
+    except httpx.RequestError:
+        raise HTTPException(status_code=503, detail="Servizio di autenticazione non disponibile")
+
+@router.delete("/sessions")
+async def revoke_all_sessions(
+    token: str = Depends(oauth2_scheme),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    auth_service: UpstreamClient = Depends(get_upstream("auth"))
+):
+    """Revoca tutte le sessioni dell'utente corrente (logout da tutti i dispositivi)."""
+    try:
+        response = await auth_service.delete("/auth/sessions", headers={"Authorization": f"Bearer {token}"})
+        
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.json())
+        
+        return response.json()
+    except httpx.RequestError:
+        raise HTTPException(status_code=503, detail="Servizio di autenticazione non disponibile")
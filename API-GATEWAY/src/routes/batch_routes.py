@@ -0,0 +1,135 @@
+from fastapi import APIRouter, HTTPException, Depends, Request
+from pydantic import BaseModel
+import asyncio
+import json
+import time
+import httpx
+from typing import Dict, Any, Optional, List
+from .. import config
+from ..auth.jwt_auth import get_current_active_user
+
+router = APIRouter()
+
+API_PREFIX = "/api/v1"
+ALLOWED_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE"}
+# Header della risposta di una sotto-richiesta restituiti al client
+FORWARDED_RESPONSE_HEADERS = ("etag", "cache-control", "retry-after", "location")
+# Header impostato su ogni sotto-richiesta: un batch che lo riceve è annidato, qualunque forma
+# abbia il percorso con cui è stato raggiunto (es. /./batch o /%62atch)
+SUB_REQUEST_HEADER = "x-gateway-batch-request"
+
+
+class SubRequest(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str
+    params: Optional[Dict[str, Any]] = None
+    body: Optional[Any] = None
+    headers: Optional[Dict[str, str]] = None
+
+
+class BatchRequest(BaseModel):
+    requests: List[SubRequest]
+
+
+def _validate(sub: SubRequest) -> Optional[str]:
+    """Restituisce il motivo per cui la sotto-richiesta non è ammessa, oppure None."""
+    if sub.method.upper() not in ALLOWED_METHODS:
+        return f"Metodo {sub.method} non supportato"
+    if not sub.path.startswith("/") or "://" in sub.path:
+        return "Il percorso deve essere relativo a /api/v1 e iniziare con /"
+    # Controllo anticipato sul caso comune; il rifiuto vero e proprio è in batch()
+    if sub.path.rstrip("/").split("?")[0] == "/batch":
+        return "Batch annidati non consentiti"
+    return None
+
+
+def _result(sub: SubRequest, index: int, status_code: int, body: Any, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return {
+        "id": sub.id if sub.id is not None else str(index),
+        "status": status_code,
+        "headers": headers or {},
+        "body": body,
+    }
+
+
+async def _dispatch(transport: httpx.ASGITransport, sub: SubRequest, index: int, authorization: str) -> Dict[str, Any]:
+    """Esegue la sotto-richiesta sulle route del gateway stesso, senza passare dalla rete."""
+    headers = {k.lower(): v for k, v in (sub.headers or {}).items()}
+    # Le sotto-richieste usano sempre le credenziali già verificate del batch
+    headers["authorization"] = authorization
+    headers[SUB_REQUEST_HEADER] = "1"
+    if sub.body is not None:
+        headers["content-type"] = "application/json"
+    upstream_request = httpx.Request(
+        sub.method.upper(),
+        f"http://gateway{API_PREFIX}{sub.path}",
+        params=sub.params,
+        headers=headers,
+        content=json.dumps(sub.body).encode() if sub.body is not None else None,
+    )
+    response = await transport.handle_async_request(upstream_request)
+    content = await response.aread()
+    await response.aclose()
+
+    body: Any = None
+    if content:
+        if response.headers.get("content-type", "").startswith("application/json"):
+            body = json.loads(content)
+        else:
+            body = content.decode(errors="replace")
+    forwarded = {name: response.headers[name] for name in FORWARDED_RESPONSE_HEADERS if name in response.headers}
+    return _result(sub, index, response.status_code, body, forwarded)
+
+
+@router.post("", tags=["System"])
+async def batch(
+    batch_data: BatchRequest,
+    request: Request,
+    current_user: Dict[str, Any] = Depends(get_current_active_user)
+):
+    """
+    Esegue più richieste al gateway in un'unica chiamata.
+
+    L'utente viene autenticato una sola volta; le sotto-richieste sono eseguite in parallelo
+    e i risultati restituiti nello stesso ordine. Quelle non completate entro la scadenza
+    del batch ricevono lo stato 504.
+    """
+    if SUB_REQUEST_HEADER in request.headers:
+        raise HTTPException(status_code=400, detail="Batch annidati non consentiti")
+    if not batch_data.requests:
+        raise HTTPException(status_code=400, detail="Il batch non contiene richieste")
+    if len(batch_data.requests) > config.BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Il batch può contenere al massimo {config.BATCH_MAX_REQUESTS} richieste"
+        )
+
+    deadline = time.monotonic() + config.BATCH_DEADLINE
+    authorization = request.headers["authorization"]
+    transport = httpx.ASGITransport(app=request.app)
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(batch_data.requests)
+    tasks: Dict[asyncio.Task, int] = {}
+    for index, sub in enumerate(batch_data.requests):
+        error = _validate(sub)
+        if error is not None:
+            results[index] = _result(sub, index, 400, {"detail": error})
+        else:
+            tasks[asyncio.ensure_future(_dispatch(transport, sub, index, authorization))] = index
+
+    if tasks:
+        done, pending = await asyncio.wait(tasks, timeout=max(0.0, deadline - time.monotonic()))
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for task, index in tasks.items():
+            sub = batch_data.requests[index]
+            if task in pending:
+                results[index] = _result(sub, index, 504, {"detail": "Scadenza del batch superata"})
+            elif task.exception() is not None:
+                results[index] = _result(sub, index, 500, {"detail": "Errore interno del gateway"})
+            else:
+                results[index] = task.result()
+
+    return {"responses": results}
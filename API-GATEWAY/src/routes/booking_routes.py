@@ -1,200 +1,301 @@
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, HTTPException, Depends, Header, Request
+from pydantic import BaseModel, Field
+import asyncio
 import httpx
+from datetime import datetime
 from typing import Dict, Any, Optional, List
+from .. import config
 from ..auth.jwt_auth import get_current_user, get_current_active_user
+from ..orchestration.saga import Saga, SagaStore
+from ..upstream.client import UpstreamClient, get_upstream
 
 router = APIRouter()
 
-# URL del servizio di prenotazioni
-BOOKING_SERVICE_URL = "http://booking-service:8002/api/v1"
+# Stato delle saghe di prenotazione completa, consultabile tramite polling
+saga_store = SagaStore(ttl=config.SAGA_TTL, max_entries=config.SAGA_MAX_ENTRIES)
 
-# URL del servizio di pagamento
-PAYMENT_SERVICE_URL = "http://payment-service:8005/api/v1"
 
-# URL del servizio di notifiche
-NOTIFICATION_SERVICE_URL = "http://notification-service:8004/api/v1"
+class CompleteBookingRequest(BaseModel):
+    """Dati della prenotazione completa, validati prima di avviare la saga."""
+    professional_id: int
+    service_id: int
+    date_time: datetime
+    amount: int = Field(..., gt=0)  # in centesimi
+    service_name: Optional[str] = None
+    notes: Optional[str] = None
+    payment_method_id: Optional[str] = None
+
 
 @router.post("/", response_model=Dict[str, Any], tags=["Bookings"])
-async def create_booking(booking_data: Dict[str, Any], current_user: Dict[str, Any] = Depends(get_current_user)):
+async def create_booking(
+    booking_data: Dict[str, Any],
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    booking_service: UpstreamClient = Depends(get_upstream("booking"))
+):
     """Crea una nuova prenotazione."""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{BOOKING_SERVICE_URL}/bookings",
-                json={**booking_data, "client_id": current_user["id"]}
-            )
-            if response.status_code >= 400:
-                raise HTTPException(status_code=response.status_code, detail=response.json())
-            return response.json()
+        response = await booking_service.post(
+            "/bookings",
+            json={**booking_data, "client_id": current_user["id"]}
+        )
+        if response.status_code >= 400:
+            raise HTTPException(status_code=response.status_code, detail=response.json())
+        return response.json()
     except httpx.RequestError:
         raise HTTPException(status_code=503, detail="Servizio di prenotazione non disponibile")
 
 @router.get("/{booking_id}", tags=["Bookings"])
-async def get_booking(booking_id: int, current_user: Dict[str, Any] = Depends(get_current_active_user)):
+async def get_booking(
+    booking_id: int,
+    current_user: Dict[str, Any] = Depends(get_current_active_user),
+    booking_service: UpstreamClient = Depends(get_upstream("booking"))
+):
     """Ottiene i dettagli di una prenotazione."""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{BOOKING_SERVICE_URL}/bookings/{booking_id}")
-            
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail=response.json())
+        response = await booking_service.get(f"/bookings/{booking_id}")
+        
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.json())
+        
+        # Verifica che l'utente sia autorizzato a vedere questa prenotazione
+        booking = response.json()
+        if booking["client_id"] != current_user["id"] and booking["professional_id"] != current_user["id"]:
+            raise HTTPException(status_code=403, detail="Non autorizzato")
             
-            # Verifica che l'utente sia autorizzato a vedere questa prenotazione
-            booking = response.json()
-            if booking["client_id"] != current_user["id"] and booking["professional_id"] != current_user["id"]:
-                raise HTTPException(status_code=403, detail="Non autorizzato")
-                
-            return booking
+        return booking
     except httpx.RequestError:
         raise HTTPException(status_code=503, detail="Servizio di prenotazione non disponibile")
 
 @router.delete("/{booking_id}", tags=["Bookings"])
-async def cancel_booking(booking_id: int, current_user: Dict[str, Any] = Depends(get_current_active_user)):
+async def cancel_booking(
+    booking_id: int,
+    current_user: Dict[str, Any] = Depends(get_current_active_user),
+    booking_service: UpstreamClient = Depends(get_upstream("booking"))
+):
     """Annulla una prenotazione."""
     try:
-        async with httpx.AsyncClient() as client:
-            # Prima verifica che l'utente sia autorizzato
-            booking_response = await client.get(f"{BOOKING_SERVICE_URL}/bookings/{booking_id}")
-            
-            if booking_response.status_code != 200:
-                raise HTTPException(status_code=booking_response.status_code, detail=booking_response.json())
-            
-            booking = booking_response.json()
-            if booking["client_id"] != current_user["id"] and booking["professional_id"] != current_user["id"]:
-                raise HTTPException(status_code=403, detail="Non autorizzato")
-            
-            # Poi cancella la prenotazione
-            response = await client.delete(f"{BOOKING_SERVICE_URL}/bookings/{booking_id}")
+        # Prima verifica che l'utente sia autorizzato
+        booking_response = await booking_service.get(f"/bookings/{booking_id}")
+        
+        if booking_response.status_code != 200:
+            raise HTTPException(status_code=booking_response.status_code, detail=booking_response.json())
+        
+        booking = booking_response.json()
+        if booking["client_id"] != current_user["id"] and booking["professional_id"] != current_user["id"]:
+            raise HTTPException(status_code=403, detail="Non autorizzato")
+        
+        # Poi cancella la prenotazione
+        response = await booking_service.delete(f"/bookings/{booking_id}")
+        
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.json())
             
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail=response.json())
-                
-            return {"message": "Prenotazione annullata con successo"}
+        return {"message": "Prenotazione annullata con successo"}
     except httpx.RequestError:
         raise HTTPException(status_code=503, detail="Servizio di prenotazione non disponibile")
 
 @router.get("/user/client", tags=["Bookings"])
-async def get_client_bookings(current_user: Dict[str, Any] = Depends(get_current_active_user)):
+async def get_client_bookings(
+    current_user: Dict[str, Any] = Depends(get_current_active_user),
+    booking_service: UpstreamClient = Depends(get_upstream("booking"))
+):
     """Ottiene le prenotazioni dell'utente corrente come cliente."""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{BOOKING_SERVICE_URL}/bookings/client/{current_user['id']}"
-            )
-            
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail=response.json())
-                
-            return response.json()
+        return await booking_service.proxy("GET", f"/bookings/client/{current_user['id']}")
     except httpx.RequestError:
         raise HTTPException(status_code=503, detail="Servizio di prenotazione non disponibile")
 
 @router.post("/complete", tags=["Bookings"])
 async def create_complete_booking(
-    booking_data: Dict[str, Any],
-    current_user: Dict[str, Any] = Depends(get_current_active_user)
+    booking_data: CompleteBookingRequest,
+    request: Request,
+    current_user: Dict[str, Any] = Depends(get_current_active_user),
+    booking_service: UpstreamClient = Depends(get_upstream("booking")),
+    payment_service: UpstreamClient = Depends(get_upstream("payment")),
+    notification_service: UpstreamClient = Depends(get_upstream("notification"))
 ):
     """
     Crea una prenotazione completa, inclusi pagamento e notifiche.
     
-    Questo endpoint orchestrerà l'intero flusso di prenotazione attraverso 
-    diversi microservizi.
+    Il flusso è orchestrato come una saga: disponibilità, prenotazione e pagamento sono
+    eseguiti in sequenza con un timeout per passo e, in caso di errore, la prenotazione
+    viene annullata. Le notifiche partono in parallelo in background dopo la risposta.
+    Lo stato della saga si può consultare con GET /bookings/complete/{saga_id}.
     """
+    date_time = booking_data.date_time.isoformat()
+    service_name = booking_data.service_name or "il servizio"
+    saga = saga_store.create(
+        "complete_booking",
+        owner_id=current_user["id"],
+        step_timeouts=config.SAGA_STEP_TIMEOUTS,
+        default_timeout=config.SAGA_DEFAULT_TIMEOUT
+    )
+    
     try:
-        async with httpx.AsyncClient() as client:
-            # 1. Verifica disponibilità
-            availability_response = await client.get(
-                f"{BOOKING_SERVICE_URL}/availability/{booking_data['professional_id']}/check",
-                params={
-                    "start_datetime": booking_data["date_time"],
-                    "end_datetime": booking_data["date_time"]  # il servizio calcolerà la fine in base alla durata
-                }
-            )
-            
-            if availability_response.status_code != 200 or not availability_response.json().get("is_available"):
-                raise HTTPException(status_code=400, detail="Professionista non disponibile in questo orario")
-        
-            # 2. Crea la prenotazione
-            booking_response = await client.post(
-                f"{BOOKING_SERVICE_URL}/bookings/",
-                json={
-                    "client_id": current_user["id"],
-                    "professional_id": booking_data["professional_id"],
-                    "service_id": booking_data["service_id"],
-                    "date_time": booking_data["date_time"],
-                    "notes": booking_data.get("notes")
-                }
-            )
-            
-            if booking_response.status_code != 200:
-                raise HTTPException(status_code=500, detail="Errore nella creazione della prenotazione")
-            
-            booking = booking_response.json()
-            
-            # 3. Crea l'intento di pagamento
-            payment_response = await client.post(
-                f"{PAYMENT_SERVICE_URL}/stripe/create-payment-intent",
-                json={
-                    "booking_id": booking["id"],
-                    "client_id": current_user["id"],
-                    "professional_id": booking_data["professional_id"],
-                    "amount": booking_data["amount"],
-                    "currency": "EUR",
-                    "payment_method_id": booking_data.get("payment_method_id")
-                }
-            )
-            
-            if payment_response.status_code != 200:
-                # Annulla la prenotazione in caso di errore di pagamento
-                await client.delete(f"{BOOKING_SERVICE_URL}/bookings/{booking['id']}")
-                raise HTTPException(status_code=500, detail="Errore nella creazione del pagamento")
-            
-            payment = payment_response.json()
-            
-            # 4. Invia notifiche
-            # Notifica al cliente
-            await client.post(
-                f"{NOTIFICATION_SERVICE_URL}/notifications",
-                json={
-                    "recipient_id": current_user["id"],
-                    "type": "booking",
-                    "title": "Prenotazione confermata",
-                    "message": f"La tua prenotazione per {booking_data['service_name']} il {booking_data['date_time']} è stata confermata."
-                }
-            )
-            
-            # Notifica al professionista
-            await client.post(
-                f"{NOTIFICATION_SERVICE_URL}/notifications",
-                json={
-                    "recipient_id": booking_data["professional_id"],
-                    "type": "booking",
-                    "title": "Nuova prenotazione",
-                    "message": f"Hai una nuova prenotazione per {booking_data['service_name']} il {booking_data['date_time']}."
-                }
-            )
-            
-            return {
-                "booking": booking,
-                "payment": payment,
-                "status": "confirmed"
+        # 1. Verifica disponibilità
+        availability_response = await saga.step("availability", lambda: booking_service.get(
+            f"/availability/{booking_data.professional_id}/check",
+            params={
+                "start_datetime": date_time,
+                "end_datetime": date_time,  # il servizio calcolerà la fine in base alla durata
+                "service_id": booking_data.service_id
             }
-            
+        ))
+        
+        if availability_response.status_code != 200 or not availability_response.json().get("is_available"):
+            await asyncio.shield(saga.abort("Professionista non disponibile in questo orario"))
+            raise HTTPException(status_code=400, detail="Professionista non disponibile in questo orario")
+    
+        # 2. Crea la prenotazione. La compensazione è registrata prima del passo e ritrova la
+        # prenotazione tramite la chiave di idempotenza, così viene annullata anche se la
+        # creazione va in timeout dopo che Booking l'ha già scritta
+        booking_key = f"{saga.id}-booking"
+        saga.compensate_with("create_booking", lambda: _cancel_booking(booking_service, saga, booking_key))
+        booking_response = await saga.step("create_booking", lambda: booking_service.post(
+            "/bookings/",
+            json={
+                "client_id": current_user["id"],
+                "professional_id": booking_data.professional_id,
+                "service_id": booking_data.service_id,
+                "date_time": date_time,
+                "notes": booking_data.notes
+            },
+            headers={"Idempotency-Key": booking_key}
+        ))
+        
+        if booking_response.status_code != 200:
+            await asyncio.shield(saga.abort("Errore nella creazione della prenotazione"))
+            raise HTTPException(status_code=500, detail="Errore nella creazione della prenotazione")
+        
+        booking = booking_response.json()
+        saga.data["booking_id"] = booking["id"]
+        
+        # 3. Crea l'intento di pagamento, con la stessa logica di compensazione
+        payment_key = f"{saga.id}-payment"
+        payment_request = {
+            "booking_id": booking["id"],
+            "client_id": current_user["id"],
+            "professional_id": booking_data.professional_id,
+            "amount": booking_data.amount,
+            "currency": "EUR",
+            "payment_method_id": booking_data.payment_method_id
+        }
+        saga.compensate_with("payment_intent", lambda: _cancel_payment_intent(
+            payment_service, saga, payment_key, payment_request
+        ))
+        payment_response = await saga.step("payment_intent", lambda: payment_service.post(
+            "/stripe/create-payment-intent",
+            json=payment_request,
+            headers={"Idempotency-Key": payment_key}
+        ))
+        
+        if payment_response.status_code != 200:
+            await asyncio.shield(saga.abort("Errore nella creazione del pagamento"))
+            raise HTTPException(status_code=500, detail="Errore nella creazione del pagamento")
+        
+        payment = payment_response.json()
+        saga.data["payment_intent_id"] = payment.get("id")
+    except asyncio.TimeoutError:
+        await asyncio.shield(saga.abort("Timeout di un servizio"))
+        raise HTTPException(status_code=504, detail="Timeout durante la creazione della prenotazione")
     except httpx.RequestError:
+        await asyncio.shield(saga.abort("Servizio non disponibile"))
         raise HTTPException(status_code=503, detail="Servizio non disponibile")
+    except BaseException:
+        # Qualunque altro errore (risposta non valida, client disconnesso, ...) non deve lasciare la
+        # saga in esecuzione: le compensazioni registrate vengono eseguite anche se la richiesta è
+        # annullata. Per le HTTPException sollevate sopra la saga è già interrotta e abort() non fa nulla
+        await asyncio.shield(saga.abort("Errore imprevisto"))
+        raise
+    
+    saga.complete()
+    
+    # 4. Invia notifiche in background, fuori dal percorso critico
+    dispatcher = request.app.state.dispatcher
+    # Notifica al cliente
+    dispatcher.submit(saga.background_step("notify_client", lambda: notification_service.post(
+        "/notifications",
+        json={
+            "recipient_id": current_user["id"],
+            "type": "booking",
+            "title": "Prenotazione confermata",
+            "message": f"La tua prenotazione per {service_name} il {date_time} è stata confermata."
+        }
+    )))
+    # Notifica al professionista
+    dispatcher.submit(saga.background_step("notify_professional", lambda: notification_service.post(
+        "/notifications",
+        json={
+            "recipient_id": booking_data.professional_id,
+            "type": "booking",
+            "title": "Nuova prenotazione",
+            "message": f"Hai una nuova prenotazione per {service_name} il {date_time}."
+        }
+    )))
+    
+    return {
+        "saga_id": saga.id,
+        "booking": booking,
+        "payment": payment,
+        "status": "confirmed"
+    }
+
+async def _cancel_booking(booking_service: UpstreamClient, saga: Saga, booking_key: str) -> Optional[httpx.Response]:
+    """Compensazione della creazione: annulla la prenotazione, cercandola per chiave se l'esito non è noto."""
+    booking_id = saga.data.get("booking_id")
+    if booking_id is None:
+        lookup = await booking_service.get(f"/bookings/by-key/{booking_key}")
+        if lookup.status_code == 404:
+            # La creazione non è mai stata registrata: non c'è nulla da annullare
+            return None
+        lookup.raise_for_status()
+        booking_id = saga.data["booking_id"] = lookup.json()["id"]
+    response = await booking_service.delete(f"/bookings/{booking_id}")
+    response.raise_for_status()
+    return response
+
+async def _cancel_payment_intent(payment_service: UpstreamClient, saga: Saga, payment_key: str,
+                                 payment_request: Dict[str, Any]) -> Optional[httpx.Response]:
+    """Compensazione del pagamento: annulla l'intent. Se l'esito della creazione non è noto, la
+    richiesta viene ripetuta con la stessa chiave di idempotenza, per cui Stripe restituisce
+    l'intent già creato (o ne crea uno che viene subito annullato)."""
+    payment_intent_id = saga.data.get("payment_intent_id")
+    if payment_intent_id is None:
+        replay = await payment_service.post(
+            "/stripe/create-payment-intent",
+            json=payment_request,
+            headers={"Idempotency-Key": payment_key}
+        )
+        if replay.status_code != 200:
+            # Stripe ha rifiutato la richiesta: nessun intent da annullare
+            return None
+        payment_intent_id = saga.data["payment_intent_id"] = replay.json()["id"]
+    response = await payment_service.post(f"/stripe/payment-intents/{payment_intent_id}/cancel")
+    response.raise_for_status()
+    return response
+
+@router.get("/complete/{saga_id}", tags=["Bookings"])
+async def get_complete_booking_status(
+    saga_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_active_user)
+):
+    """Restituisce lo stato della saga di una prenotazione completa."""
+    saga = saga_store.get(saga_id)
+    if saga is None or saga.owner_id != current_user["id"]:
+        raise HTTPException(status_code=404, detail="Saga non trovata")
+    return saga.snapshot()
 
 @router.get("/", response_model=List[Dict[str, Any]], tags=["Bookings"])
 async def get_user_bookings(
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    booking_service: UpstreamClient = Depends(get_upstream("booking"))
 ):
-    """Recupera le prenotazioni dell'utente corrente"""
+    """Recupera una pagina delle prenotazioni dell'utente corrente; la successiva si richiede
+    con il cursore restituito nell'header X-Next-Cursor."""
+    params = {name: value for name, value in (("limit", limit), ("cursor", cursor)) if value is not None}
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{BOOKING_SERVICE_URL}/bookings/user/{current_user['id']}"
-            )
-            if response.status_code >= 400:
-                raise HTTPException(status_code=response.status_code, detail=response.json())
-            return response.json()
+        return await booking_service.proxy("GET", f"/bookings/user/{current_user['id']}", params=params)
     except httpx.RequestError:
         raise HTTPException(status_code=503, detail="Servizio di prenotazione non disponibile")
\ No newline at end of file
@@ -1,16 +1,28 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 import httpx
 from typing import Dict, Any, List
+from .. import config
 from ..auth.jwt_auth import get_current_user
+from ..upstream.cache import ResponseCache
+from ..upstream.client import UpstreamClient, get_upstream
 
 router = APIRouter()
-CATALOG_SERVICE_URL = "http://catalog-service:8003/api/v1"
+
+# Cache delle risposte del catalogo, con revalidazione tramite ETag
+catalog_cache = ResponseCache(
+    ttls=config.CATALOG_CACHE_TTLS,
+    max_entries=config.CATALOG_CACHE_MAX_ENTRIES,
+    max_bytes=config.CATALOG_CACHE_MAX_BYTES,
+    max_entry_bytes=config.CATALOG_CACHE_MAX_ENTRY_BYTES,
+)
 
 @router.get("/services", tags=["Catalog"])
 async def get_services(
+    request: Request,
     specialty: str = None,
     category: str = None,
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    catalog_service: UpstreamClient = Depends(get_upstream("catalog"))
 ):
     """Recupera l'elenco dei servizi."""
     try:
@@ -20,85 +32,58 @@ async def get_services(
         if category:
             params["category"] = category
             
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{CATALOG_SERVICE_URL}/services",
-                params=params
-            )
-            
-            if response.status_code >= 400:
-                raise HTTPException(status_code=response.status_code, detail=response.json())
-                
-            return response.json()
+        return await catalog_cache.fetch(
+            request, catalog_service, "catalog.services", "/services", params=params, user=current_user
+        )
     except httpx.RequestError:
         raise HTTPException(status_code=503, detail="Servizio catalogo non disponibile")
 
 @router.get("/services/{service_id}", tags=["Catalog"])
 async def get_service(
+    request: Request,
     service_id: int,
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    catalog_service: UpstreamClient = Depends(get_upstream("catalog"))
 ):
     """Recupera i dettagli di un servizio specifico."""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{CATALOG_SERVICE_URL}/services/{service_id}"
-            )
-            
-            if response.status_code >= 400:
-                raise HTTPException(status_code=response.status_code, detail=response.json())
-                
-            return response.json()
+        return await catalog_cache.fetch(
+            request, catalog_service, "catalog.service", f"/services/{service_id}", user=current_user
+        )
     except httpx.RequestError:
         raise HTTPException(status_code=503, detail="Servizio catalogo non disponibile")
 
 @router.get("/specialties", tags=["Catalog"])
-async def get_specialties():
+async def get_specialties(request: Request, catalog_service: UpstreamClient = Depends(get_upstream("catalog"))):
     """Recupera l'elenco delle specialità disponibili."""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{CATALOG_SERVICE_URL}/specialties"
-            )
-            
-            if response.status_code >= 400:
-                raise HTTPException(status_code=response.status_code, detail=response.json())
-                
-            return response.json()
+        return await catalog_cache.fetch(request, catalog_service, "catalog.specialties", "/specialties")
     except httpx.RequestError:
         raise HTTPException(status_code=503, detail="Servizio catalogo non disponibile")
 
 @router.get("/categories", tags=["Catalog"])
-async def get_categories():
+async def get_categories(request: Request, catalog_service: UpstreamClient = Depends(get_upstream("catalog"))):
     """Recupera l'elenco delle categorie di servizi disponibili."""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{CATALOG_SERVICE_URL}/categories"
-            )
-            
-            if response.status_code >= 400:
-                raise HTTPException(status_code=response.status_code, detail=response.json())
-                
-            return response.json()
+        return await catalog_cache.fetch(request, catalog_service, "catalog.categories", "/categories")
     except httpx.RequestError:
         raise HTTPException(status_code=503, detail="Servizio catalogo non disponibile")
 
 @router.get("/professionals/{professional_id}/services", tags=["Catalog"])
 async def get_professional_services(
+    request: Request,
     professional_id: int,
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    catalog_service: UpstreamClient = Depends(get_upstream("catalog"))
 ):
     """Recupera i servizi offerti da un professionista specifico."""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{CATALOG_SERVICE_URL}/professionals/{professional_id}/services"
-            )
-            
-            if response.status_code >= 400:
-                raise HTTPException(status_code=response.status_code, detail=response.json())
-                
-            return response.json()
+        return await catalog_cache.fetch(
+            request,
+            catalog_service,
+            "catalog.professional_services",
+            f"/professionals/{professional_id}/services",
+            user=current_user
+        )
     except httpx.RequestError:
         raise HTTPException(status_code=503, detail="Servizio catalogo non disponibile")
\ No newline at end of file
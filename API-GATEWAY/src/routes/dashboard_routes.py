@@ -0,0 +1,133 @@
+from fastapi import APIRouter, Depends
+import asyncio
+import httpx
+from datetime import datetime
+from typing import Dict, Any, Awaitable, Callable, List, Optional
+from .. import config
+from ..auth.jwt_auth import get_current_active_user, oauth2_scheme
+from ..upstream.client import UpstreamClient, get_upstream
+
+router = APIRouter()
+
+
+class SectionError(Exception):
+    """Errore di una singola sezione della dashboard, riportato nella risposta senza far fallire le altre."""
+
+    def __init__(self, status_code: int, detail: Any):
+        self.status_code = status_code
+        self.detail = detail
+
+
+async def _fetch_section(
+    name: str,
+    call: Callable[[], Awaitable[httpx.Response]],
+    transform: Optional[Callable[[Any], Any]] = None,
+) -> Any:
+    """Esegue la chiamata di una sezione entro la propria scadenza e ne restituisce i dati."""
+    timeout = config.DASHBOARD_TIMEOUTS.get(name, config.DASHBOARD_DEFAULT_TIMEOUT)
+    try:
+        response = await asyncio.wait_for(call(), timeout=timeout)
+    except asyncio.TimeoutError:
+        raise SectionError(504, "Il servizio non ha risposto in tempo")
+    except httpx.RequestError:
+        raise SectionError(503, "Servizio non disponibile")
+
+    if response.status_code >= 400:
+        try:
+            detail = response.json().get("detail")
+        except ValueError:
+            detail = response.text
+        raise SectionError(response.status_code, detail)
+
+    data = response.json()
+    return transform(data) if transform else data
+
+
+def _upcoming(bookings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Prenotazioni future non annullate, dalla più vicina."""
+    now = datetime.utcnow().isoformat()
+    upcoming = [
+        booking for booking in bookings
+        if str(booking.get("date_time", "")) >= now and booking.get("status") != "cancelled"
+    ]
+    upcoming.sort(key=lambda booking: str(booking.get("date_time", "")))
+    return upcoming[:config.DASHBOARD_UPCOMING_BOOKINGS]
+
+
+@router.get("/dashboard", tags=["Dashboard"])
+async def get_dashboard(
+    current_user: Dict[str, Any] = Depends(get_current_active_user),
+    token: str = Depends(oauth2_scheme),
+    users_service: UpstreamClient = Depends(get_upstream("users")),
+    booking_service: UpstreamClient = Depends(get_upstream("booking")),
+    notification_service: UpstreamClient = Depends(get_upstream("notification"))
+):
+    """
+    Restituisce in una sola chiamata i dati della schermata principale dell'utente.
+
+    Le sezioni vengono richieste ai servizi in parallelo, ciascuna con la propria scadenza.
+    Se un servizio è lento o non disponibile la sezione vale null e l'errore è riportato in
+    "errors", mentre le altre sezioni vengono restituite comunque.
+    """
+    user_id = current_user["id"]
+    # I servizi verificano a loro volta il token e i permessi dell'utente sui dati richiesti
+    auth_headers = {"Authorization": f"Bearer {token}"}
+    sections = {
+        "profile": _fetch_section(
+            "profile",
+            lambda: users_service.get(f"/users/{user_id}", headers=auth_headers)
+        ),
+        "upcoming_bookings": _fetch_section(
+            "upcoming_bookings",
+            lambda: booking_service.get(
+                f"/bookings/user/{user_id}",
+                params={
+                    "status": "pending,confirmed",
+                    "order": "asc",
+                    "from_datetime": datetime.utcnow().isoformat(),
+                    "limit": config.DASHBOARD_UPCOMING_BOOKINGS
+                },
+                headers=auth_headers
+            ),
+            _upcoming
+        ),
+        "unread_notifications": _fetch_section(
+            "unread_notifications",
+            lambda: notification_service.get(f"/notifications/user/{user_id}/count", headers=auth_headers),
+            lambda data: data.get("unread_count", 0)
+        ),
+        "latest_notifications": _fetch_section(
+            "latest_notifications",
+            lambda: notification_service.get(
+                f"/notifications/user/{user_id}",
+                params={"limit": config.DASHBOARD_LATEST_NOTIFICATIONS},
+                headers=auth_headers
+            )
+        ),
+        "health_records": _fetch_section(
+            "health_records",
+            lambda: users_service.get(
+                f"/health-records/user/{user_id}",
+                params={"limit": config.DASHBOARD_HEALTH_RECORDS},
+                headers=auth_headers
+            )
+        ),
+    }
+
+    results = await asyncio.gather(*sections.values(), return_exceptions=True)
+
+    dashboard: Dict[str, Any] = {}
+    errors: Dict[str, Dict[str, Any]] = {}
+    for name, result in zip(sections, results):
+        if isinstance(result, SectionError):
+            dashboard[name] = None
+            errors[name] = {"status": result.status_code, "detail": result.detail}
+        elif isinstance(result, Exception):
+            dashboard[name] = None
+            errors[name] = {"status": 502, "detail": "Risposta del servizio non valida"}
+        else:
+            dashboard[name] = result
+
+    dashboard["errors"] = errors
+    dashboard["partial"] = bool(errors)
+    return dashboard
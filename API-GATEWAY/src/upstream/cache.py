@@ -0,0 +1,149 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from fastapi import HTTPException, Request, Response
+
+from .. import config
+from .client import UpstreamClient
+from .singleflight import normalize_params
+
+
+class CachedResponse:
+    """Risposta di un servizio memorizzata nella cache del gateway."""
+
+    __slots__ = ("body", "media_type", "etag", "upstream_etag", "expires_at")
+
+    def __init__(self, body: bytes, media_type: Optional[str], upstream_etag: Optional[str], ttl: float):
+        self.body = body
+        self.media_type = media_type
+        self.upstream_etag = upstream_etag
+        # Se il servizio non fornisce un ETag lo calcoliamo dal contenuto
+        self.etag = upstream_etag or f'W/"{hashlib.sha1(body).hexdigest()}"'
+        self.expires_at = time.monotonic() + ttl
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    if "*" in candidates:
+        return True
+    # Confronto debole: i prefissi W/ non contano
+    bare = etag[2:] if etag.startswith("W/") else etag
+    return any((c[2:] if c.startswith("W/") else c) == bare for c in candidates)
+
+
+class ResponseCache:
+    """Cache LRU in memoria delle risposte GET, con TTL per route e limite sulla dimensione totale.
+
+    Alla scadenza di una voce il servizio viene interrogato con If-None-Match: se risponde 304
+    la voce viene semplicemente rinnovata. I client che inviano l'ETag corrente ricevono 304.
+    """
+
+    def __init__(
+        self,
+        ttls: Dict[str, float],
+        max_entries: int = 1024,
+        max_bytes: int = 16 * 1024 * 1024,
+        max_entry_bytes: int = 1024 * 1024,
+    ):
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    async def fetch(
+        self,
+        request: Request,
+        client: UpstreamClient,
+        route: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        user: Optional[Dict[str, Any]] = None,
+    ) -> Response:
+        """Restituisce la risposta del servizio per la route indicata, servendola dalla cache quando possibile.
+
+        Se la route è coalescente per utente (SINGLEFLIGHT_ROUTES "user") anche le voci della
+        cache sono separate per utente.
+        """
+        ttl = self.ttls.get(route)
+        if ttl is None:
+            response = await client.get(path, params=params, coalesce=route, user=user)
+            if response.status_code >= 400:
+                raise HTTPException(status_code=response.status_code, detail=response.json())
+            return Response(content=response.content, status_code=response.status_code,
+                            media_type=response.headers.get("content-type"))
+
+        owner = (user or {}).get("id") if config.SINGLEFLIGHT_ROUTES.get(route) == "user" else None
+        key = (client.name, path, normalize_params(params), owner)
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > time.monotonic():
+            self.hits += 1
+            self._entries.move_to_end(key)
+        else:
+            self.misses += 1
+            headers = {}
+            if entry is not None and entry.upstream_etag:
+                headers["If-None-Match"] = entry.upstream_etag
+            response = await client.get(path, params=params, headers=headers, coalesce=route, user=user)
+
+            if response.status_code == 304 and entry is not None:
+                # Il contenuto non è cambiato: si rinnova la scadenza della voce esistente, che va
+                # reinserita perché durante la richiesta può essere stata rimossa da altri _put
+                self.revalidated += 1
+                entry.expires_at = time.monotonic() + ttl
+                self._put(key, entry)
+            elif response.status_code >= 400:
+                raise HTTPException(status_code=response.status_code, detail=response.json())
+            elif response.status_code != 200:
+                return Response(content=response.content, status_code=response.status_code,
+                                media_type=response.headers.get("content-type"))
+            else:
+                entry = CachedResponse(response.content, response.headers.get("content-type"),
+                                       response.headers.get("etag"), ttl)
+                self._put(key, entry)
+
+        remaining = max(0, int(entry.expires_at - time.monotonic()))
+        headers = {"ETag": entry.etag, "Cache-Control": f"private, max-age={remaining}"}
+        if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+
+    def _put(self, key: Hashable, entry: CachedResponse) -> None:
+        self._remove(key)
+        if entry.size > self.max_entry_bytes:
+            return
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+        }
@@ -0,0 +1,303 @@
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from fastapi import Request
+from starlette.background import BackgroundTask
+from starlette.responses import StreamingResponse
+from healthmatch_common.tracing import TracedTransport
+
+from .. import config
+from ..metrics.gateway import (
+    UPSTREAM_CIRCUIT_STATE,
+    UPSTREAM_IN_FLIGHT,
+    UPSTREAM_POOL_CONNECTIONS,
+    UPSTREAM_REJECTED,
+    UPSTREAM_REQUEST_DURATION,
+    UPSTREAM_RESPONSES,
+    UPSTREAM_TIMEOUTS,
+)
+from ..metrics.registry import registry, route_template
+from .resilience import Bulkhead, BulkheadFullError, CircuitBreaker, CircuitOpenError
+from .singleflight import SingleFlight, normalize_params
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  # richiesto da httpx per HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Header legati alla singola connessione, da non inoltrare al client
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "transfer-encoding", "upgrade",
+}
+# Header condizionali: fanno parte della chiave delle GET coalescenti
+CONDITIONAL_HEADERS = ("if-none-match", "if-modified-since")
+
+
+class UpstreamClient:
+    """Client HTTP condiviso verso un singolo microservizio, con pool di connessioni persistente.
+
+    Ogni chiamata passa dal circuit breaker e dal bulkhead del servizio: se il circuito è aperto
+    o non ci sono slot liberi viene sollevata una sottoclasse di httpx.RequestError, che le route
+    traducono già in una risposta 503.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        limits: httpx.Limits,
+        timeout: httpx.Timeout,
+        http2: bool = False,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.name = name
+        self.base_url = base_url
+        self.circuit_breaker = CircuitBreaker.for_service(name)
+        self.bulkhead = Bulkhead.for_service(name)
+        self.singleflight = SingleFlight()
+        # Il trasporto propaga il traceparent e registra uno span per ogni chiamata
+        self._transport = TracedTransport(transport or httpx.AsyncHTTPTransport(limits=limits, http2=http2))
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            transport=self._transport,
+        )
+
+    async def request(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        """Esegue una richiesta verso il microservizio riutilizzando le connessioni del pool."""
+        route = route_template()
+        self._before_call(route)
+        recorded = False
+        try:
+            async with self.bulkhead:
+                start = time.perf_counter()
+                try:
+                    response = await self._client.request(method, path, **kwargs)
+                except httpx.RequestError as exc:
+                    self.circuit_breaker.record(False)
+                    recorded = True
+                    self._observe(route, method, start, exc)
+                    raise
+                # Gli errori 5xx indicano un servizio in difficoltà, i 4xx no
+                self.circuit_breaker.record(response.status_code < 500)
+                recorded = True
+                self._observe(route, method, start, response)
+                return response
+        except BulkheadFullError:
+            UPSTREAM_REJECTED.inc(self.name, "bulkhead_full")
+            raise
+        finally:
+            if not recorded:
+                self.circuit_breaker.release()
+
+    def _before_call(self, route: str) -> None:
+        try:
+            self.circuit_breaker.before_call()
+        except CircuitOpenError:
+            UPSTREAM_REJECTED.inc(self.name, "circuit_open")
+            raise
+
+    def _observe(self, route: str, method: str, start: float, outcome: Any) -> None:
+        """Registra durata ed esito di una chiamata al servizio."""
+        UPSTREAM_REQUEST_DURATION.observe(self.name, route, method, value=time.perf_counter() - start)
+        if isinstance(outcome, httpx.Response):
+            status = str(outcome.status_code)
+        elif isinstance(outcome, httpx.TimeoutException):
+            status = "timeout"
+            UPSTREAM_TIMEOUTS.inc(self.name, route)
+        else:
+            status = "error"
+        UPSTREAM_RESPONSES.inc(self.name, route, method, status)
+
+    async def proxy(self, method: str, path: str, **kwargs: Any) -> StreamingResponse:
+        """Inoltra la risposta del servizio al client così com'è, in streaming e senza decodificarne il corpo.
+
+        Lo slot del bulkhead resta occupato finché il corpo non è stato trasmesso completamente.
+        """
+        route = route_template()
+        self._before_call(route)
+        try:
+            await self.bulkhead.__aenter__()
+        except BulkheadFullError:
+            UPSTREAM_REJECTED.inc(self.name, "bulkhead_full")
+            self.circuit_breaker.release()
+            raise
+        except BaseException:
+            self.circuit_breaker.release()
+            raise
+
+        start = time.perf_counter()
+        try:
+            upstream_request = self._client.build_request(method, path, **kwargs)
+            response = await self._client.send(upstream_request, stream=True)
+        except httpx.RequestError as exc:
+            self.circuit_breaker.record(False)
+            self._observe(route, method, start, exc)
+            await self.bulkhead.__aexit__(None, None, None)
+            raise
+        except BaseException:
+            self.circuit_breaker.release()
+            await self.bulkhead.__aexit__(None, None, None)
+            raise
+        self.circuit_breaker.record(response.status_code < 500)
+        self._observe(route, method, start, response)
+
+        closed = False
+
+        async def close() -> None:
+            # Chiamata sia a fine streaming sia come background task: deve essere idempotente
+            nonlocal closed
+            if closed:
+                return
+            closed = True
+            await response.aclose()
+            await self.bulkhead.__aexit__(None, None, None)
+
+        async def body():
+            try:
+                async for chunk in response.aiter_raw():
+                    yield chunk
+            finally:
+                await close()
+
+        headers = {
+            name: value for name, value in response.headers.items()
+            if name.lower() not in HOP_BY_HOP_HEADERS
+        }
+        return StreamingResponse(
+            body(),
+            status_code=response.status_code,
+            headers=headers,
+            background=BackgroundTask(close),
+        )
+
+    async def get(
+        self,
+        path: str,
+        coalesce: Optional[str] = None,
+        user: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """Esegue una GET; se `coalesce` è una route abilitata in SINGLEFLIGHT_ROUTES,
+        le richieste identiche concorrenti condividono una sola chiamata verso il servizio."""
+        scope = config.SINGLEFLIGHT_ROUTES.get(coalesce) if coalesce else None
+        owner = None
+        if scope == "user":
+            owner = (user or {}).get("id")
+            if owner is None:
+                scope = None
+        if scope is None:
+            return await self.request("GET", path, **kwargs)
+
+        # Una GET condizionale non condivide la chiamata con una incondizionata: chi non ha una
+        # copia in cache riceverebbe il 304 destinato a chi la sta rivalidando
+        headers = httpx.Headers(kwargs.get("headers") or {})
+        conditional = tuple(headers.get(name) for name in CONDITIONAL_HEADERS)
+        key = (path, normalize_params(kwargs.get("params")), owner, conditional)
+        return await self.singleflight.do(key, lambda: self.request("GET", path, **kwargs))
+
+    async def post(self, path: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def put(self, path: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("PUT", path, **kwargs)
+
+    async def patch(self, path: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("PATCH", path, **kwargs)
+
+    async def delete(self, path: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("DELETE", path, **kwargs)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    def pool_usage(self) -> Dict[str, int]:
+        """Connessioni attive e inattive nel pool verso il servizio."""
+        pool = getattr(self._transport.wrapped, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {"active": len(connections) - idle, "idle": idle}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Stato corrente del circuit breaker e del bulkhead del servizio."""
+        return {
+            "circuit_breaker": self.circuit_breaker.snapshot(),
+            "bulkhead": self.bulkhead.snapshot(),
+            "singleflight": self.singleflight.snapshot(),
+        }
+
+
+class UpstreamRegistry:
+    """Raccolta dei client condivisi, uno per ogni microservizio a valle del gateway."""
+
+    def __init__(
+        self,
+        service_urls: Dict[str, str],
+        limits: Optional[httpx.Limits] = None,
+        timeout: Optional[httpx.Timeout] = None,
+        http2: Optional[bool] = None,
+        transports: Optional[Dict[str, httpx.AsyncBaseTransport]] = None,
+    ):
+        self.service_urls = dict(service_urls)
+        # Trasporti alternativi per servizio (es. servizi simulati nei benchmark), al posto della rete
+        self.transports = dict(transports or {})
+        self.limits = limits or httpx.Limits(
+            max_connections=config.UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=config.UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.UPSTREAM_KEEPALIVE_EXPIRY,
+        )
+        self.timeout = timeout or httpx.Timeout(
+            connect=config.UPSTREAM_CONNECT_TIMEOUT,
+            read=config.UPSTREAM_READ_TIMEOUT,
+            write=config.UPSTREAM_WRITE_TIMEOUT,
+            pool=config.UPSTREAM_POOL_TIMEOUT,
+        )
+        self.http2 = config.UPSTREAM_HTTP2 if http2 is None else http2
+        if self.http2 and not HTTP2_AVAILABLE:
+            logger.warning("Pacchetto 'h2' non installato: i pool verso i servizi useranno HTTP/1.1")
+            self.http2 = False
+        self._clients: Dict[str, UpstreamClient] = {}
+
+    def start(self) -> None:
+        """Crea i pool di connessioni verso tutti i microservizi."""
+        for name, base_url in self.service_urls.items():
+            self._clients[name] = UpstreamClient(
+                name, base_url, self.limits, self.timeout, self.http2, self.transports.get(name)
+            )
+        registry.add_collector(self.collect_metrics)
+
+    def collect_metrics(self) -> None:
+        """Aggiorna i gauge di concorrenza, pool e circuit breaker prima dell'esportazione delle metriche."""
+        for name, client in self._clients.items():
+            UPSTREAM_IN_FLIGHT.set(name, value=client.bulkhead.in_flight)
+            for state, count in client.pool_usage().items():
+                UPSTREAM_POOL_CONNECTIONS.set(name, state, value=count)
+            current = client.circuit_breaker.state
+            for state in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN):
+                UPSTREAM_CIRCUIT_STATE.set(name, state, value=1 if state == current else 0)
+
+    async def aclose(self) -> None:
+        """Chiude tutti i pool di connessioni."""
+        registry.remove_collector(self.collect_metrics)
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+    def __getitem__(self, name: str) -> UpstreamClient:
+        return self._clients[name]
+
+    def __iter__(self):
+        return iter(self._clients.items())
+
+
+def get_upstream(name: str):
+    """Dipendenza FastAPI che restituisce il client condiviso del servizio indicato."""
+    async def _get_upstream(request: Request) -> UpstreamClient:
+        return request.app.state.upstreams[name]
+    return _get_upstream
@@ -0,0 +1,114 @@
+import asyncio
+import datetime
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from .. import config
+from .client import UpstreamClient, UpstreamRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """Stato aggregato dei microservizi, sondati in parallelo e mantenuto in cache.
+
+    Un task in background aggiorna periodicamente il risultato, così le richieste
+    di health check non generano chiamate verso i servizi.
+    """
+
+    def __init__(
+        self,
+        upstreams: UpstreamRegistry,
+        probe_timeout: float = config.HEALTH_PROBE_TIMEOUT,
+        deadline: float = config.HEALTH_DEADLINE,
+        ttl: float = config.HEALTH_CACHE_TTL,
+        refresh_interval: float = config.HEALTH_REFRESH_INTERVAL,
+    ):
+        self.upstreams = upstreams
+        self.probe_timeout = probe_timeout
+        self.deadline = deadline
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _probe(self, client: UpstreamClient) -> Tuple[str, Optional[float]]:
+        started = time.perf_counter()
+        try:
+            response = await client.get("/status", timeout=self.probe_timeout)
+            status = "online" if response.status_code == 200 else "degraded"
+        except Exception:  # Qualsiasi errore rende il servizio irraggiungibile
+            status = "offline"
+        return status, round((time.perf_counter() - started) * 1000, 2)
+
+    async def check(self) -> Dict[str, Any]:
+        """Sonda tutti i servizi in parallelo entro la scadenza globale."""
+        tasks = {name: asyncio.ensure_future(self._probe(client)) for name, client in self.upstreams}
+        if tasks:
+            await asyncio.wait(tasks.values(), timeout=self.deadline)
+
+        health_status = {}
+        latency_ms = {}
+        for name, task in tasks.items():
+            if task.done():
+                health_status[name], latency_ms[name] = task.result()
+            else:
+                # Il servizio non ha risposto entro la scadenza globale
+                task.cancel()
+                health_status[name], latency_ms[name] = "offline", None
+
+        # Determina lo stato complessivo del sistema
+        overall_status = "healthy"
+        if "offline" in health_status.values():
+            overall_status = "degraded"
+        if all(status == "offline" for status in health_status.values()):
+            overall_status = "offline"
+
+        return {
+            "status": overall_status,
+            "services": health_status,
+            "latency_ms": latency_ms,
+            "timestamp": datetime.datetime.now().isoformat()
+        }
+
+    async def refresh(self) -> Dict[str, Any]:
+        snapshot = await self.check()
+        self._snapshot = snapshot
+        self._checked_at = time.monotonic()
+        return snapshot
+
+    async def get(self) -> Dict[str, Any]:
+        """Restituisce lo stato in cache, aggiornandolo solo se scaduto."""
+        if self._snapshot is not None and time.monotonic() - self._checked_at < self.ttl:
+            return self._snapshot
+        async with self._lock:
+            # Un'altra richiesta potrebbe aver già aggiornato il risultato
+            if self._snapshot is not None and time.monotonic() - self._checked_at < self.ttl:
+                return self._snapshot
+            return await self.refresh()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with self._lock:
+                    await self.refresh()
+            except Exception as e:
+                logger.warning(f"Errore durante l'aggiornamento dello stato dei servizi: {str(e)}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self) -> None:
+        """Avvia l'aggiornamento periodico in background."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,164 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Tuple
+
+import httpx
+
+from .. import config
+
+
+class CircuitOpenError(httpx.RequestError):
+    """Il circuito verso il servizio è aperto: la chiamata viene rifiutata senza contattarlo."""
+
+
+class BulkheadFullError(httpx.RequestError):
+    """Tutti gli slot di concorrenza verso il servizio sono occupati."""
+
+
+class CircuitBreaker:
+    """Circuit breaker a tre stati (closed, open, half_open) basato sul tasso di errori in una finestra temporale."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        min_calls: int = 10,
+        window_seconds: float = 30.0,
+        cooldown_seconds: float = 15.0,
+        half_open_max_calls: int = 1,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._failures = 0
+
+    @classmethod
+    def for_service(cls, service: str) -> "CircuitBreaker":
+        return cls(
+            service,
+            failure_rate=config.service_setting("CIRCUIT_FAILURE_RATE", service, "0.5"),
+            min_calls=config.service_setting("CIRCUIT_MIN_CALLS", service, "10", int),
+            window_seconds=config.service_setting("CIRCUIT_WINDOW_SECONDS", service, "30"),
+            cooldown_seconds=config.service_setting("CIRCUIT_COOLDOWN_SECONDS", service, "15"),
+            half_open_max_calls=config.service_setting("CIRCUIT_HALF_OPEN_MAX_CALLS", service, "1", int),
+        )
+
+    @property
+    def state(self) -> str:
+        # Trascorso il periodo di raffreddamento il circuito passa in half_open
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+            self._state = self.HALF_OPEN
+            self._half_open_in_flight = 0
+        return self._state
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            _, success = self._outcomes.popleft()
+            if not success:
+                self._failures -= 1
+
+    def before_call(self) -> None:
+        """Verifica che la chiamata possa procedere, altrimenti solleva CircuitOpenError."""
+        state = self.state
+        if state == self.OPEN:
+            raise CircuitOpenError(f"Circuito aperto verso il servizio {self.name}")
+        if state == self.HALF_OPEN:
+            if self._half_open_in_flight >= self.half_open_max_calls:
+                raise CircuitOpenError(f"Circuito in prova verso il servizio {self.name}")
+            self._half_open_in_flight += 1
+
+    def record(self, success: bool) -> None:
+        """Registra l'esito di una chiamata e aggiorna lo stato del circuito."""
+        now = time.monotonic()
+        if self._state == self.HALF_OPEN:
+            self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+            if success:
+                self._close()
+            else:
+                self._open(now)
+            return
+
+        self._outcomes.append((now, success))
+        if not success:
+            self._failures += 1
+        self._trim(now)
+
+        calls = len(self._outcomes)
+        if self._state == self.CLOSED and calls >= self.min_calls and self._failures / calls >= self.failure_rate:
+            self._open(now)
+
+    def release(self) -> None:
+        """Libera lo slot di prova quando una chiamata termina senza esito (es. richiesta annullata)."""
+        if self._state == self.HALF_OPEN:
+            self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+
+    def _open(self, now: float) -> None:
+        self._state = self.OPEN
+        self._opened_at = now
+
+    def _close(self) -> None:
+        self._state = self.CLOSED
+        self._outcomes.clear()
+        self._failures = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._trim(time.monotonic())
+        calls = len(self._outcomes)
+        return {
+            "state": self.state,
+            "calls": calls,
+            "failures": self._failures,
+            "failure_rate": round(self._failures / calls, 3) if calls else 0.0,
+        }
+
+
+class Bulkhead:
+    """Limite di chiamate concorrenti verso un servizio, con attesa massima per ottenere uno slot."""
+
+    def __init__(self, name: str, max_concurrency: int = 50, max_wait: float = 0.5):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.rejected = 0
+
+    @classmethod
+    def for_service(cls, service: str) -> "Bulkhead":
+        return cls(
+            service,
+            max_concurrency=config.service_setting("BULKHEAD_MAX_CONCURRENCY", service, "50", int),
+            max_wait=config.service_setting("BULKHEAD_MAX_WAIT", service, "0.5"),
+        )
+
+    async def __aenter__(self) -> "Bulkhead":
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise BulkheadFullError(f"Troppe richieste concorrenti verso il servizio {self.name}")
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,43 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+def normalize_params(params: Optional[Dict[str, Any]]) -> Tuple[Tuple[str, str], ...]:
+    """Rende la query indipendente dall'ordine dei parametri, per usarla come chiave."""
+    if not params:
+        return ()
+    return tuple(sorted((str(key), str(value)) for key, value in params.items() if value is not None))
+
+
+class SingleFlight:
+    """Fa condividere una sola chiamata in corso a tutte le richieste concorrenti con la stessa chiave.
+
+    La chiamata gira in un task separato: se il primo richiedente si disconnette, gli altri
+    ricevono comunque il risultato.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.followers += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: "asyncio.Future[Any]") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Evita avvisi di eccezione non recuperata se tutti i richiedenti sono stati annullati
+        if not task.cancelled():
+            task.exception()
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"in_flight": len(self._calls), "leaders": self.leaders, "followers": self.followers}
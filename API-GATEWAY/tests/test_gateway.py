@@ -0,0 +1,787 @@
+import asyncio
+import gzip
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from src.auth.jwt_auth import get_current_active_user
+from src.middleware import rate_limit
+from src.middleware.idempotency import IdempotencyMiddleware, IdempotencyStore
+from src.middleware.load_shedding import GradientLimiter, LoadSheddingMiddleware
+from src.middleware.metrics import MetricsMiddleware
+from src.metrics.registry import MetricsRegistry
+from src.middleware.rate_limit import InMemoryBackend, RateLimitMiddleware
+from src.orchestration.saga import Saga
+from src import config
+from src.routes import batch_routes, booking_routes, dashboard_routes
+from src.upstream import resilience
+from src.upstream.cache import CachedResponse, ResponseCache
+from src.upstream.client import UpstreamClient
+from src.upstream.health import HealthMonitor
+from src.upstream.resilience import CircuitBreaker, CircuitOpenError
+
+# Orologio controllato dai test, al posto di time.monotonic
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(resilience, "time", fake)
+    return fake
+
+def make_breaker(**kwargs):
+    settings = dict(failure_rate=0.5, min_calls=4, window_seconds=30, cooldown_seconds=15, half_open_max_calls=1)
+    settings.update(kwargs)
+    return CircuitBreaker("test", **settings)
+
+def call(breaker, success):
+    breaker.before_call()
+    breaker.record(success)
+
+# Test del circuit breaker: si apre solo raggiunte min_calls e la soglia di errori
+def test_circuit_opens_on_failure_rate(clock):
+    breaker = make_breaker()
+    for success in (True, False, False):
+        call(breaker, success)
+    # 2 errori su 3 chiamate, ma sotto min_calls
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    call(breaker, True)
+    # 2 errori su 4 chiamate: soglia del 50% raggiunta
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+# Test del circuit breaker: gli esiti fuori dalla finestra non contano
+def test_circuit_forgets_outcomes_outside_window(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        call(breaker, False)
+    clock.advance(31)
+    call(breaker, True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot()["calls"] == 1
+    assert breaker.snapshot()["failures"] == 0
+
+# Test del circuit breaker: dopo il raffreddamento passa una sola chiamata di prova, che lo richiude
+def test_circuit_half_open_probe_closes(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        call(breaker, False)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.advance(15)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot()["calls"] == 0
+
+# Test del circuit breaker: una prova fallita lo riapre per un altro periodo di raffreddamento
+def test_circuit_half_open_probe_reopens(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        call(breaker, False)
+    clock.advance(15)
+    call(breaker, False)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.advance(14)
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.advance(1)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+# Test del circuit breaker: una prova annullata senza esito libera lo slot
+def test_circuit_release_frees_half_open_slot(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        call(breaker, False)
+    clock.advance(15)
+    breaker.before_call()
+    breaker.release()
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+# Test della saga: le compensazioni vengono eseguite in ordine inverso, anche se una fallisce
+def test_saga_compensates_in_reverse_order():
+    order = []
+
+    def compensation(name, fail=False):
+        async def action():
+            order.append(name)
+            if fail:
+                raise RuntimeError("errore")
+        return action
+
+    saga = Saga("test")
+    saga.compensate_with("first", compensation("first"))
+    saga.compensate_with("second", compensation("second", fail=True))
+    saga.compensate_with("third", compensation("third"))
+    asyncio.run(saga.abort("passo fallito"))
+
+    assert order == ["third", "second", "first"]
+    assert saga.status == Saga.ABORTED
+    assert saga.error == "passo fallito"
+    assert saga.steps["compensate_second"]["status"] == "failed"
+    assert saga.steps["compensate_first"]["status"] == "completed"
+
+# Test della saga: un passo oltre il timeout viene registrato come tale
+def test_saga_step_timeout():
+    saga = Saga("test", step_timeouts={"slow": 0.01})
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(saga.step("slow", lambda: asyncio.sleep(1)))
+    assert saga.steps["slow"]["status"] == "timeout"
+
+# Servizio simulato per la saga di prenotazione completa: registra le chiamate ricevute
+class FakeUpstream:
+    def __init__(self, name, calls, handler):
+        self.name = name
+        self.calls = calls
+        self.handler = handler
+
+    async def _call(self, method, path, **kwargs):
+        self.calls.append((self.name, method, path))
+        status, body = await self.handler(method, path, kwargs)
+        return httpx.Response(status, json=body, request=httpx.Request(method, f"http://{self.name}{path}"))
+
+    async def get(self, path, **kwargs):
+        return await self._call("GET", path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self._call("POST", path, **kwargs)
+
+    async def delete(self, path, **kwargs):
+        return await self._call("DELETE", path, **kwargs)
+
+COMPLETE_BOOKING = {
+    "professional_id": 7,
+    "service_id": 3,
+    "date_time": "2030-01-07T10:00:00",
+    "amount": 50,
+    "service_name": "Visita",
+}
+
+def run_complete_booking(calls, booking_handler, payment_handler):
+    booking = FakeUpstream("booking", calls, booking_handler)
+    payment = FakeUpstream("payment", calls, payment_handler)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(booking_routes.create_complete_booking(
+            booking_routes.CompleteBookingRequest(**COMPLETE_BOOKING), SimpleNamespace(app=None), {"id": 1},
+            booking, payment, None
+        ))
+    return error.value.status_code
+
+# Test della saga di prenotazione: una creazione in timeout già scritta da Booking viene ritrovata per chiave e annullata
+def test_complete_booking_cancels_booking_of_unknown_outcome(monkeypatch):
+    monkeypatch.setattr(booking_routes.config, "SAGA_STEP_TIMEOUTS", {"create_booking": 0.05})
+    calls, written = [], {}
+
+    async def booking_handler(method, path, kwargs):
+        if path.endswith("/check"):
+            return 200, {"is_available": True}
+        if method == "POST":
+            # Booking scrive la prenotazione ma la risposta arriva dopo il timeout
+            written[kwargs["headers"]["Idempotency-Key"]] = 42
+            await asyncio.sleep(1)
+        if path.startswith("/bookings/by-key/"):
+            key = path.rsplit("/", 1)[1]
+            return (200, {"id": written[key]}) if key in written else (404, {"detail": "Prenotazione non trovata"})
+        return 200, {}
+
+    async def payment_handler(method, path, kwargs):
+        return 200, {"id": "pi_1"}
+
+    status = run_complete_booking(calls, booking_handler, payment_handler)
+
+    assert status == 504
+    key = next(iter(written))
+    assert calls[-2:] == [("booking", "GET", f"/bookings/by-key/{key}"), ("booking", "DELETE", "/bookings/42")]
+    assert not [call for call in calls if call[0] == "payment"]
+
+# Test della saga di prenotazione: se fallisce il pagamento si annullano l'intent e poi la prenotazione
+def test_complete_booking_compensates_payment_then_booking(monkeypatch):
+    monkeypatch.setattr(booking_routes.config, "SAGA_STEP_TIMEOUTS", {"payment_intent": 0.05})
+    calls = []
+    attempts = {"payment": 0}
+
+    async def booking_handler(method, path, kwargs):
+        if path.endswith("/check"):
+            return 200, {"is_available": True}
+        if method == "POST":
+            return 200, {"id": 42}
+        return 200, {}
+
+    async def payment_handler(method, path, kwargs):
+        if path == "/stripe/create-payment-intent":
+            attempts["payment"] += 1
+            if attempts["payment"] == 1:
+                await asyncio.sleep(1)
+        return 200, {"id": "pi_1", "status": "canceled"}
+
+    status = run_complete_booking(calls, booking_handler, payment_handler)
+
+    assert status == 504
+    assert calls[-3:] == [
+        ("payment", "POST", "/stripe/create-payment-intent"),
+        ("payment", "POST", "/stripe/payment-intents/pi_1/cancel"),
+        ("booking", "DELETE", "/bookings/42"),
+    ]
+
+# Test della saga di prenotazione: una creazione rifiutata non lascia nulla da annullare
+def test_complete_booking_rejected_booking_is_not_cancelled():
+    calls = []
+
+    async def booking_handler(method, path, kwargs):
+        if path.endswith("/check"):
+            return 200, {"is_available": True}
+        if method == "POST":
+            return 409, {"detail": "Orario non disponibile"}
+        if path.startswith("/bookings/by-key/"):
+            return 404, {"detail": "Prenotazione non trovata"}
+        return 200, {}
+
+    async def payment_handler(method, path, kwargs):
+        return 200, {"id": "pi_1"}
+
+    status = run_complete_booking(calls, booking_handler, payment_handler)
+
+    assert status == 500
+    assert calls[-1][:2] == ("booking", "GET")
+    assert not [call for call in calls if call[1] == "DELETE" or call[0] == "payment"]
+
+# Test della saga di prenotazione: un errore imprevisto dopo la creazione annulla comunque la prenotazione
+def test_complete_booking_compensates_on_unexpected_error():
+    calls, written = [], {}
+
+    async def booking_handler(method, path, kwargs):
+        if path.endswith("/check"):
+            return 200, {"is_available": True}
+        if method == "POST":
+            # Prenotazione scritta, ma con una risposta vuota che non si può decodificare
+            written[kwargs["headers"]["Idempotency-Key"]] = 42
+            return 200, None
+        if path.startswith("/bookings/by-key/"):
+            return 200, {"id": written[path.rsplit("/", 1)[1]]}
+        return 200, {}
+
+    async def payment_handler(method, path, kwargs):
+        return 200, {"id": "pi_1"}
+
+    booking = FakeUpstream("booking", calls, booking_handler)
+    payment = FakeUpstream("payment", calls, payment_handler)
+    with pytest.raises(ValueError):
+        asyncio.run(booking_routes.create_complete_booking(
+            booking_routes.CompleteBookingRequest(**COMPLETE_BOOKING), SimpleNamespace(app=None), {"id": 1},
+            booking, payment, None
+        ))
+
+    saga = list(booking_routes.saga_store._sagas.values())[-1][1]
+    assert saga.status == Saga.ABORTED
+    assert calls[-1] == ("booking", "DELETE", "/bookings/42")
+    assert not [call for call in calls if call[0] == "payment"]
+
+# Test della prenotazione completa: una richiesta senza importo è rifiutata prima di avviare la saga
+def test_complete_booking_requires_amount():
+    calls = []
+
+    async def handler(method, path, kwargs):
+        return 200, {}
+
+    app = FastAPI()
+    app.include_router(booking_routes.router, prefix="/api/v1/bookings")
+    app.dependency_overrides[get_current_active_user] = lambda: {"id": 1}
+    app.state.upstreams = {name: FakeUpstream(name, calls, handler) for name in ("booking", "payment", "notification")}
+    client = TestClient(app)
+    sagas = len(booking_routes.saga_store._sagas)
+
+    response = client.post(
+        "/api/v1/bookings/complete",
+        json={key: value for key, value in COMPLETE_BOOKING.items() if key != "amount"},
+    )
+
+    assert response.status_code == 422
+    assert calls == []
+    assert len(booking_routes.saga_store._sagas) == sagas
+
+# Test del token bucket: la capacità iniziale è il burst, poi i token si ricaricano al ritmo indicato
+def test_token_bucket_refill(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    backend = InMemoryBackend()
+
+    async def scenario():
+        admitted = [await backend.acquire("user:1", rate=2, burst=3) for _ in range(3)]
+        retry_after = await backend.acquire("user:1", rate=2, burst=3)
+        clock.advance(0.5)
+        refilled = await backend.acquire("user:1", rate=2, burst=3)
+        clock.advance(60)
+        # Dopo una lunga pausa i token non superano il burst
+        burst = [await backend.acquire("user:1", rate=2, burst=3) for _ in range(4)]
+        return admitted, retry_after, refilled, burst
+
+    admitted, retry_after, refilled, burst = asyncio.run(scenario())
+    assert admitted == [0.0, 0.0, 0.0]
+    assert retry_after == pytest.approx(0.5)
+    assert refilled == 0.0
+    assert burst[:3] == [0.0, 0.0, 0.0]
+    assert burst[3] > 0
+
+# Test del token bucket: i bucket già ricaricati e quelli oltre il limite vengono eliminati
+def test_token_bucket_eviction(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    backend = InMemoryBackend(max_buckets=2)
+
+    async def scenario():
+        await backend.acquire("user:1", rate=1, burst=10)
+        await backend.acquire("user:2", rate=1, burst=10)
+        await backend.acquire("user:3", rate=1, burst=10)
+        after_limit = len(backend)
+        clock.advance(11)
+        await backend.acquire("user:4", rate=1, burst=10)
+        return after_limit, len(backend)
+
+    after_limit, after_refill = asyncio.run(scenario())
+    assert after_limit == 2
+    # user:2 e user:3 si sono ricaricati del tutto: equivalgono a bucket nuovi
+    assert after_refill == 1
+
+# Test del middleware: 429 con Retry-After a bucket vuoto, richieste OPTIONS escluse
+def test_rate_limit_middleware():
+    app = FastAPI()
+
+    @app.get("/api/v1/catalog/services")
+    async def services():
+        return []
+
+    @app.options("/api/v1/catalog/services")
+    async def services_options():
+        return {}
+
+    app.add_middleware(
+        RateLimitMiddleware,
+        backend=InMemoryBackend(),
+        limits={"default": "0.01/2"},
+        routes={},
+    )
+    client = TestClient(app)
+
+    assert [client.get("/api/v1/catalog/services").status_code for _ in range(2)] == [200, 200]
+    limited = client.get("/api/v1/catalog/services")
+    assert limited.status_code == 429
+    assert int(limited.headers["retry-after"]) >= 1
+    assert client.options("/api/v1/catalog/services").status_code == 200
+
+# Applicazione di prova per l'idempotenza: conta le esecuzioni reali delle POST
+def make_idempotent_app(status_code=200):
+    app = FastAPI()
+    app.state.executions = 0
+
+    @app.post("/api/v1/bookings/")
+    async def create(payload: dict):
+        app.state.executions += 1
+        if status_code != 200:
+            raise HTTPException(status_code=status_code, detail="errore")
+        return {"id": app.state.executions, **payload}
+
+    app.add_middleware(IdempotencyMiddleware, store=IdempotencyStore(ttl=60))
+    return app
+
+# Test dell'idempotenza: un duplicato riceve la risposta memorizzata senza rieseguire la richiesta
+def test_idempotency_replay():
+    app = make_idempotent_app()
+    client = TestClient(app)
+    headers = {"Idempotency-Key": "abc"}
+
+    first = client.post("/api/v1/bookings/", json={"slot": 1}, headers=headers)
+    second = client.post("/api/v1/bookings/", json={"slot": 1}, headers=headers)
+
+    assert app.state.executions == 1
+    assert second.status_code == first.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+
+    # Una chiave diversa è una nuova richiesta
+    client.post("/api/v1/bookings/", json={"slot": 1}, headers={"Idempotency-Key": "def"})
+    assert app.state.executions == 2
+
+# Test dell'idempotenza: la stessa chiave con un corpo diverso restituisce 422
+def test_idempotency_fingerprint_mismatch():
+    app = make_idempotent_app()
+    client = TestClient(app)
+    headers = {"Idempotency-Key": "abc"}
+
+    client.post("/api/v1/bookings/", json={"slot": 1}, headers=headers)
+    response = client.post("/api/v1/bookings/", json={"slot": 2}, headers=headers)
+
+    assert response.status_code == 422
+    assert app.state.executions == 1
+
+# Test dell'idempotenza: le risposte 5xx non vengono memorizzate, così il client può riprovare
+def test_idempotency_does_not_store_server_errors():
+    app = make_idempotent_app(status_code=503)
+    client = TestClient(app)
+    headers = {"Idempotency-Key": "abc"}
+
+    assert client.post("/api/v1/bookings/", json={"slot": 1}, headers=headers).status_code == 503
+    retry = client.post("/api/v1/bookings/", json={"slot": 1}, headers=headers)
+
+    assert retry.status_code == 503
+    assert "idempotent-replayed" not in retry.headers
+    assert app.state.executions == 2
+
+# Applicazione di prova per i batch: la route dei batch e una route semplice da richiamare
+def make_batch_app():
+    app = FastAPI()
+    app.include_router(batch_routes.router, prefix="/api/v1/batch")
+    app.dependency_overrides[get_current_active_user] = lambda: {"id": 1}
+
+    @app.get("/api/v1/ping")
+    async def ping():
+        return {"pong": True}
+
+    return app
+
+# Test dei batch: le sotto-richieste sono eseguite e restituite nell'ordine della richiesta
+def test_batch_dispatches_sub_requests():
+    client = TestClient(make_batch_app())
+    response = client.post(
+        "/api/v1/batch",
+        json={"requests": [{"path": "/ping"}, {"id": "x", "path": "/missing"}, {"method": "TRACE", "path": "/ping"}]},
+        headers={"Authorization": "Bearer token"},
+    )
+
+    assert response.status_code == 200
+    assert [(item["id"], item["status"]) for item in response.json()["responses"]] == [("0", 200), ("x", 404), ("2", 400)]
+    assert response.json()["responses"][0]["body"] == {"pong": True}
+
+# Test dei batch: un batch annidato viene rifiutato anche con un percorso equivalente a /batch
+def test_batch_rejects_nested_batches():
+    client = TestClient(make_batch_app())
+    nested = {"method": "POST", "body": {"requests": [{"path": "/ping"}]}}
+    paths = ["/batch", "/batch/", "/./batch", "/%62atch", "/ping/../batch"]
+    response = client.post(
+        "/api/v1/batch",
+        json={"requests": [dict(nested, path=path) for path in paths]},
+        headers={"Authorization": "Bearer token"},
+    )
+
+    for result in response.json()["responses"]:
+        assert result["status"] == 400
+        assert result["body"]["detail"] == "Batch annidati non consentiti"
+
+# Client simulato per la cache: risponde 304 alle richieste condizionali
+class RevalidatingClient:
+    name = "catalog"
+
+    def __init__(self, during_request=None):
+        self.during_request = during_request
+        self.requests = []
+
+    async def get(self, path, params=None, headers=None, coalesce=None, user=None):
+        self.requests.append(dict(headers or {}))
+        if self.during_request is not None:
+            self.during_request()
+        status = 304 if headers and "If-None-Match" in headers else 200
+        return httpx.Response(status, json=[{"id": 1}], headers={"etag": '"v1"'})
+
+# Test della cache: una voce rimossa durante la rivalidazione viene reinserita alla risposta 304
+def test_cache_revalidation_after_eviction():
+    cache = ResponseCache({"catalog_services": 0.0}, max_entries=1)
+    request = SimpleNamespace(headers={})
+    client = RevalidatingClient()
+
+    first = asyncio.run(cache.fetch(request, client, "catalog_services", "/services"))
+    assert first.status_code == 200
+
+    # Mentre la rivalidazione è in corso un'altra risposta occupa l'unico posto della cache
+    client.during_request = lambda: cache._put(
+        ("catalog", "/other", (), None), CachedResponse(b"[]", "application/json", None, 60)
+    )
+    second = asyncio.run(cache.fetch(request, client, "catalog_services", "/services"))
+
+    assert client.requests[-1] == {"If-None-Match": '"v1"'}
+    assert second.status_code == 200
+    assert second.body == first.body
+    assert cache.snapshot()["revalidated"] == 1
+    assert len(cache._entries) == 1
+
+# Test della dashboard: le sezioni dei servizi che rispondono sono compilate, quelle in timeout valgono null
+def test_dashboard_partial_on_timeout(monkeypatch):
+    monkeypatch.setattr(config, "DASHBOARD_TIMEOUTS", {})
+    monkeypatch.setattr(config, "DASHBOARD_DEFAULT_TIMEOUT", 0.2)
+    calls = []
+    authorizations = {}
+
+    async def handler(method, path, kwargs):
+        authorizations[path] = (kwargs.get("headers") or {}).get("Authorization")
+        if path.startswith("/notifications"):
+            await asyncio.sleep(1)
+        if path == "/users/1":
+            return 200, {"id": 1, "name": "Mario"}
+        if path == "/bookings/user/1":
+            return 200, [
+                {"id": 2, "date_time": "2030-01-08T10:00:00", "status": "confirmed"},
+                {"id": 3, "date_time": "2030-01-07T10:00:00", "status": "cancelled"},
+                {"id": 4, "date_time": "2030-01-07T09:00:00", "status": "pending"},
+            ]
+        return 200, []
+
+    app = FastAPI()
+    app.include_router(dashboard_routes.router, prefix="/api/v1/me")
+    app.dependency_overrides[get_current_active_user] = lambda: {"id": 1}
+    app.state.upstreams = {name: FakeUpstream(name, calls, handler) for name in ("users", "booking", "notification")}
+    client = TestClient(app)
+
+    response = client.get("/api/v1/me/dashboard", headers={"Authorization": "Bearer user-token"})
+
+    assert response.status_code == 200
+    dashboard = response.json()
+    assert dashboard["profile"] == {"id": 1, "name": "Mario"}
+    assert [booking["id"] for booking in dashboard["upcoming_bookings"]] == [4, 2]
+    assert dashboard["health_records"] == []
+    assert dashboard["unread_notifications"] is None
+    assert dashboard["latest_notifications"] is None
+    assert dashboard["errors"] == {
+        "unread_notifications": {"status": 504, "detail": "Il servizio non ha risposto in tempo"},
+        "latest_notifications": {"status": 504, "detail": "Il servizio non ha risposto in tempo"},
+    }
+    assert dashboard["partial"]
+    # Il token del chiamante arriva a ogni servizio, compreso Booking
+    assert set(authorizations.values()) == {"Bearer user-token"}
+    assert "/bookings/user/1" in authorizations
+
+# Test del limite adattivo: cresce con latenza stabile, cala quando le richieste si accodano
+def test_gradient_limiter_adapts_to_latency():
+    limiter = GradientLimiter(initial_limit=100, min_limit=10, max_limit=150)
+
+    def busy_request(latency, overloaded=False):
+        # Il limite si aggiorna solo con abbastanza richieste in corso
+        limiter.in_flight = int(limiter.limit)
+        limiter.release(latency, overloaded)
+
+    for _ in range(50):
+        busy_request(0.01)
+    assert limiter.limit == 150
+
+    # Latenza recente molto più alta di quella di riferimento: il limite scende
+    previous = limiter.limit
+    for _ in range(20):
+        busy_request(0.5)
+    assert limiter.limit < previous
+
+    # Un timeout riduce il limite in modo moltiplicativo, mai sotto il minimo
+    previous = limiter.limit
+    busy_request(None, overloaded=True)
+    assert limiter.limit == pytest.approx(max(10, previous * 0.9))
+    for _ in range(100):
+        busy_request(None, overloaded=True)
+    assert limiter.limit == 10
+
+    # Con poche richieste in corso la latenza non modifica il limite
+    limiter.in_flight = 1
+    limiter.release(0.001)
+    assert limiter.limit == 10 and limiter.in_flight == 0
+
+# Test dello scarto del traffico: le classi con quota più bassa vengono scartate per prime
+def test_load_shedding_by_priority():
+    app = FastAPI()
+
+    @app.api_route("/api/v1/{path:path}", methods=["GET", "POST"])
+    async def endpoint(path: str):
+        return {"path": path}
+
+    @app.get("/status")
+    async def status():
+        return {"status": "ok"}
+
+    limiter = GradientLimiter(initial_limit=10, min_limit=10, max_limit=10)
+    app.add_middleware(
+        LoadSheddingMiddleware,
+        limiter=limiter,
+        priorities={"POST /api/v1/bookings": "critical", "GET /api/v1/catalog": "low"},
+        shares={"critical": 1.0, "normal": 0.85, "low": 0.6},
+        exempt=["/status"],
+        retry_after=3,
+    )
+    client = TestClient(app)
+
+    # Sette richieste già in corso: oltre la quota delle richieste "low", entro quella delle altre
+    limiter.in_flight = 7
+    shed = client.get("/api/v1/catalog/services")
+    assert shed.status_code == 503
+    assert shed.headers["retry-after"] == "3"
+    assert client.get("/api/v1/users/1").status_code == 200
+    assert client.post("/api/v1/bookings").status_code == 200
+    # Gli slot occupati dalle richieste completate vengono liberati
+    assert limiter.in_flight == 7
+
+    # Al limite passano solo i percorsi esenti
+    limiter.in_flight = 10
+    assert client.post("/api/v1/bookings").status_code == 503
+    assert client.get("/status").status_code == 200
+    assert client.options("/api/v1/catalog/services").status_code != 503
+
+# Test dello stato dei servizi: sonde parallele entro la scadenza globale e risultato in cache
+def test_health_monitor_probes():
+    calls = []
+
+    def probe(name):
+        async def handler(method, path, kwargs):
+            if name == "booking":
+                return 503, {}
+            if name == "payment":
+                raise httpx.ConnectError("connessione rifiutata")
+            if name == "notification":
+                await asyncio.sleep(1)
+            return 200, {"status": "ok"}
+        return handler
+
+    upstreams = [(name, FakeUpstream(name, calls, probe(name))) for name in ("users", "booking", "payment", "notification")]
+    monitor = HealthMonitor(upstreams, probe_timeout=1, deadline=0.2, ttl=60)
+
+    async def scenario():
+        first = await monitor.get()
+        # Entro la durata della cache le richieste non sondano di nuovo i servizi
+        assert await monitor.get() is first
+        return first
+
+    health = asyncio.run(scenario())
+    assert health["services"] == {
+        "users": "online", "booking": "degraded", "payment": "offline", "notification": "offline",
+    }
+    assert health["status"] == "degraded"
+    assert health["latency_ms"]["notification"] is None
+    assert health["latency_ms"]["users"] >= 0
+    assert calls == [(name, "GET", "/status") for name, _ in upstreams]
+
+    # Scaduta la cache si sonda di nuovo; senza alcun servizio raggiungibile lo stato è offline
+    monitor.upstreams = upstreams[2:]
+    monitor._checked_at -= monitor.ttl
+    assert asyncio.run(monitor.get())["status"] == "offline"
+    assert len(calls) == len(upstreams) + 2
+
+# Test dell'inoltro in streaming: corpo e header del servizio arrivano al client senza essere decodificati
+def test_proxy_streams_raw_body():
+    payload = b"[" + b",".join(b'{"id": %d}' % i for i in range(1000)) + b"]"
+    compressed = gzip.compress(payload)
+    chunks = [compressed[i:i + 1024] for i in range(0, len(compressed), 1024)]
+
+    async def stream(chunks):
+        for chunk in chunks:
+            yield chunk
+
+    # Corpi in streaming, come quelli ricevuti da un servizio reale
+    def handler(request):
+        if request.url.path == "/broken":
+            return httpx.Response(502, content=stream([b'{"detail": "errore"}']), headers={"content-type": "application/json"})
+        return httpx.Response(
+            200,
+            content=stream(chunks),
+            headers={"content-type": "application/json", "content-encoding": "gzip", "connection": "keep-alive", "etag": '"v1"'},
+        )
+
+    upstream = UpstreamClient(
+        "stream-test", "http://users", httpx.Limits(), httpx.Timeout(5), transport=httpx.MockTransport(handler)
+    )
+    app = FastAPI()
+
+    @app.get("/proxy/{path}")
+    async def proxy(path: str):
+        return await upstream.proxy("GET", f"/{path}")
+
+    client = TestClient(app)
+    with client.stream("GET", "/proxy/users") as response:
+        assert response.status_code == 200
+        raw = b"".join(response.iter_raw())
+    # Il corpo compresso è inoltrato byte per byte, senza decomprimerlo e ricomprimerlo
+    assert raw == compressed
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == '"v1"'
+    assert "keep-alive" not in response.headers.get("connection", "")
+    # Lo slot del bulkhead viene liberato alla fine dello streaming
+    assert upstream.bulkhead.in_flight == 0
+
+    # Gli errori del servizio sono inoltrati con il loro stato e contano come fallimenti per il circuito
+    broken = client.get("/proxy/broken")
+    assert broken.status_code == 502
+    assert broken.json() == {"detail": "errore"}
+    assert upstream.bulkhead.in_flight == 0
+    assert upstream.circuit_breaker.snapshot()["failures"] == 1
+
+# Test del formato Prometheus: contatori, gauge e istogrammi con bucket cumulativi
+def test_metrics_registry_render():
+    metrics = MetricsRegistry()
+    requests = metrics.counter("test_requests_total", "Richieste", ["path"])
+    in_flight = metrics.gauge("test_in_flight", "Richieste in corso")
+    duration = metrics.histogram("test_duration_seconds", "Durata", ["route"], buckets=(0.1, 1.0))
+    with pytest.raises(ValueError):
+        metrics.counter("test_requests_total", "Duplicato")
+
+    requests.inc('/a"b')
+    requests.inc('/a"b', amount=2)
+    metrics.add_collector(lambda: in_flight.set(value=3))
+    for value in (0.05, 0.5, 5):
+        duration.observe("/items/{item_id}", value=value)
+
+    assert metrics.render().splitlines() == [
+        "# HELP test_requests_total Richieste",
+        "# TYPE test_requests_total counter",
+        'test_requests_total{path="/a\\"b"} 3',
+        "# HELP test_in_flight Richieste in corso",
+        "# TYPE test_in_flight gauge",
+        "test_in_flight 3",
+        "# HELP test_duration_seconds Durata",
+        "# TYPE test_duration_seconds histogram",
+        'test_duration_seconds_bucket{route="/items/{item_id}",le="0.1"} 1',
+        'test_duration_seconds_bucket{route="/items/{item_id}",le="1"} 2',
+        'test_duration_seconds_bucket{route="/items/{item_id}",le="+Inf"} 3',
+        'test_duration_seconds_sum{route="/items/{item_id}"} 5.55',
+        'test_duration_seconds_count{route="/items/{item_id}"} 3',
+    ]
+
+# Test dell'endpoint /metrics: le richieste servite sono registrate per template di route
+def test_metrics_endpoint():
+    from src.main import app
+
+    client = TestClient(app)
+    assert client.get("/status").status_code == 200
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    assert "# TYPE gateway_http_request_duration_seconds histogram" in lines
+    assert any(
+        line.startswith('gateway_http_request_duration_seconds_count{route="/status",method="GET",status="200"}')
+        for line in lines
+    )
+    # I gauge letti su richiesta sono aggiornati dai collector a ogni esportazione
+    assert any(line.startswith("gateway_concurrency_limit") for line in lines)
+
+    # Le route con parametri usano il template, non il percorso richiesto
+    items = FastAPI()
+    items.add_middleware(MetricsMiddleware)
+
+    @items.get("/api/v1/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    TestClient(items).get("/api/v1/items/12345")
+    exported = client.get("/metrics").text
+    assert 'route="/api/v1/items/{item_id}",method="GET",status="200"' in exported
+    assert "12345" not in exported
@@ -7,7 +7,12 @@ from src.services.auth_service import (
     register_user,
     verify_token,
     refresh_token,
+    revoke_token,
+    get_revocations,
+    get_sessions,
+    revoke_user_sessions,
 )
+from src.services.password_hasher import HasherBusy
 from pydantic import BaseModel
 
 # Creazione del router
@@ -27,14 +32,28 @@ class LoginSchema(BaseModel):
 class TokenSchema(BaseModel):
     token: str
 
+class RefreshSchema(BaseModel):
+    refresh_token: str
+
+# Risposta quando il pool di hashing delle password è saturo
+def hasher_busy_exception() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Servizio momentaneamente sovraccarico, riprova più tardi",
+        headers={"Retry-After": "1"},
+    )
+
 # Rotta per il login
 @router.post("/login")
-def login(login_data: LoginSchema):
+async def login(login_data: LoginSchema):
     """
     API endpoint per effettuare il login.
     """
     # Autenticazione dell'utente
-    result = authenticate_user(login_data.email, login_data.password)
+    try:
+        result = await authenticate_user(login_data.email, login_data.password)
+    except HasherBusy:
+        raise hasher_busy_exception()
     if "error" in result:
         raise HTTPException(status_code=401, detail=result["error"])
     # Restituisce il token di accesso
@@ -42,11 +61,14 @@ def login(login_data: LoginSchema):
 
 # Rotta per la registrazione
 @router.post("/register")
-def register(user_data: RegisterSchema):
+async def register(user_data: RegisterSchema):
     """
     API endpoint per registrare un nuovo utente.
     """
-    result = register_user(user_data.name, user_data.email, user_data.password, user_data.role)
+    try:
+        result = await register_user(user_data.name, user_data.email, user_data.password, user_data.role)
+    except HasherBusy:
+        raise hasher_busy_exception()
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
     return result
@@ -64,11 +86,56 @@ def verify(token_data: TokenSchema):
 
 # Rotta per il refresh del token
 @router.post("/refresh")
-def refresh(token_data: TokenSchema):
+def refresh(token_data: RefreshSchema):
+    """
+    API endpoint per ottenere un nuovo token di accesso a partire dal refresh token.
+    Il refresh token viene sostituito a ogni utilizzo: quello precedente non è più valido.
+    """
+    result = refresh_token(token_data.refresh_token)
+    if "error" in result:
+        raise HTTPException(status_code=401, detail=result["error"])
+    return result
+
+# Rotta per revocare un token prima della scadenza
+@router.post("/revoke")
+def revoke(token_data: TokenSchema):
     """
-    API endpoint per rigenerare un token JWT.
+    API endpoint per revocare un token JWT (es. al logout).
     """
-    result = refresh_token(token_data.token)
+    result = revoke_token(token_data.token)
     if "error" in result:
         raise HTTPException(status_code=401, detail=result["error"])
-    return {"access_token": result}
\ No newline at end of file
+    return result
+
+# Rotta per la sincronizzazione incrementale delle revoche
+@router.get("/revocations")
+def revocations(since: int = 0):
+    """
+    API endpoint con le revoche successive al numero di sequenza `since`.
+    """
+    return get_revocations(since)
+
+# Rotte per la gestione delle sessioni dell'utente autenticato
+@router.get("/sessions")
+def sessions(current_user: dict):
+    """
+    API endpoint con le sessioni attive dell'utente.
+    """
+    return get_sessions(current_user["id"])
+
+@router.delete("/sessions/{session_id}")
+def delete_session(session_id: str, current_user: dict):
+    """
+    API endpoint per revocare una sessione dell'utente: il suo refresh token smette di valere.
+    """
+    result = revoke_user_sessions(current_user["id"], session_id)
+    if "error" in result:
+        raise HTTPException(status_code=404, detail=result["error"])
+    return result
+
+@router.delete("/sessions")
+def delete_all_sessions(current_user: dict):
+    """
+    API endpoint per revocare tutte le sessioni dell'utente.
+    """
+    return revoke_user_sessions(current_user["id"])
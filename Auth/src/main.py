@@ -1,9 +1,13 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from healthmatch_common.tracing import setup_tracing
 from .routes import auth_routes
 import os
 import uvicorn
 from src.db.session import Base, engine
+from .services.password_hasher import password_hasher
+from .services.key_manager import key_ring
 
 app = FastAPI(
     title="HealthMatch Auth Service",
@@ -20,12 +24,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Tracing distribuito (traceparent W3C) su richieste e query del database
+setup_tracing(app, "auth", engine)
+
 # Includi i router delle API
 app.include_router(auth_routes.router, prefix="/api/v1/auth", tags=["Authentication"])
 
 # Creazione delle tabelle del database
 Base.metadata.create_all(bind=engine)
 
+@app.on_event("startup")
+def load_signing_keys():
+    """Carica (o genera) le chiavi di firma prima della prima richiesta."""
+    key_ring.active_key()
+
+@app.on_event("shutdown")
+def shutdown_password_hasher():
+    """Termina i processi dedicati all'hashing delle password."""
+    password_hasher.shutdown()
+
+@app.get("/.well-known/jwks.json")
+def jwks():
+    """Chiavi pubbliche con cui gli altri servizi verificano localmente i token."""
+    return JSONResponse(key_ring.jwks(), headers={"Cache-Control": "public, max-age=300"})
+
 @app.get("/status")
 async def status():
     """Endpoint per il health check."""
@@ -1,7 +1,7 @@
 # Auth/src/middleware/auth_middleware.py
 # Implementazione del middleware per l'autenticazione
 
-from fastapi import Request, HTTPException
+from fastapi import Depends, Request, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from src.services.auth_service import verify_token
 from typing import Optional
@@ -9,10 +9,12 @@ from typing import Optional
 # Classe per la gestione del token di autenticazione
 security = HTTPBearer()
 
-async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = security):
+def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
     """
     Middleware che verifica il token JWT e restituisce i dati dell'utente autenticato.
     Da utilizzare con Depends() per proteggere le route che richiedono autenticazione.
+    È sincrona perché il controllo delle revoche può interrogare il database: FastAPI
+    la esegue nel threadpool.
     """
     token = credentials.credentials
     result = verify_token(token)
@@ -26,7 +28,7 @@ async def get_current_user(request: Request, credentials: HTTPAuthorizationCrede
     
     return result["payload"]
 
-async def get_admin_user(request: Request, credentials: HTTPAuthorizationCredentials = security):
+def get_admin_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
     """
     Middleware che verifica che l'utente sia un amministratore.
     Da utilizzare per route riservate agli amministratori.
@@ -50,7 +52,7 @@ async def get_admin_user(request: Request, credentials: HTTPAuthorizationCredent
     
     return payload
 
-async def get_user_by_role(request: Request, required_role: Optional[str] = None, credentials: HTTPAuthorizationCredentials = security):
+def get_user_by_role(request: Request, required_role: Optional[str] = None, credentials: HTTPAuthorizationCredentials = Depends(security)):
     """
     Middleware che verifica che l'utente abbia un ruolo specifico.
     Da utilizzare per route riservate a ruoli specifici.
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String
+from src.models.user_model import Base, engine
+
+# Token revocati prima della scadenza, identificati dal claim jti
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    # AUTOINCREMENT impedisce il riuso degli id dopo l'eliminazione delle voci scadute:
+    # l'id fa da numero di sequenza per la propagazione incrementale ai servizi
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    jti = Column(String, unique=True, index=True, nullable=False)
+    expires_at = Column(Integer, nullable=False, index=True)  # scadenza del token (epoch, secondi)
+    revoked_at = Column(Integer, nullable=False)
+
+Base.metadata.create_all(bind=engine)
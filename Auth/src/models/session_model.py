@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Index, Integer, String
+from src.models.user_model import Base, engine
+
+# Sessioni di login: ogni sessione ha un solo refresh token valido alla volta
+class Session(Base):
+    __tablename__ = "sessions"
+    __table_args__ = (
+        # Elenco e revoca delle sessioni di un utente, limitati a quelle non scadute
+        Index("ix_sessions_user_id_expires_at", "user_id", "expires_at"),
+    )
+
+    id = Column(String, primary_key=True)  # identificativo casuale, incluso nel refresh token
+    user_id = Column(Integer, nullable=False)
+    refresh_hash = Column(String, nullable=False)  # SHA-256 del segreto del refresh token corrente
+    created_at = Column(Integer, nullable=False)
+    last_used_at = Column(Integer, nullable=False)
+    expires_at = Column(Integer, nullable=False, index=True)  # scadenza assoluta (epoch, secondi)
+    revoked_at = Column(Integer, nullable=True)
+
+Base.metadata.create_all(bind=engine)
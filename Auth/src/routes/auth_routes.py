@@ -3,30 +3,66 @@
 
 from fastapi import APIRouter, HTTPException, Depends, Body
 from typing import Dict, Any
-from ..controllers.auth_controller import login, register, verify, refresh
+from ..controllers.auth_controller import (
+    login, register, verify, refresh, revoke, revocations, sessions, delete_session, delete_all_sessions,
+    LoginSchema, RegisterSchema, TokenSchema, RefreshSchema
+)
+from ..middleware.auth_middleware import get_current_user
 
 router = APIRouter()
 
 @router.post("/login")
-async def login_route(user_data: Dict[str, Any] = Body(...)):
+async def login_route(user_data: LoginSchema):
     """Effettua il login di un utente."""
-    result = login(user_data)
+    result = await login(user_data)
     return result
 
 @router.post("/register")
-async def register_route(user_data: Dict[str, Any] = Body(...)):
+async def register_route(user_data: RegisterSchema):
     """Registra un nuovo utente."""
-    result = register(user_data)
+    result = await register(user_data)
     return result
 
+# Le route seguenti interrogano il database in modo sincrono (revoche, sessioni): sono funzioni
+# normali, che FastAPI esegue nel threadpool invece che sul ciclo di eventi
 @router.post("/verify")
-async def verify_token_route(token_data: Dict[str, Any] = Body(...)):
+def verify_token_route(token_data: TokenSchema):
     """Verifica un token JWT."""
     result = verify(token_data)
     return result
 
 @router.post("/refresh")
-async def refresh_token_route(token_data: Dict[str, Any] = Body(...)):
-    """Rinnova un token JWT."""
+def refresh_token_route(token_data: RefreshSchema):
+    """Rinnova il token di accesso con il refresh token, che viene sostituito."""
     result = refresh(token_data)
-    return result
\ No newline at end of file
+    return result
+
+@router.post("/revoke")
+def revoke_token_route(token_data: TokenSchema):
+    """Revoca un token JWT prima della scadenza."""
+    result = revoke(token_data)
+    return result
+
+@router.get("/revocations")
+def revocations_route(since: int = 0):
+    """Revoche successive al numero di sequenza indicato, per la sincronizzazione dei servizi."""
+    result = revocations(since)
+    return result
+
+@router.get("/sessions")
+def sessions_route(current_user: Dict[str, Any] = Depends(get_current_user)):
+    """Elenca le sessioni attive dell'utente."""
+    result = sessions(current_user)
+    return result
+
+@router.delete("/sessions/{session_id}")
+def delete_session_route(session_id: str, current_user: Dict[str, Any] = Depends(get_current_user)):
+    """Revoca una sessione dell'utente."""
+    result = delete_session(session_id, current_user)
+    return result
+
+@router.delete("/sessions")
+def delete_all_sessions_route(current_user: Dict[str, Any] = Depends(get_current_user)):
+    """Revoca tutte le sessioni dell'utente."""
+    result = delete_all_sessions(current_user)
+    return result
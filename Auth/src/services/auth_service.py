@@ -3,26 +3,30 @@
 # e corregge la funzione register_user
 
 from datetime import datetime, timedelta, timezone
-from jose import jwt, JWTError
+import jwt
+from starlette.concurrency import run_in_threadpool
 from src.models.user_model import User, SessionLocal
-from passlib.context import CryptContext
+from src.services.password_hasher import HasherBusy, password_hasher
+from src.services.key_manager import key_ring
+from src.services.revocation_service import revocation_list
+from src.services.session_service import (
+    SessionError, create_session, rotate_session, list_sessions, revoke_sessions
+)
 import os
+import uuid
 
-# Configurazione per hashing delle password
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# I token sono firmati con chiavi asimmetriche (vedi key_manager): gli altri servizi li verificano
+# con le chiavi pubbliche di /.well-known/jwks.json. I token di accesso durano poco: la sessione
+# prosegue con il refresh token, l'unico passaggio che interroga il database
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", "15"))
 
-# Usa variabili d'ambiente per chiavi sensibili
-SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your_secret_key_development_only")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", "30"))
+async def hash_password(password: str) -> str:
+    """Crea un hash per la password (nel pool di processi dedicato)."""
+    return await password_hasher.hash(password)
 
-def hash_password(password: str) -> str:
-    """Crea un hash per la password."""
-    return pwd_context.hash(password)
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verifica se la password è corretta."""
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str):
+    """Verifica se la password è corretta; restituisce anche il nuovo hash se quello salvato è obsoleto."""
+    return await password_hasher.verify(plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     """Genera un token JWT."""
@@ -31,62 +35,127 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    # jti identifica il singolo token, così da poterlo revocare prima della scadenza
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
+    key = key_ring.active_key()
+    encoded_jwt = jwt.encode(to_encode, key.private_key, algorithm=key.algorithm, headers={"kid": key.kid})
     return encoded_jwt
 
+def decode_token(token: str) -> dict:
+    """Verifica firma, scadenza e revoca del token con la chiave indicata dal suo kid."""
+    key = key_ring.get(jwt.get_unverified_header(token).get("kid"))
+    if key is None:
+        raise jwt.InvalidTokenError("Chiave di firma sconosciuta")
+    payload = jwt.decode(token, key.private_key.public_key(), algorithms=[key.algorithm])
+    if revocation_list.is_revoked(payload.get("jti")):
+        raise jwt.InvalidTokenError("Token revocato")
+    return payload
+
+def revoke_token(token: str):
+    """Revoca un token valido fino alla sua scadenza (es. al logout)."""
+    try:
+        payload = decode_token(token)
+    except jwt.PyJWTError:
+        return {"error": "Invalid token"}
+    if not payload.get("jti"):
+        return {"error": "Token non revocabile"}
+    revocation_list.revoke(payload["jti"], payload["exp"])
+    return {"status": "revoked"}
+
+def get_revocations(since: int):
+    """Revoche successive al numero di sequenza indicato, per i servizi che verificano i token."""
+    return revocation_list.changes(since)
+
 def verify_token(token: str):
     """Verifica la validità di un token JWT."""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         email: str = payload.get("sub")
         if email is None:
             return {"status": "invalid", "message": "Invalid token"}
         return {"status": "valid", "payload": payload}
-    except JWTError:
+    except jwt.PyJWTError:
         return {"status": "invalid", "message": "Invalid token"}
 
+def _token_response(user: User, session_id: str, refresh: str) -> dict:
+    access_token = create_access_token({"sub": user.email, "role": user.role, "id": user.id, "sid": session_id})
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
 def refresh_token(token: str):
-    """Rigenera un nuovo token JWT."""
+    """Scambia un refresh token con un nuovo token di accesso e un nuovo refresh token."""
+    db = SessionLocal()
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        role: str = payload.get("role")
-        if email is None or role is None:
+        try:
+            session, new_refresh = rotate_session(db, token)
+        except SessionError as e:
+            return {"error": str(e)}
+        user = db.query(User).filter(User.id == session.user_id).first()
+        if not user:
             return {"error": "Invalid token"}
-        new_token = create_access_token({"sub": email, "role": role})
-        return new_token
-    except JWTError:
-        return {"error": "Invalid token"}
+        return _token_response(user, session.id, new_refresh)
+    finally:
+        db.close()
 
-def authenticate_user(email: str, password: str):
-    """Autentica un utente tramite email e password."""
+def get_sessions(user_id: int):
+    """Sessioni attive di un utente."""
     db = SessionLocal()
     try:
-        user = db.query(User).filter(User.email == email).first()
-        if not user:
-            return {"error": "Credenziali non valide", "code": "invalid_credentials"}
-        
-        if not verify_password(password, user.hashed_password):
-            return {"error": "Credenziali non valide", "code": "invalid_credentials"}
-        
-        # Genera il token JWT
-        token = create_access_token({"sub": user.email, "role": user.role})
-        return {"access_token": token, "token_type": "bearer", "user": {"id": user.id, "name": user.name, "role": user.role}}
+        return {"sessions": list_sessions(db, user_id)}
     finally:
         db.close()
 
-def register_user(name: str, email: str, password: str, role: str):
-    """Registra un nuovo utente."""
+def revoke_user_sessions(user_id: int, session_id: str = None):
+    """Revoca una sessione dell'utente, o tutte se session_id non è indicato."""
     db = SessionLocal()
     try:
-        existing_user = db.query(User).filter(User.email == email).first()
-        if existing_user:
-            return {"error": "Email already registered"}
-        
-        # Hash della password
-        hashed_password = hash_password(password)
+        revoked = revoke_sessions(db, user_id, session_id)
+        if session_id is not None and revoked == 0:
+            return {"error": "Sessione non trovata"}
+        return {"status": "revoked", "revoked": revoked}
+    finally:
+        db.close()
+
+def _find_credentials(email: str):
+    """Id e hash della password dell'utente con questa email, o None."""
+    db = SessionLocal()
+    try:
+        return db.query(User.id, User.hashed_password).filter(User.email == email).first()
+    finally:
+        db.close()
+
+def _open_session(user_id: int, new_hash: str = None) -> dict:
+    """Aggiorna l'hash obsoleto, se indicato, e apre una sessione con i relativi token."""
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        # Aggiorna in modo trasparente l'hash creato con parametri non più attuali
+        if new_hash:
+            user.hashed_password = new_hash
+            db.commit()
         
+        # Apre una sessione e genera il token di accesso con il relativo refresh token
+        session_id, refresh = create_session(db, user.id)
+        result = _token_response(user, session_id, refresh)
+        result["user"] = {"id": user.id, "name": user.name, "role": user.role}
+        return result
+    finally:
+        db.close()
+
+def _email_registered(email: str) -> bool:
+    db = SessionLocal()
+    try:
+        return db.query(User.id).filter(User.email == email).first() is not None
+    finally:
+        db.close()
+
+def _create_user(name: str, email: str, hashed_password: str, role: str) -> dict:
+    db = SessionLocal()
+    try:
         # Crea il nuovo utente con il campo corretto hashed_password
         new_user = User(name=name, email=email, hashed_password=hashed_password, role=role)
         db.add(new_user)
@@ -97,4 +166,34 @@ def register_user(name: str, email: str, password: str, role: str):
         db.rollback()
         return {"error": f"Database error: {str(e)}"}
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Login e registrazione attendono l'hashing nel pool di processi: le query sincrone al database
+# girano nel threadpool, così non bloccano il ciclo di eventi durante l'attesa degli altri login
+async def authenticate_user(email: str, password: str):
+    """Autentica un utente tramite email e password."""
+    credentials = await run_in_threadpool(_find_credentials, email)
+    if not credentials:
+        return {"error": "Credenziali non valide", "code": "invalid_credentials"}
+    
+    user_id, hashed_password = credentials
+    valid, new_hash = await verify_password(password, hashed_password)
+    if not valid:
+        return {"error": "Credenziali non valide", "code": "invalid_credentials"}
+    
+    return await run_in_threadpool(_open_session, user_id, new_hash)
+
+async def register_user(name: str, email: str, password: str, role: str):
+    """Registra un nuovo utente."""
+    try:
+        if await run_in_threadpool(_email_registered, email):
+            return {"error": "Email already registered"}
+        
+        # Hash della password
+        hashed_password = await hash_password(password)
+    except HasherBusy:
+        raise
+    except Exception as e:
+        return {"error": f"Database error: {str(e)}"}
+    
+    return await run_in_threadpool(_create_user, name, email, hashed_password, role)
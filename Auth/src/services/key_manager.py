@@ -0,0 +1,165 @@
+# src/services/key_manager.py
+# Chiavi di firma dei JWT (RS256 o EdDSA) con rotazione per kid e pubblicazione in formato JWKS
+
+import os
+import secrets
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+from src.db.session import data_dir
+
+# Algoritmo delle nuove chiavi: RS256 oppure EdDSA (Ed25519)
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "RS256")
+# Cartella con le chiavi private, un file PEM per kid
+JWT_KEYS_DIR = os.getenv("JWT_KEYS_DIR", os.path.join(data_dir, "keys"))
+# Dopo quanto tempo la chiave attiva viene sostituita da una nuova
+JWT_KEY_ROTATION_HOURS = float(os.getenv("JWT_KEY_ROTATION_HOURS", "720"))
+# Per quanto una chiave sostituita resta pubblicata, così i token già emessi restano verificabili:
+# deve essere almeno pari alla durata dei token
+JWT_KEY_OVERLAP_MINUTES = float(os.getenv("JWT_KEY_OVERLAP_MINUTES", "120"))
+JWT_RSA_KEY_SIZE = int(os.getenv("JWT_RSA_KEY_SIZE", "2048"))
+# Intervallo minimo tra due riletture della cartella causate da kid sconosciuti
+JWT_KEYS_RELOAD_INTERVAL = float(os.getenv("JWT_KEYS_RELOAD_INTERVAL", "10"))
+
+
+class SigningKey:
+    """Chiave privata di firma identificata dal suo kid."""
+
+    __slots__ = ("kid", "algorithm", "private_key", "created_at")
+
+    def __init__(self, kid: str, private_key: Any):
+        self.kid = kid
+        self.private_key = private_key
+        self.algorithm = "EdDSA" if isinstance(private_key, ed25519.Ed25519PrivateKey) else "RS256"
+        # Il kid inizia con l'istante di creazione, così non serve salvare altri metadati
+        self.created_at = float(kid.split("-", 1)[0])
+
+    def public_jwk(self) -> Dict[str, Any]:
+        algorithm = OKPAlgorithm if self.algorithm == "EdDSA" else RSAAlgorithm
+        jwk = algorithm.to_jwk(self.private_key.public_key(), as_dict=True)
+        jwk.update({"kid": self.kid, "alg": self.algorithm, "use": "sig"})
+        return jwk
+
+
+class KeyRing:
+    """Insieme delle chiavi di firma salvate su disco.
+
+    I token vengono firmati con la chiave più recente. Quando questa supera l'intervallo di
+    rotazione ne viene generata una nuova; le chiavi sostituite restano pubblicate nel JWKS per
+    `overlap_seconds` dalla creazione della chiave successiva e poi vengono eliminate.
+    """
+
+    def __init__(
+        self,
+        directory: str = JWT_KEYS_DIR,
+        algorithm: str = JWT_ALGORITHM,
+        rotation_seconds: float = JWT_KEY_ROTATION_HOURS * 3600,
+        overlap_seconds: float = JWT_KEY_OVERLAP_MINUTES * 60,
+    ):
+        if algorithm not in ("RS256", "EdDSA"):
+            raise ValueError(f"Algoritmo JWT non supportato: {algorithm}")
+        self.directory = directory
+        self.algorithm = algorithm
+        self.rotation_seconds = rotation_seconds
+        self.overlap_seconds = overlap_seconds
+        self._keys: List[SigningKey] = []
+        self._lock = threading.Lock()
+        self._loaded_at: Optional[float] = None
+
+    def _load(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        keys = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".pem"):
+                continue
+            with open(os.path.join(self.directory, filename), "rb") as f:
+                private_key = serialization.load_pem_private_key(f.read(), password=None)
+            keys.append(SigningKey(filename[:-len(".pem")], private_key))
+        keys.sort(key=lambda key: key.created_at)
+        self._keys = keys
+        self._loaded_at = time.monotonic()
+
+    def _generate(self, now: float) -> SigningKey:
+        if self.algorithm == "EdDSA":
+            private_key = ed25519.Ed25519PrivateKey.generate()
+        else:
+            private_key = rsa.generate_private_key(public_exponent=65537, key_size=JWT_RSA_KEY_SIZE)
+        key = SigningKey(f"{int(now)}-{secrets.token_hex(4)}", private_key)
+        pem = private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        # Scrittura atomica con permessi ristretti: un'altra istanza non legge mai un file a metà
+        path = os.path.join(self.directory, f"{key.kid}.pem")
+        tmp_path = path + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(pem)
+        os.replace(tmp_path, path)
+        self._keys.append(key)
+        return key
+
+    def _prune(self, now: float) -> None:
+        # Una chiave resta valida finché non è trascorsa la sovrapposizione dalla creazione della successiva
+        expired = [
+            key for key, successor in zip(self._keys, self._keys[1:])
+            if successor.created_at + self.overlap_seconds <= now
+        ]
+        for key in expired:
+            try:
+                os.remove(os.path.join(self.directory, f"{key.kid}.pem"))
+            except FileNotFoundError:
+                pass
+        self._keys = [key for key in self._keys if key not in expired]
+
+    def active_key(self) -> SigningKey:
+        """Chiave con cui firmare i nuovi token, ruotata se necessario."""
+        with self._lock:
+            if self._loaded_at is None:
+                self._load()
+            now = time.time()
+            newest = self._keys[-1] if self._keys else None
+            if (
+                newest is None
+                or newest.algorithm != self.algorithm
+                or newest.created_at + self.rotation_seconds <= now
+            ):
+                newest = self._generate(now)
+            self._prune(now)
+            return newest
+
+    def get(self, kid: Optional[str]) -> Optional[SigningKey]:
+        """Chiave pubblicata con il kid indicato; la cartella viene riletta se il kid non è noto
+        (potrebbe averlo creato un'altra istanza del servizio)."""
+        if kid is None:
+            return None
+        with self._lock:
+            if self._loaded_at is None:
+                self._load()
+            key = self._find(kid)
+            if key is None and time.monotonic() - self._loaded_at >= JWT_KEYS_RELOAD_INTERVAL:
+                self._load()
+                self._prune(time.time())
+                key = self._find(kid)
+            return key
+
+    def _find(self, kid: str) -> Optional[SigningKey]:
+        for key in self._keys:
+            if key.kid == kid:
+                return key
+        return None
+
+    def jwks(self) -> Dict[str, Any]:
+        """Chiavi pubbliche ancora valide, nel formato di /.well-known/jwks.json."""
+        self.active_key()
+        with self._lock:
+            return {"keys": [key.public_jwk() for key in self._keys]}
+
+
+key_ring = KeyRing()
@@ -0,0 +1,103 @@
+# src/services/password_hasher.py
+# Hashing e verifica delle password (bcrypt) in un pool di processi dedicato e limitato
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+import bcrypt
+
+# Costo di bcrypt (2^rounds iterazioni): alzandolo gli hash esistenti vengono aggiornati al login
+BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+# Processi dedicati al calcolo degli hash
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+# Operazioni in coda o in corso oltre le quali le nuove richieste vengono rifiutate subito
+HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(HASH_WORKERS * 16)))
+
+# bcrypt considera solo i primi 72 byte della password
+BCRYPT_MAX_BYTES = 72
+
+
+class HasherBusy(Exception):
+    """Il pool di hashing è saturo: la richiesta va ritentata più tardi."""
+
+
+def _encode(password: str) -> bytes:
+    # Le versioni recenti di bcrypt rifiutano le password più lunghe invece di troncarle:
+    # il troncamento esplicito mantiene validi gli hash già salvati
+    return password.encode("utf-8")[:BCRYPT_MAX_BYTES]
+
+
+def needs_rehash(hashed_password: str, rounds: int) -> bool:
+    """Indica se l'hash è stato creato con parametri diversi da quelli attuali."""
+    parts = hashed_password.split("$")
+    return len(parts) < 4 or parts[1] != "2b" or not parts[2].isdigit() or int(parts[2]) != rounds
+
+
+def hash_password_sync(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(_encode(password), bcrypt.gensalt(rounds=rounds)).decode("ascii")
+
+
+def verify_password_sync(password: str, hashed_password: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    """Verifica la password; se è corretta ma l'hash è obsoleto restituisce anche il nuovo hash."""
+    try:
+        valid = bcrypt.checkpw(_encode(password), hashed_password.encode("ascii"))
+    except ValueError:
+        # Hash salvato non valido
+        return False, None
+    if valid and needs_rehash(hashed_password, rounds):
+        return True, hash_password_sync(password, rounds)
+    return valid, None
+
+
+class PasswordHasher:
+    """Esegue le operazioni bcrypt in processi separati, senza bloccare l'event loop.
+
+    I processi vengono avviati al primo utilizzo. Le operazioni in attesa sono limitate a
+    `max_pending`: oltre questa soglia viene sollevato HasherBusy invece di accodare altro
+    lavoro che terminerebbe comunque dopo il timeout del client.
+    """
+
+    def __init__(self, workers: int = HASH_WORKERS, max_pending: int = HASH_MAX_PENDING, rounds: int = BCRYPT_ROUNDS):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.rounds = rounds
+        self.pending = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    async def _run(self, func, *args):
+        if self.pending >= self.max_pending:
+            raise HasherBusy()
+        if self._executor is None:
+            # "spawn" evita di duplicare nei processi figli connessioni e thread del servizio
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        except BrokenProcessPool:
+            # Un processo è terminato in modo anomalo: il pool verrà ricreato alla prossima richiesta
+            self._executor = None
+            raise
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """Crea un hash per la password."""
+        return await self._run(hash_password_sync, password, self.rounds)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verifica la password e restituisce (valida, nuovo hash se da aggiornare)."""
+        return await self._run(verify_password_sync, password, hashed_password, self.rounds)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
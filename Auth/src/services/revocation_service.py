@@ -0,0 +1,170 @@
+# src/services/revocation_service.py
+# Revoca dei token per jti: filtro di Bloom in memoria davanti alla tabella revoked_tokens
+
+import hashlib
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from src.models.revoked_token_model import RevokedToken
+from src.models.user_model import SessionLocal
+
+# Numero di revoche attive previsto e probabilità di falso positivo del filtro
+REVOCATION_FILTER_CAPACITY = int(os.getenv("REVOCATION_FILTER_CAPACITY", "100000"))
+REVOCATION_FILTER_ERROR_RATE = float(os.getenv("REVOCATION_FILTER_ERROR_RATE", "0.001"))
+# Ogni quanti secondi il filtro recepisce le revoche registrate da altre istanze del servizio
+REVOCATION_SYNC_INTERVAL = float(os.getenv("REVOCATION_SYNC_INTERVAL", "1"))
+# Ogni quanti secondi le revoche di token già scaduti vengono eliminate e il filtro ricostruito
+REVOCATION_PURGE_INTERVAL = float(os.getenv("REVOCATION_PURGE_INTERVAL", "3600"))
+# Numero massimo di revoche restituite per pagina ai servizi che si sincronizzano
+REVOCATION_PAGE_SIZE = int(os.getenv("REVOCATION_PAGE_SIZE", "1000"))
+
+
+class BloomFilter:
+    """Filtro di Bloom su bytearray: nessun falso negativo, falsi positivi con probabilità `error_rate`."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(1, capacity)
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Doppio hashing: k posizioni ricavate da due hash indipendenti di 64 bit
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+    """Elenco dei token revocati.
+
+    Quasi tutti i token validi vengono scartati dal filtro senza interrogare il database; solo i
+    positivi (revoche reali o falsi positivi) vengono confermati con una query sulla tabella.
+    Il filtro recepisce in modo incrementale le revoche inserite da altri processi e viene
+    ricostruito quando le revoche scadute vengono eliminate, dato che non supporta rimozioni.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        capacity: int = REVOCATION_FILTER_CAPACITY,
+        error_rate: float = REVOCATION_FILTER_ERROR_RATE,
+        sync_interval: float = REVOCATION_SYNC_INTERVAL,
+        purge_interval: float = REVOCATION_PURGE_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.purge_interval = purge_interval
+        self._filter: Optional[BloomFilter] = None
+        self._last_seq = 0
+        self._synced_at = 0.0
+        self._purged_at = 0.0
+        self._lock = threading.Lock()
+
+    def _rebuild(self, db) -> None:
+        now = int(time.time())
+        rows = db.query(RevokedToken.id, RevokedToken.jti).filter(RevokedToken.expires_at > now).all()
+        # Il filtro viene dimensionato con margine, così le nuove revoche non lo saturano subito
+        bloom = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+        for _, jti in rows:
+            bloom.add(jti)
+        self._filter = bloom
+        self._last_seq = max((seq for seq, _ in rows), default=0)
+
+    def _sync(self, db) -> None:
+        rows = db.query(RevokedToken.id, RevokedToken.jti).filter(RevokedToken.id > self._last_seq).all()
+        for seq, jti in rows:
+            self._filter.add(jti)
+            self._last_seq = max(self._last_seq, seq)
+        if self._filter.count > self._filter.capacity:
+            self._rebuild(db)
+
+    def _purge(self, db) -> None:
+        db.query(RevokedToken).filter(RevokedToken.expires_at <= int(time.time())).delete(synchronize_session=False)
+        db.commit()
+        self._rebuild(db)
+
+    def _maintain(self, db) -> None:
+        now = time.monotonic()
+        if self._filter is None or now - self._purged_at >= self.purge_interval:
+            self._purge(db)
+            self._purged_at = self._synced_at = now
+        elif now - self._synced_at >= self.sync_interval:
+            self._sync(db)
+            self._synced_at = now
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        """Indica se il token con questo jti è stato revocato."""
+        if not jti:
+            return False
+        db = None
+        with self._lock:
+            if self._filter is None or time.monotonic() - self._synced_at >= self.sync_interval:
+                db = self.session_factory()
+                self._maintain(db)
+            maybe_revoked = jti in self._filter
+        try:
+            if not maybe_revoked:
+                return False
+            if db is None:
+                db = self.session_factory()
+            return db.query(RevokedToken.id).filter(
+                RevokedToken.jti == jti, RevokedToken.expires_at > int(time.time())
+            ).first() is not None
+        finally:
+            if db is not None:
+                db.close()
+
+    def revoke(self, jti: str, expires_at: int) -> None:
+        """Registra la revoca di un token fino alla sua scadenza."""
+        db = self.session_factory()
+        try:
+            db.add(RevokedToken(jti=jti, expires_at=int(expires_at), revoked_at=int(time.time())))
+            try:
+                db.commit()
+            except IntegrityError:
+                # Token già revocato
+                db.rollback()
+            with self._lock:
+                if self._filter is None:
+                    self._maintain(db)
+                self._filter.add(jti)
+        finally:
+            db.close()
+
+    def changes(self, since: int, limit: int = REVOCATION_PAGE_SIZE) -> Dict[str, Any]:
+        """Revoche non scadute con numero di sequenza maggiore di `since`, per la sincronizzazione dei servizi."""
+        db = self.session_factory()
+        try:
+            now = int(time.time())
+            rows = db.query(RevokedToken).filter(
+                RevokedToken.id > since, RevokedToken.expires_at > now
+            ).order_by(RevokedToken.id).limit(limit).all()
+            revocations: List[Dict[str, Any]] = [
+                {"seq": row.id, "jti": row.jti, "exp": row.expires_at} for row in rows
+            ]
+            last_seq = db.query(func.max(RevokedToken.id)).scalar() or 0
+            return {"revocations": revocations, "last_seq": last_seq, "more": len(rows) == limit}
+        finally:
+            db.close()
+
+
+revocation_list = RevocationList()
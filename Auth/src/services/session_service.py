@@ -0,0 +1,127 @@
+# src/services/session_service.py
+# Sessioni con refresh token a rotazione e rilevamento del riuso
+
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.models.session_model import Session
+
+# Durata massima di una sessione: oltre questa serve un nuovo login
+REFRESH_TOKEN_EXPIRE_DAYS = float(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+# Ogni quanti secondi le sessioni scadute o revocate vengono eliminate
+SESSION_PURGE_INTERVAL = float(os.getenv("SESSION_PURGE_INTERVAL", "3600"))
+
+_purge_lock = threading.Lock()
+_last_purge = 0.0
+
+
+class SessionError(Exception):
+    """Refresh token non valido, scaduto o già utilizzato."""
+
+
+def _hash(secret: str) -> str:
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()
+
+
+def _new_refresh_token(session_id: str) -> Tuple[str, str]:
+    """Restituisce il refresh token "<id sessione>.<segreto>" e l'hash del segreto da salvare."""
+    secret = secrets.token_urlsafe(32)
+    return f"{session_id}.{secret}", _hash(secret)
+
+
+def _purge_expired(db) -> None:
+    global _last_purge
+    now = time.time()
+    with _purge_lock:
+        if now - _last_purge < SESSION_PURGE_INTERVAL:
+            return
+        _last_purge = now
+    db.query(Session).filter(
+        (Session.expires_at <= int(now)) | (Session.revoked_at.isnot(None))
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def create_session(db, user_id: int) -> Tuple[str, str]:
+    """Apre una sessione per l'utente e restituisce (id sessione, refresh token)."""
+    _purge_expired(db)
+    now = int(time.time())
+    session_id = secrets.token_hex(16)
+    refresh_token, refresh_hash = _new_refresh_token(session_id)
+    db.add(Session(
+        id=session_id,
+        user_id=user_id,
+        refresh_hash=refresh_hash,
+        created_at=now,
+        last_used_at=now,
+        expires_at=now + int(REFRESH_TOKEN_EXPIRE_DAYS * 86400),
+    ))
+    db.commit()
+    return session_id, refresh_token
+
+
+def rotate_session(db, refresh_token: str) -> Tuple[Session, str]:
+    """Sostituisce il refresh token con uno nuovo e restituisce (sessione, nuovo refresh token).
+
+    Un refresh token già sostituito che viene presentato di nuovo indica che è stato copiato:
+    in quel caso l'intera sessione viene revocata, così anche il token rubato smette di valere.
+    """
+    session_id, _, secret = refresh_token.partition(".")
+    if not session_id or not secret:
+        raise SessionError("Refresh token non valido")
+    now = int(time.time())
+    session: Optional[Session] = db.query(Session).filter(Session.id == session_id).first()
+    if session is None or session.revoked_at is not None or session.expires_at <= now:
+        raise SessionError("Sessione scaduta o revocata")
+
+    presented_hash = _hash(secret)
+    if not hmac.compare_digest(presented_hash, session.refresh_hash):
+        session.revoked_at = now
+        db.commit()
+        raise SessionError("Refresh token già utilizzato: sessione revocata")
+
+    new_token, new_hash = _new_refresh_token(session.id)
+    # Aggiornamento condizionato: tra due rotazioni concorrenti dello stesso token ne riesce solo una
+    updated = db.query(Session).filter(
+        Session.id == session.id, Session.refresh_hash == presented_hash
+    ).update({"refresh_hash": new_hash, "last_used_at": now}, synchronize_session=False)
+    if updated != 1:
+        db.rollback()
+        db.query(Session).filter(Session.id == session.id).update({"revoked_at": now}, synchronize_session=False)
+        db.commit()
+        raise SessionError("Refresh token già utilizzato: sessione revocata")
+    db.commit()
+    return session, new_token
+
+
+def list_sessions(db, user_id: int) -> List[Dict[str, Any]]:
+    """Sessioni attive dell'utente, dalla più recente."""
+    sessions = db.query(Session).filter(
+        Session.user_id == user_id,
+        Session.expires_at > int(time.time()),
+        Session.revoked_at.is_(None),
+    ).order_by(Session.last_used_at.desc()).all()
+    return [
+        {
+            "id": session.id,
+            "created_at": session.created_at,
+            "last_used_at": session.last_used_at,
+            "expires_at": session.expires_at,
+        }
+        for session in sessions
+    ]
+
+
+def revoke_sessions(db, user_id: int, session_id: Optional[str] = None) -> int:
+    """Revoca una sessione dell'utente (o tutte, se session_id è None) e restituisce quante ne ha revocate."""
+    query = db.query(Session).filter(Session.user_id == user_id, Session.revoked_at.is_(None))
+    if session_id is not None:
+        query = query.filter(Session.id == session_id)
+    revoked = query.update({"revoked_at": int(time.time())}, synchronize_session=False)
+    db.commit()
+    return revoked
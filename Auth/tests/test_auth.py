@@ -0,0 +1,217 @@
+import asyncio
+import time
+
+import jwt
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.models.user_model import Base, User
+from src.routes import auth_routes
+from src.models.revoked_token_model import RevokedToken
+from src.models.session_model import Session
+from src.services import auth_service, key_manager
+from src.services.key_manager import KeyRing
+from src.services.password_hasher import HasherBusy, PasswordHasher, hash_password_sync
+from src.services.revocation_service import BloomFilter, RevocationList
+from src.services.session_service import SessionError, create_session, list_sessions, rotate_session
+
+# Configurazione del database di test
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Creazione delle tabelle nel database di test
+Base.metadata.create_all(bind=engine)
+
+def new_revocation_list():
+    db = TestingSessionLocal()
+    db.query(RevokedToken).delete()
+    db.commit()
+    db.close()
+    return RevocationList(session_factory=TestingSessionLocal, capacity=1000, error_rate=0.001)
+
+# Test per il filtro di Bloom: nessun falso negativo
+def test_bloom_filter_no_false_negatives():
+    bloom = BloomFilter(capacity=5000, error_rate=0.01)
+    items = [f"jti-{i}" for i in range(5000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+    assert bloom.count == 5000
+
+    # I falsi positivi restano vicini al tasso richiesto
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+# Test per la revoca di un token
+def test_revoke_and_check():
+    revocations = new_revocation_list()
+    now = int(time.time())
+    revocations.revoke("revoked-jti", now + 600)
+
+    assert revocations.is_revoked("revoked-jti")
+    assert not revocations.is_revoked("valid-jti")
+    assert not revocations.is_revoked(None)
+
+    # Una seconda revoca dello stesso token non solleva errori
+    revocations.revoke("revoked-jti", now + 600)
+    assert revocations.is_revoked("revoked-jti")
+
+# Test per l'eliminazione delle revoche scadute e la ricostruzione del filtro
+def test_purge_rebuilds_filter():
+    revocations = new_revocation_list()
+    now = int(time.time())
+    revocations.revoke("expired-jti", now - 10)
+    revocations.revoke("active-jti", now + 600)
+    old_filter = revocations._filter
+    assert "expired-jti" in old_filter
+
+    db = TestingSessionLocal()
+    try:
+        revocations._purge(db)
+        remaining = [row.jti for row in db.query(RevokedToken).all()]
+    finally:
+        db.close()
+
+    assert remaining == ["active-jti"]
+    assert revocations._filter is not old_filter
+    assert "expired-jti" not in revocations._filter
+    assert not revocations.is_revoked("expired-jti")
+    assert revocations.is_revoked("active-jti")
+
+# Test per il riuso di un refresh token già sostituito
+def test_refresh_token_reuse_revokes_session():
+    db = TestingSessionLocal()
+    try:
+        session_id, first_token = create_session(db, user_id=7)
+        assert [item["id"] for item in list_sessions(db, 7)] == [session_id]
+
+        _, second_token = rotate_session(db, first_token)
+        assert second_token != first_token
+
+        # Il token sostituito viene presentato di nuovo: la sessione viene revocata
+        with pytest.raises(SessionError):
+            rotate_session(db, first_token)
+        db.expire_all()
+        assert db.query(Session).filter(Session.id == session_id).one().revoked_at is not None
+
+        # Anche il token emesso per ultimo smette di valere
+        with pytest.raises(SessionError):
+            rotate_session(db, second_token)
+        assert list_sessions(db, 7) == []
+    finally:
+        db.close()
+
+# Test per la rotazione delle chiavi di firma e la loro pubblicazione nel JWKS
+def test_key_ring_rotation_and_overlap(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(key_manager.time, "time", lambda: now[0])
+    ring = KeyRing(str(tmp_path), "EdDSA", rotation_seconds=3600, overlap_seconds=600)
+
+    first = ring.active_key()
+    assert ring.active_key() is first
+    assert [jwk["kid"] for jwk in ring.jwks()["keys"]] == [first.kid]
+
+    # Scaduto l'intervallo di rotazione si firma con una nuova chiave, ma la vecchia resta pubblicata
+    now[0] += 3600
+    second = ring.active_key()
+    assert second.kid != first.kid
+    assert [jwk["kid"] for jwk in ring.jwks()["keys"]] == [first.kid, second.kid]
+    assert ring.get(first.kid) is first
+
+    # Un'altra istanza che legge la stessa cartella usa la stessa chiave attiva
+    other = KeyRing(str(tmp_path), "EdDSA", rotation_seconds=3600, overlap_seconds=600)
+    assert other.active_key().kid == second.kid
+
+    # Terminata la sovrapposizione la vecchia chiave viene eliminata anche dal disco
+    now[0] += 600
+    assert [jwk["kid"] for jwk in ring.jwks()["keys"]] == [second.kid]
+    assert ring.get(first.kid) is None
+    assert sorted(path.name for path in tmp_path.iterdir()) == [f"{second.kid}.pem"]
+
+# Test per i token firmati con la chiave attiva e verificati tramite il JWKS pubblicato
+def test_key_ring_jwks_verifies_tokens(tmp_path):
+    ring = KeyRing(str(tmp_path), "RS256")
+    key = ring.active_key()
+    token = jwt.encode({"sub": "user@example.com"}, key.private_key, algorithm=key.algorithm, headers={"kid": key.kid})
+
+    (jwk,) = ring.jwks()["keys"]
+    assert jwk["use"] == "sig" and jwk["alg"] == "RS256" and "d" not in jwk
+    public_key = jwt.PyJWK(jwk)
+    assert jwt.decode(token, public_key.key, algorithms=["RS256"])["sub"] == "user@example.com"
+
+    # Cambiando algoritmo la chiave viene sostituita subito
+    assert KeyRing(str(tmp_path), "EdDSA").active_key().algorithm == "EdDSA"
+
+# Test per l'hashing delle password nel pool di processi
+def test_password_hasher_pool():
+    hasher = PasswordHasher(workers=1, max_pending=4, rounds=4)
+
+    async def scenario():
+        hashed = await hasher.hash("segreta")
+        assert hashed.startswith("$2b$04$")
+        assert await hasher.verify("segreta", hashed) == (True, None)
+        assert await hasher.verify("sbagliata", hashed) == (False, None)
+        assert await hasher.verify("segreta", "hash-non-valido") == (False, None)
+
+        # Un hash creato con un costo diverso viene sostituito alla verifica riuscita
+        valid, new_hash = await hasher.verify("segreta", hash_password_sync("segreta", 5))
+        assert valid and new_hash.startswith("$2b$04$")
+
+        # Operazioni concorrenti eseguite dal pool, senza superare max_pending
+        results = await asyncio.gather(*(hasher.verify("segreta", hashed) for _ in range(4)))
+        assert all(valid for valid, _ in results)
+        assert hasher.pending == 0
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        hasher.shutdown()
+
+# Test per il pool saturo: le nuove operazioni vengono rifiutate e le API rispondono 503
+def test_password_hasher_busy(monkeypatch):
+    hasher = PasswordHasher(workers=1, max_pending=2, rounds=4)
+    # Due operazioni già in coda occupano tutto il pool
+    hasher.pending = 2
+    with pytest.raises(HasherBusy):
+        asyncio.run(hasher.hash("segreta"))
+    assert hasher._executor is None
+
+    db = TestingSessionLocal()
+    db.query(User).filter(User.email == "busy@example.com").delete()
+    db.add(User(name="Busy", email="busy@example.com", hashed_password=hash_password_sync("segreta", 4), role="client"))
+    db.commit()
+    db.close()
+
+    monkeypatch.setattr(auth_service, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(auth_service, "password_hasher", hasher)
+    app = FastAPI()
+    app.include_router(auth_routes.router, prefix="/api/v1/auth")
+    client = TestClient(app)
+
+    login = client.post("/api/v1/auth/login", json={"email": "busy@example.com", "password": "segreta"})
+    assert login.status_code == 503
+    assert login.headers["retry-after"] == "1"
+    register = client.post(
+        "/api/v1/auth/register",
+        json={"name": "Nuovo", "email": "new@example.com", "password": "segreta", "role": "client"},
+    )
+    assert register.status_code == 503
+
+    # Liberato il pool, la stessa richiesta viene servita
+    hasher.pending = 0
+    try:
+        assert client.post(
+            "/api/v1/auth/login", json={"email": "busy@example.com", "password": "wrong"}
+        ).status_code == 401
+    finally:
+        hasher.shutdown()
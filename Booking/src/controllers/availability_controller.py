@@ -0,0 +1,181 @@
+# Booking/src/controllers/availability_controller.py
+# Disponibilità dei professionisti: verifica di un orario, slot liberi (anche tra più professionisti),
+# orari settimanali ed eccezioni
+
+from fastapi import APIRouter, HTTPException, Depends, Query, Path, Body
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from src.db.session import get_db
+from src.models.availability_model import (
+    WeeklyScheduleSchema, WorkingHoursSchema, AvailabilityExceptionSchema, AvailabilityExceptionResponse
+)
+from src.services import availability_service
+from src.services.availability_service import availability_index, earliest_slots, naive, service_duration
+from src.services.entity_lookup import search_professionals
+from src.middleware.auth_middleware import get_current_user
+
+router = APIRouter()
+
+def _require_owner(current_user: dict, professional_id: int):
+    # Solo il professionista stesso o un admin possono modificare il calendario (confronto sull'id del token: "sub" contiene l'email)
+    if str(current_user.get("id")) != str(professional_id) and current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Non sei autorizzato a modificare questo calendario")
+
+async def _duration(service_id: Optional[int], duration: Optional[int]) -> int:
+    if duration:
+        return duration
+    if service_id is not None:
+        return await service_duration(service_id)
+    return availability_service.DEFAULT_SLOT_MINUTES
+
+def _search_window(start_datetime: Optional[datetime], end_datetime: Optional[datetime], default_days: int):
+    start = naive(start_datetime) if start_datetime else datetime.now()
+    end = naive(end_datetime) if end_datetime else start + timedelta(days=default_days)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="La fine della ricerca deve essere successiva all'inizio")
+    if end - start > timedelta(days=availability_service.MAX_RANGE_DAYS):
+        raise HTTPException(
+            status_code=400,
+            detail=f"L'intervallo di ricerca non può superare {availability_service.MAX_RANGE_DAYS} giorni"
+        )
+    return start, end
+
+# Rotta per i primi slot liberi tra più professionisti
+@router.get("/availability/earliest")
+async def get_earliest_slots(
+    professional_ids: Optional[str] = Query(None, description="ID dei professionisti separati da virgola"),
+    specialty: Optional[str] = Query(None, description="Specialità, se i professionisti non sono indicati"),
+    city: Optional[str] = Query(None, description="Città, se i professionisti non sono indicati"),
+    start_datetime: Optional[datetime] = Query(None, description="Inizio della ricerca (default: adesso)"),
+    end_datetime: Optional[datetime] = Query(None, description="Fine della ricerca (default: 7 giorni dopo l'inizio)"),
+    service_id: Optional[int] = Query(None, description="Servizio richiesto, per ricavarne la durata"),
+    duration: Optional[int] = Query(None, gt=0, description="Durata in minuti, alternativa a service_id"),
+    k: int = Query(10, gt=0, le=200, description="Numero di slot restituiti"),
+    per_professional: Optional[int] = Query(None, gt=0, description="Numero massimo di slot per professionista"),
+    db: Session = Depends(get_db)
+):
+    """
+    Restituisce i k slot liberi più vicini tra un insieme di professionisti, indicati per id
+    oppure cercati nel servizio utenti per specialità e città.
+    """
+    start, end = _search_window(start_datetime, end_datetime, 7)
+    limit = availability_service.EARLIEST_MAX_PROFESSIONALS
+    if professional_ids:
+        try:
+            ids = [int(item) for item in professional_ids.split(",") if item.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="professional_ids deve contenere interi separati da virgola")
+        if len(ids) > limit:
+            raise HTTPException(status_code=400, detail=f"Al massimo {limit} professionisti per ricerca")
+    elif specialty or city:
+        ids = await search_professionals(specialty, city, limit)
+    else:
+        raise HTTPException(status_code=400, detail="Indicare professional_ids oppure specialty o city")
+    minutes = await _duration(service_id, duration)
+
+    calendars = availability_index.calendars(db, ids)
+    slots = earliest_slots(calendars, start, end, minutes, k, per_professional)
+    return {
+        "duration": minutes,
+        "professionals_searched": len(calendars),
+        "slots": [
+            {"professional_id": professional_id, "start": slot_start, "end": slot_end}
+            for slot_start, slot_end, professional_id in slots
+        ]
+    }
+
+# Rotta per verificare se un professionista è libero in un certo orario
+@router.get("/availability/{professional_id}/check")
+async def check_availability(
+    professional_id: int = Path(..., description="ID del professionista"),
+    start_datetime: datetime = Query(..., description="Inizio dell'appuntamento"),
+    end_datetime: Optional[datetime] = Query(None, description="Fine dell'appuntamento; se assente o non successiva all'inizio viene ricavata dalla durata del servizio"),
+    service_id: Optional[int] = Query(None, description="Servizio richiesto, per ricavarne la durata"),
+    db: Session = Depends(get_db)
+):
+    """Indica se il professionista è in orario di lavoro e libero nell'intervallo richiesto."""
+    start = naive(start_datetime)
+    end = naive(end_datetime) if end_datetime else None
+    if end is None or end <= start:
+        end = start + timedelta(minutes=await _duration(service_id, None))
+    calendar = availability_index.calendar(db, professional_id)
+    with calendar.lock:
+        is_available, reason = calendar.check(start, end)
+    return {
+        "professional_id": professional_id,
+        "start_datetime": start,
+        "end_datetime": end,
+        "is_available": is_available,
+        "reason": reason
+    }
+
+# Rotta per i prossimi slot liberi di un professionista
+@router.get("/availability/{professional_id}/slots")
+async def get_free_slots(
+    professional_id: int = Path(..., description="ID del professionista"),
+    start_datetime: Optional[datetime] = Query(None, description="Inizio della ricerca (default: adesso)"),
+    end_datetime: Optional[datetime] = Query(None, description="Fine della ricerca (default: 14 giorni dopo l'inizio)"),
+    service_id: Optional[int] = Query(None, description="Servizio richiesto, per ricavarne la durata"),
+    duration: Optional[int] = Query(None, gt=0, description="Durata in minuti, alternativa a service_id"),
+    count: int = Query(10, gt=0, le=200, description="Numero massimo di slot restituiti"),
+    db: Session = Depends(get_db)
+):
+    """Restituisce in ordine cronologico i primi slot liberi in cui entra la durata richiesta."""
+    start, end = _search_window(start_datetime, end_datetime, 14)
+    minutes = await _duration(service_id, duration)
+    calendar = availability_index.calendar(db, professional_id)
+    with calendar.lock:
+        slots = list(calendar.free_slots(start, end, minutes, count))
+    return {
+        "professional_id": professional_id,
+        "duration": minutes,
+        "slots": [{"start": slot_start, "end": slot_end} for slot_start, slot_end in slots]
+    }
+
+# Rotte per il calendario settimanale
+@router.get("/availability/{professional_id}/schedule", response_model=List[WorkingHoursSchema])
+async def get_schedule(
+    professional_id: int = Path(..., description="ID del professionista"),
+    db: Session = Depends(get_db)
+):
+    """Restituisce le fasce orarie settimanali del professionista."""
+    return availability_service.get_weekly_schedule(db, professional_id)
+
+@router.put("/availability/{professional_id}/schedule", response_model=List[WorkingHoursSchema])
+async def update_schedule(
+    professional_id: int = Path(..., description="ID del professionista"),
+    schedule: WeeklyScheduleSchema = Body(...),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Sostituisce le fasce orarie settimanali del professionista."""
+    _require_owner(current_user, professional_id)
+    availability_service.set_weekly_schedule(db, professional_id, schedule.hours)
+    return availability_service.get_weekly_schedule(db, professional_id)
+
+# Rotte per le eccezioni (chiusure e aperture straordinarie)
+@router.post("/availability/{professional_id}/exceptions", response_model=AvailabilityExceptionResponse)
+async def create_exception(
+    professional_id: int = Path(..., description="ID del professionista"),
+    exception: AvailabilityExceptionSchema = Body(...),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Aggiunge una chiusura o un'apertura straordinaria al calendario del professionista."""
+    _require_owner(current_user, professional_id)
+    return availability_service.add_exception(db, professional_id, exception)
+
+@router.delete("/availability/{professional_id}/exceptions/{exception_id}", response_model=dict)
+async def delete_exception(
+    professional_id: int = Path(..., description="ID del professionista"),
+    exception_id: int = Path(..., description="ID dell'eccezione"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Elimina un'eccezione dal calendario del professionista."""
+    _require_owner(current_user, professional_id)
+    if not availability_service.delete_exception(db, professional_id, exception_id):
+        raise HTTPException(status_code=404, detail="Eccezione non trovata")
+    return {"message": "Eccezione eliminata con successo", "id": exception_id}
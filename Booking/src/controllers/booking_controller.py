@@ -1,13 +1,15 @@
 # Booking/src/controllers/booking_controller.py
 # Aggiornamento del controller delle prenotazioni per utilizzare il servizio integrato
 
-from fastapi import APIRouter, HTTPException, Depends, Query, Path, Body
+from fastapi import APIRouter, HTTPException, Depends, Query, Path, Body, Header, Response
 from sqlalchemy.orm import Session
+from datetime import datetime
 from typing import List, Optional
 
 from src.db.session import get_db
-from src.models.booking_model import BookingSchema, BookingUpdateSchema, BookingResponse, BookingDetailResponse
+from src.models.booking_model import Booking, BookingSchema, BookingUpdateSchema, BookingResponse, BookingDetailResponse
 from src.services.integrated_booking_service import get_integrated_booking_service, IntegratedBookingService
+from src.services.availability_service import SlotUnavailable
 from src.middleware.auth_middleware import get_current_user
 
 # Creazione di un router per il controller di prenotazione
@@ -17,12 +19,15 @@ router = APIRouter()
 @router.post("/", response_model=BookingResponse)
 async def create_new_booking(
     booking: BookingSchema, 
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
     Crea una nuova prenotazione.
     Richiede autenticazione e l'utente deve essere il cliente o un admin.
+    Con l'header Idempotency-Key una richiesta ripetuta restituisce la prenotazione già creata,
+    che si può anche ritrovare con GET /by-key/{idempotency_key}.
     """
     user_id = current_user.get("sub")
     
@@ -35,11 +40,36 @@ async def create_new_booking(
     
     booking_service = get_integrated_booking_service(db)
     try:
-        result = await booking_service.create_booking(booking, user_id)
+        result = await booking_service.create_booking(booking, user_id, idempotency_key)
         return result
+    except SlotUnavailable as e:
+        raise HTTPException(status_code=409, detail=f"Orario non disponibile: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Impossibile creare la prenotazione: {str(e)}")
 
+# Rotta per ritrovare una prenotazione dalla chiave di idempotenza usata per crearla
+@router.get("/by-key/{idempotency_key}", response_model=BookingResponse)
+async def get_booking_by_key(
+    idempotency_key: str = Path(..., description="Chiave Idempotency-Key usata nella creazione"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Recupera la prenotazione creata con una certa Idempotency-Key, anche quando il chiamante
+    non ha ricevuto la risposta della creazione (es. dopo un timeout).
+    L'utente deve essere coinvolto nella prenotazione o un admin.
+    """
+    booking = get_integrated_booking_service(db).get_booking_by_key(idempotency_key)
+    if not booking:
+        raise HTTPException(status_code=404, detail="Prenotazione non trovata")
+    user_id = current_user.get("id")
+    if booking.client_id != user_id and booking.professional_id != user_id and current_user.get("role") != "admin":
+        raise HTTPException(
+            status_code=403, 
+            detail="Non sei autorizzato a visualizzare questa prenotazione"
+        )
+    return booking
+
 # Rotta per ottenere i dettagli di una prenotazione esistente
 @router.get("/{booking_id}", response_model=BookingDetailResponse)
 async def get_booking_details(
@@ -80,15 +110,21 @@ async def get_booking_details(
     return result
 
 # Rotta per ottenere le prenotazioni di un utente
-@router.get("/user/{user_id}", response_model=List[BookingResponse])
+@router.get("/user/{user_id}", response_model=List[BookingDetailResponse])
 async def get_user_bookings_list(
+    response: Response,
     user_id: int = Path(..., description="ID dell'utente"),
-    status: Optional[str] = Query(None, description="Filtra per stato della prenotazione"),
+    status: Optional[str] = Query(None, description="Filtra per stato della prenotazione (anche più stati separati da virgola)"),
+    limit: int = Query(50, gt=0, le=200, description="Numero massimo di prenotazioni per pagina"),
+    cursor: Optional[str] = Query(None, description="Cursore della pagina successiva, dall'header X-Next-Cursor"),
+    order: str = Query("desc", pattern="^(asc|desc)$", description="Ordine per data della prenotazione"),
+    from_datetime: Optional[datetime] = Query(None, description="Solo prenotazioni da questa data in poi"),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
-    Recupera l'elenco delle prenotazioni di un utente.
+    Recupera una pagina delle prenotazioni di un utente.
+    Se ci sono altre pagine, il cursore per richiederle è nell'header X-Next-Cursor.
     L'utente deve richiedere le proprie prenotazioni o essere un admin.
     """
     logged_user_id = current_user.get("sub")
@@ -102,7 +138,11 @@ async def get_user_bookings_list(
     
     booking_service = get_integrated_booking_service(db)
     try:
-        bookings = await booking_service.get_user_bookings(user_id, status)
+        bookings, next_cursor = await booking_service.get_user_bookings(
+            user_id, status, limit=limit, cursor=cursor, order=order, from_datetime=from_datetime
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         return bookings
     except Exception as e:
         raise HTTPException(
@@ -151,6 +191,8 @@ async def update_booking_status(
             raise HTTPException(status_code=400, detail=result["error"])
         
         return result
+    except SlotUnavailable as e:
+        raise HTTPException(status_code=409, detail=f"Orario non disponibile: {str(e)}")
     except Exception as e:
         raise HTTPException(
             status_code=400, 
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 import os
@@ -25,4 +25,31 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Aggiornamento dello schema all'avvio: create_all crea solo le tabelle mancanti, quindi le colonne
+# aggiunte ai modelli dopo la creazione di un database vanno aggiunte con ALTER TABLE prima di
+# creare gli indici che le usano
+def upgrade_schema(metadata, bind=None):
+    bind = bind or engine
+    metadata.create_all(bind=bind)
+    preparer = bind.dialect.identifier_preparer
+    inspector = inspect(bind)
+    with bind.begin() as connection:
+        for table in metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable:
+                    raise RuntimeError(
+                        f"Impossibile aggiungere la colonna obbligatoria {table.name}.{column.name} "
+                        "a una tabella esistente: serve una migrazione manuale"
+                    )
+                connection.exec_driver_sql(
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=bind.dialect)}"
+                )
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
@@ -1,6 +1,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routes import booking_routes
+from healthmatch_common.tracing import setup_tracing
+from .routes import booking_routes, availability_routes
+from .models.booking_model import Base
+from .models import availability_model  # registra le tabelle delle disponibilità
+from .db.session import engine, upgrade_schema
+from .services.entity_lookup import close_http_client
 import uvicorn
 
 app = FastAPI(
@@ -18,8 +23,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Tracing distribuito (traceparent W3C) su richieste e query del database
+setup_tracing(app, "booking", engine)
+
 # Includi i router delle API
 app.include_router(booking_routes.router, prefix="/api/v1/bookings", tags=["Bookings"])
+app.include_router(availability_routes.router)
+
+# Creazione delle tabelle nel database; colonne e indici nuovi vengono aggiunti anche alle tabelle già esistenti
+upgrade_schema(Base.metadata)
+
+@app.on_event("shutdown")
+async def shutdown_http_client():
+    """Chiude le connessioni del client condiviso verso gli altri servizi."""
+    await close_http_client()
 
 @app.get("/status")
 async def status():
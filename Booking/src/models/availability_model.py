@@ -0,0 +1,73 @@
+# Booking/src/models/availability_model.py
+# Orari di lavoro settimanali ed eccezioni (chiusure o aperture straordinarie) dei professionisti
+
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Index
+from pydantic import BaseModel, validator
+from datetime import datetime, time
+from typing import Optional, List
+
+from src.models.booking_model import Base
+
+# Fascia oraria ricorrente: un professionista può avere più fasce nello stesso giorno
+class WorkingHours(Base):
+    __tablename__ = "working_hours"
+
+    id = Column(Integer, primary_key=True, index=True)
+    professional_id = Column(Integer, nullable=False, index=True)
+    weekday = Column(Integer, nullable=False)  # 0 = lunedì, 6 = domenica
+    start_minute = Column(Integer, nullable=False)  # minuti dalla mezzanotte
+    end_minute = Column(Integer, nullable=False)
+
+# Eccezione puntuale al calendario settimanale (ferie, chiusure, aperture straordinarie)
+class AvailabilityException(Base):
+    __tablename__ = "availability_exceptions"
+    __table_args__ = (
+        Index("ix_availability_exceptions_professional_end", "professional_id", "end"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    professional_id = Column(Integer, nullable=False)
+    start = Column(DateTime, nullable=False)
+    end = Column(DateTime, nullable=False)
+    is_available = Column(Boolean, default=False)  # False = chiusura, True = apertura straordinaria
+    reason = Column(String, nullable=True)
+
+# Schemi per la validazione dei dati in ingresso/uscita
+class WorkingHoursSchema(BaseModel):
+    weekday: int
+    start_time: time
+    end_time: time
+
+    @validator('weekday')
+    def weekday_must_be_valid(cls, v):
+        if not 0 <= v <= 6:
+            raise ValueError('Il giorno della settimana deve essere compreso tra 0 (lunedì) e 6 (domenica)')
+        return v
+
+    @validator('end_time')
+    def end_must_follow_start(cls, v, values):
+        if 'start_time' in values and v <= values['start_time']:
+            raise ValueError("L'orario di fine deve essere successivo a quello di inizio")
+        return v
+
+class WeeklyScheduleSchema(BaseModel):
+    hours: List[WorkingHoursSchema]
+
+class AvailabilityExceptionSchema(BaseModel):
+    start: datetime
+    end: datetime
+    is_available: bool = False
+    reason: Optional[str] = None
+
+    @validator('end')
+    def end_must_follow_start(cls, v, values):
+        if 'start' in values and v <= values['start']:
+            raise ValueError('La fine deve essere successiva all\'inizio')
+        return v
+
+class AvailabilityExceptionResponse(AvailabilityExceptionSchema):
+    id: int
+    professional_id: int
+
+    class Config:
+        orm_mode = True
@@ -1,7 +1,7 @@
 # Booking/src/models/booking_model.py
 # Questo file aggiorna il modello di prenotazione con campi e funzionalità aggiuntive
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Float, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Float, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
 from pydantic import BaseModel, Field, validator
 from datetime import datetime, timedelta
@@ -13,16 +13,25 @@ Base = declarative_base()
 # Definizione del modello Booking
 class Booking(Base):
     __tablename__ = "bookings"
+    # Indici per gli elenchi per cliente, per professionista e per stato, tutti ordinati per data
+    __table_args__ = (
+        Index("ix_bookings_client_date", "client_id", "date_time"),
+        Index("ix_bookings_professional_date", "professional_id", "date_time"),
+        Index("ix_bookings_status_date", "status", "date_time"),
+        Index("ix_bookings_idempotency_key", "idempotency_key", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     client_id = Column(Integer, nullable=False)
     professional_id = Column(Integer, nullable=False)
     service_id = Column(Integer, nullable=False)
     date_time = Column(DateTime, nullable=False)
+    duration = Column(Integer, nullable=True)  # durata in minuti, ricavata dal servizio del catalogo
     status = Column(String, default="pending")  # pending, confirmed, completed, cancelled
     payment_intent_id = Column(String, nullable=True)
     payment_status = Column(String, nullable=True)  # pending, paid, refunded, failed
     amount = Column(Integer, nullable=True)  # in centesimi
+    idempotency_key = Column(String, nullable=True)  # chiave scelta dal chiamante, per ritrovare la prenotazione
     
     # Campi aggiunti per migliorare il modello
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,7 @@
+from fastapi import APIRouter
+from src.controllers.availability_controller import router as availability_router
+
+# Creazione di un router per le rotte di disponibilità
+router = APIRouter()
+# Inclusione del router del controller di disponibilità con prefisso e tag
+router.include_router(availability_router, prefix="/api/v1", tags=["Availability"])
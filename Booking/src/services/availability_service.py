@@ -0,0 +1,432 @@
+# Booking/src/services/availability_service.py
+# Motore di disponibilità: orari settimanali, eccezioni e un indice in memoria degli
+# intervalli già prenotati per professionista, aggiornato a ogni creazione o annullamento.
+
+import os
+import threading
+import time as time_module
+import heapq
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from contextlib import ExitStack
+from datetime import datetime, time, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from src.models.availability_model import AvailabilityException, WorkingHours
+from src.models.booking_model import Booking
+from src.services.entity_lookup import service_lookup
+
+# Orario applicato ai professionisti senza un calendario settimanale (lun-ven)
+DEFAULT_WORKING_HOURS = os.getenv("AVAILABILITY_DEFAULT_WORKING_HOURS", "09:00-13:00,14:00-18:00")
+# Durata usata se il servizio non è raggiungibile nel catalogo o la prenotazione non la riporta
+DEFAULT_SLOT_MINUTES = int(os.getenv("AVAILABILITY_DEFAULT_SLOT_MINUTES", "30"))
+# Passo tra gli orari di inizio proposti come slot liberi
+SLOT_STEP_MINUTES = int(os.getenv("AVAILABILITY_SLOT_STEP_MINUTES", "15"))
+# Durata massima di una prenotazione: delimita la ricerca dei conflitti nel database
+MAX_BOOKING_MINUTES = int(os.getenv("AVAILABILITY_MAX_BOOKING_MINUTES", "480"))
+# Ampiezza massima dell'intervallo di ricerca degli slot
+MAX_RANGE_DAYS = int(os.getenv("AVAILABILITY_MAX_RANGE_DAYS", "62"))
+# Dopo quanti secondi il calendario in memoria viene ricaricato dal database, per recepire
+# le prenotazioni create da altri processi del servizio
+INDEX_TTL = float(os.getenv("AVAILABILITY_INDEX_TTL", "300"))
+# Numero massimo di calendari tenuti in memoria
+INDEX_SIZE = int(os.getenv("AVAILABILITY_INDEX_SIZE", "5000"))
+# Numero di professionisti caricati con una sola query IN
+LOAD_BATCH_SIZE = int(os.getenv("AVAILABILITY_LOAD_BATCH_SIZE", "500"))
+# Numero massimo di professionisti e di slot in una ricerca dei primi slot liberi
+EARLIEST_MAX_PROFESSIONALS = int(os.getenv("AVAILABILITY_EARLIEST_MAX_PROFESSIONALS", "500"))
+
+Interval = Tuple[datetime, datetime]
+
+ACTIVE_STATUSES = ("pending", "confirmed", "completed")
+
+
+class SlotUnavailable(Exception):
+    """L'intervallo richiesto è fuori orario o si sovrappone a un'altra prenotazione."""
+
+
+def naive(value: datetime) -> datetime:
+    # Gli orari sono quelli locali del professionista, come nel resto del servizio
+    return value.replace(tzinfo=None) if value.tzinfo else value
+
+
+def booking_interval(booking: Booking) -> Interval:
+    start = naive(booking.date_time)
+    return start, start + timedelta(minutes=booking.duration or DEFAULT_SLOT_MINUTES)
+
+
+def _parse_hours(spec: str) -> List[Tuple[int, int]]:
+    hours = []
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        start, end = item.strip().split("-")
+        start_h, start_m = start.split(":")
+        end_h, end_m = end.split(":")
+        hours.append((int(start_h) * 60 + int(start_m), int(end_h) * 60 + int(end_m)))
+    return hours
+
+
+def _merge(intervals: List[Interval]) -> List[Interval]:
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _subtract(intervals: List[Interval], cuts: List[Interval]) -> List[Interval]:
+    result = []
+    for start, end in intervals:
+        pieces = [(start, end)]
+        for cut_start, cut_end in cuts:
+            next_pieces = []
+            for piece_start, piece_end in pieces:
+                if cut_end <= piece_start or cut_start >= piece_end:
+                    next_pieces.append((piece_start, piece_end))
+                    continue
+                if piece_start < cut_start:
+                    next_pieces.append((piece_start, cut_start))
+                if cut_end < piece_end:
+                    next_pieces.append((cut_end, piece_end))
+            pieces = next_pieces
+        result.extend(pieces)
+    return result
+
+
+class IntervalIndex:
+    """Intervalli occupati di un professionista in array ordinati, interrogati con bisect.
+
+    Inizi e fini sono tenuti in due liste ordinate indipendenti: il numero di intervalli che
+    intersecano [start, end) è (inizi < end) - (fini <= start), calcolabile in O(log n) anche
+    se nel database esistono già prenotazioni sovrapposte.
+    """
+
+    def __init__(self, intervals: Iterable[Tuple[datetime, datetime, int]] = ()):
+        # Costruzione in blocco: un solo ordinamento invece di un inserimento ordinato per intervallo
+        self._intervals: List[Tuple[datetime, datetime, int]] = sorted(intervals)
+        self._starts: List[datetime] = [start for start, _, _ in self._intervals]
+        self._ends: List[datetime] = sorted(end for _, end, _ in self._intervals)
+        self._by_id: Dict[int, Interval] = {
+            booking_id: (start, end) for start, end, booking_id in self._intervals
+        }
+        self._max_length = max((end - start for start, end, _ in self._intervals), default=timedelta(0))
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def add(self, booking_id: int, start: datetime, end: datetime) -> None:
+        if booking_id in self._by_id:
+            self.remove(booking_id)
+        position = bisect_right(self._starts, start)
+        self._starts.insert(position, start)
+        self._intervals.insert(position, (start, end, booking_id))
+        insort(self._ends, end)
+        self._by_id[booking_id] = (start, end)
+        self._max_length = max(self._max_length, end - start)
+
+    def remove(self, booking_id: int) -> None:
+        interval = self._by_id.pop(booking_id, None)
+        if interval is None:
+            return
+        start, end = interval
+        position = bisect_left(self._starts, start)
+        while self._intervals[position][2] != booking_id:
+            position += 1
+        del self._starts[position]
+        del self._intervals[position]
+        del self._ends[bisect_left(self._ends, end)]
+
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        return bisect_left(self._starts, end) - bisect_right(self._ends, start) > 0
+
+    def busy(self, start: datetime, end: datetime) -> List[Interval]:
+        """Intervalli occupati (uniti) che intersecano [start, end)."""
+        first = bisect_left(self._starts, start - self._max_length)
+        last = bisect_left(self._starts, end)
+        return _merge([
+            (busy_start, busy_end)
+            for busy_start, busy_end, _ in self._intervals[first:last]
+            if busy_end > start
+        ])
+
+
+class ProfessionalCalendar:
+    """Orari di lavoro, eccezioni e prenotazioni di un professionista."""
+
+    def __init__(self, professional_id: int):
+        self.professional_id = professional_id
+        self.weekly: Dict[int, List[Tuple[int, int]]] = {}
+        self.exceptions: List[Tuple[datetime, datetime, bool]] = []
+        self.bookings = IntervalIndex()
+        self.loaded_at = 0.0
+        # Tiene insieme verifica e inserimento di una prenotazione
+        self.lock = threading.RLock()
+
+    def load(self, db: Session) -> None:
+        load_calendars(db, [self])
+
+    def apply(self, working_hours: List[WorkingHours], exceptions: List[AvailabilityException],
+              bookings: List[Tuple[datetime, datetime, int]]) -> None:
+        """Sostituisce orari, eccezioni e prenotazioni con quelli letti dal database."""
+        weekly: Dict[int, List[Tuple[int, int]]] = {}
+        for row in working_hours:
+            weekly.setdefault(row.weekday, []).append((row.start_minute, row.end_minute))
+        if not working_hours:
+            default = _parse_hours(DEFAULT_WORKING_HOURS)
+            weekly = {weekday: list(default) for weekday in range(5)}
+        index = IntervalIndex(bookings)
+
+        self.weekly = {weekday: sorted(hours) for weekday, hours in weekly.items()}
+        self.exceptions = sorted((naive(e.start), naive(e.end), bool(e.is_available)) for e in exceptions)
+        self.bookings = index
+        self.loaded_at = time_module.monotonic()
+
+    def working_windows(self, start: datetime, end: datetime) -> Iterator[Interval]:
+        """Fasce lavorative (unite e in ordine) che intersecano [start, end), giorno per giorno."""
+        day = datetime.combine(start.date(), time())
+        while day < end:
+            next_day = day + timedelta(days=1)
+            windows = [
+                (day + timedelta(minutes=start_minute), day + timedelta(minutes=end_minute))
+                for start_minute, end_minute in self.weekly.get(day.weekday(), [])
+            ]
+            openings = [(s, e) for s, e, available in self.exceptions if available and s < next_day and e > day]
+            closures = [(s, e) for s, e, available in self.exceptions if not available and s < next_day and e > day]
+            windows = _subtract(_merge(windows + openings), closures)
+            for window_start, window_end in windows:
+                window_start, window_end = max(window_start, start), min(window_end, end)
+                if window_start < window_end:
+                    yield window_start, window_end
+            day = next_day
+
+    def free_intervals(self, start: datetime, end: datetime, min_minutes: int = 0) -> Iterator[Interval]:
+        """Intervalli liberi in orario di lavoro, in ordine cronologico, lunghi almeno `min_minutes`."""
+        min_length = timedelta(minutes=min_minutes)
+        for window in self.working_windows(start, end):
+            for gap_start, gap_end in _subtract([window], self.bookings.busy(*window)):
+                if gap_end - gap_start >= min_length:
+                    yield gap_start, gap_end
+
+    def free_slots(self, start: datetime, end: datetime, duration: int, count: int) -> Iterator[Interval]:
+        """Orari di inizio liberi, allineati a SLOT_STEP_MINUTES, in cui la durata richiesta è disponibile."""
+        length = timedelta(minutes=duration)
+        step = timedelta(minutes=SLOT_STEP_MINUTES)
+        produced = 0
+        for gap_start, gap_end in self.free_intervals(start, end, duration):
+            slot_start = _align(gap_start, step)
+            while slot_start + length <= gap_end and produced < count:
+                yield slot_start, slot_start + length
+                produced += 1
+                slot_start += step
+            if produced >= count:
+                return
+
+    def check(self, start: datetime, end: datetime) -> Tuple[bool, Optional[str]]:
+        """Indica se [start, end) è interamente in orario di lavoro e libero da altre prenotazioni."""
+        covered = any(
+            window_start <= start and end <= window_end
+            for window_start, window_end in _merge(list(self.working_windows(start, end)))
+        )
+        if not covered:
+            return False, "Fuori dall'orario di lavoro del professionista"
+        if self.bookings.overlaps(start, end):
+            return False, "Orario già prenotato"
+        return True, None
+
+
+def load_calendars(db: Session, calendars: List[ProfessionalCalendar]) -> None:
+    """Carica i calendari indicati con tre query IN per blocco, invece di tre query per professionista."""
+    now = datetime.now()
+    for first in range(0, len(calendars), LOAD_BATCH_SIZE):
+        batch = {calendar.professional_id: calendar for calendar in calendars[first:first + LOAD_BATCH_SIZE]}
+        ids = list(batch)
+        working_hours: Dict[int, list] = {professional_id: [] for professional_id in ids}
+        exceptions: Dict[int, list] = {professional_id: [] for professional_id in ids}
+        bookings: Dict[int, list] = {professional_id: [] for professional_id in ids}
+        for row in db.query(WorkingHours).filter(WorkingHours.professional_id.in_(ids)):
+            working_hours[row.professional_id].append(row)
+        for row in db.query(AvailabilityException).filter(
+            AvailabilityException.professional_id.in_(ids),
+            AvailabilityException.end > now,
+        ):
+            exceptions[row.professional_id].append(row)
+        # Solo le colonne necessarie: con molti professionisti il costo è dominato da queste righe
+        for professional_id, booking_id, date_time, duration in db.query(
+            Booking.professional_id, Booking.id, Booking.date_time, Booking.duration
+        ).filter(
+            Booking.professional_id.in_(ids),
+            Booking.date_time >= now - timedelta(minutes=MAX_BOOKING_MINUTES),
+            Booking.status.in_(ACTIVE_STATUSES),
+        ):
+            start = naive(date_time)
+            bookings[professional_id].append(
+                (start, start + timedelta(minutes=duration or DEFAULT_SLOT_MINUTES), booking_id)
+            )
+        for professional_id, calendar in batch.items():
+            calendar.apply(working_hours[professional_id], exceptions[professional_id], bookings[professional_id])
+
+
+def _align(value: datetime, step: timedelta) -> datetime:
+    midnight = datetime.combine(value.date(), time())
+    remainder = (value - midnight) % step
+    return value if not remainder else value + (step - remainder)
+
+
+class AvailabilityIndex:
+    """Calendari dei professionisti in memoria, caricati al primo uso e ricaricati dopo INDEX_TTL."""
+
+    def __init__(self, ttl: float = INDEX_TTL, max_size: int = INDEX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._calendars: "OrderedDict[int, ProfessionalCalendar]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def calendar(self, db: Session, professional_id: int) -> ProfessionalCalendar:
+        with self._lock:
+            calendar = self._calendars.get(professional_id)
+            if calendar is None:
+                calendar = ProfessionalCalendar(professional_id)
+                self._calendars[professional_id] = calendar
+            self._calendars.move_to_end(professional_id)
+            while len(self._calendars) > self.max_size:
+                self._calendars.popitem(last=False)
+        with calendar.lock:
+            if time_module.monotonic() - calendar.loaded_at >= self.ttl:
+                calendar.load(db)
+        return calendar
+
+    def calendars(self, db: Session, professional_ids: List[int]) -> List[ProfessionalCalendar]:
+        """Come calendar(), per molti professionisti: quelli da (ri)caricare vengono letti insieme."""
+        now = time_module.monotonic()
+        with self._lock:
+            calendars = []
+            for professional_id in dict.fromkeys(professional_ids):
+                calendar = self._calendars.get(professional_id)
+                if calendar is None:
+                    calendar = ProfessionalCalendar(professional_id)
+                    self._calendars[professional_id] = calendar
+                self._calendars.move_to_end(professional_id)
+                calendars.append(calendar)
+            while len(self._calendars) > max(self.max_size, len(calendars)):
+                self._calendars.popitem(last=False)
+        stale = [calendar for calendar in calendars if now - calendar.loaded_at >= self.ttl]
+        if stale:
+            with ExitStack() as stack:
+                for calendar in stale:
+                    stack.enter_context(calendar.lock)
+                load_calendars(db, stale)
+        return calendars
+
+    def invalidate(self, professional_id: int) -> None:
+        """Forza il ricaricamento del calendario, es. dopo una modifica degli orari."""
+        with self._lock:
+            self._calendars.pop(professional_id, None)
+
+    def booking_changed(self, booking: Booking) -> None:
+        """Aggiorna l'indice dopo la creazione, la modifica o l'annullamento di una prenotazione."""
+        with self._lock:
+            calendar = self._calendars.get(booking.professional_id)
+        if calendar is None:
+            return
+        with calendar.lock:
+            if booking.status in ACTIVE_STATUSES:
+                calendar.bookings.add(booking.id, *booking_interval(booking))
+            else:
+                calendar.bookings.remove(booking.id)
+
+
+def has_conflicting_booking(db: Session, professional_id: int, start: datetime, end: datetime,
+                            exclude_id: Optional[int] = None) -> bool:
+    """Verifica sul database, limitata alla finestra di MAX_BOOKING_MINUTES prima dell'inizio."""
+    query = db.query(Booking).filter(
+        Booking.professional_id == professional_id,
+        Booking.date_time < end,
+        Booking.date_time > start - timedelta(minutes=MAX_BOOKING_MINUTES),
+        Booking.status.in_(ACTIVE_STATUSES),
+    )
+    if exclude_id is not None:
+        query = query.filter(Booking.id != exclude_id)
+    return any(booking_interval(booking)[1] > start for booking in query.all())
+
+
+def set_weekly_schedule(db: Session, professional_id: int, hours) -> None:
+    """Sostituisce il calendario settimanale del professionista."""
+    db.query(WorkingHours).filter(WorkingHours.professional_id == professional_id).delete(synchronize_session=False)
+    for item in hours:
+        db.add(WorkingHours(
+            professional_id=professional_id,
+            weekday=item.weekday,
+            start_minute=item.start_time.hour * 60 + item.start_time.minute,
+            end_minute=item.end_time.hour * 60 + item.end_time.minute,
+        ))
+    db.commit()
+    availability_index.invalidate(professional_id)
+
+
+def get_weekly_schedule(db: Session, professional_id: int) -> List[Dict[str, object]]:
+    rows = db.query(WorkingHours).filter(
+        WorkingHours.professional_id == professional_id
+    ).order_by(WorkingHours.weekday, WorkingHours.start_minute).all()
+    return [
+        {
+            "weekday": row.weekday,
+            "start_time": time(row.start_minute // 60, row.start_minute % 60),
+            "end_time": time(row.end_minute // 60, row.end_minute % 60),
+        }
+        for row in rows
+    ]
+
+
+def add_exception(db: Session, professional_id: int, data) -> AvailabilityException:
+    exception = AvailabilityException(professional_id=professional_id, **data.dict())
+    db.add(exception)
+    db.commit()
+    db.refresh(exception)
+    availability_index.invalidate(professional_id)
+    return exception
+
+
+def delete_exception(db: Session, professional_id: int, exception_id: int) -> bool:
+    deleted = db.query(AvailabilityException).filter(
+        AvailabilityException.id == exception_id,
+        AvailabilityException.professional_id == professional_id,
+    ).delete(synchronize_session=False)
+    db.commit()
+    availability_index.invalidate(professional_id)
+    return bool(deleted)
+
+
+availability_index = AvailabilityIndex()
+
+
+async def service_duration(service_id: int) -> int:
+    """Durata in minuti del servizio secondo il catalogo, o DEFAULT_SLOT_MINUTES se non disponibile."""
+    service = await service_lookup.get(service_id)
+    return int((service or {}).get("duration") or DEFAULT_SLOT_MINUTES)
+
+
+def earliest_slots(calendars: List[ProfessionalCalendar], start: datetime, end: datetime,
+                   duration: int, count: int, per_professional: Optional[int] = None) -> List[Tuple[datetime, datetime, int]]:
+    """I primi `count` slot liberi tra tutti i calendari, come (inizio, fine, id professionista).
+
+    Gli slot di ogni professionista sono prodotti in modo pigro e in ordine cronologico, quindi
+    un heap-merge ne legge solo quanti ne servono invece di calcolare ogni calendario per intero.
+    """
+    limit = min(count, per_professional) if per_professional else count
+
+    def slots(calendar: ProfessionalCalendar):
+        for slot_start, slot_end in calendar.free_slots(start, end, duration, limit):
+            yield slot_start, slot_end, calendar.professional_id
+
+    ordered = sorted(calendars, key=lambda calendar: calendar.professional_id)
+    with ExitStack() as stack:
+        for calendar in ordered:
+            stack.enter_context(calendar.lock)
+        merged = heapq.merge(*(slots(calendar) for calendar in ordered))
+        return [slot for slot, _ in zip(merged, range(count))]
@@ -1,4 +1,5 @@
 from sqlalchemy.orm import Session
+from healthmatch_common.tracing import TracedTransport
 from src.models.booking_model import Booking, BookingSchema, BookingUpdateSchema
 import httpx
 from typing import Dict, Any
@@ -32,7 +33,7 @@ class BookingService:
     
     async def _send_booking_notifications(self, booking):
         """Invia notifiche tramite il servizio di notifica"""
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(transport=TracedTransport()) as client:
             # Notifica al cliente
             await client.post(
                 f"{self.notification_service_url}/notifications",
@@ -88,7 +89,7 @@ async def create_complete_booking(booking_data, user_id, db: Session):
     
     try:
         # 2. Crea l'intent di pagamento
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(transport=TracedTransport()) as client:
             payment_response = await client.post(
                 f"{PAYMENT_SERVICE_URL}/api/v1/stripe/create-payment-intent",
                 json={
@@ -0,0 +1,182 @@
+# Booking/src/services/entity_lookup.py
+# Risoluzione in blocco di utenti e servizi per l'arricchimento delle prenotazioni:
+# un client HTTP condiviso, richieste per blocchi di id eseguite in parallelo e una cache
+# TTL per processo, così il costo dipende dal numero di entità distinte e non dalle righe.
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+from healthmatch_common.tracing import TracedTransport
+
+logger = logging.getLogger(__name__)
+
+# Durata in cache dei dati di utenti e servizi e numero massimo di voci per cache
+ENTITY_CACHE_TTL = float(os.getenv("ENTITY_CACHE_TTL", "60"))
+ENTITY_CACHE_SIZE = int(os.getenv("ENTITY_CACHE_SIZE", "10000"))
+# Numero massimo di id per richiesta di lookup e di richieste contemporanee verso un servizio
+ENTITY_LOOKUP_BATCH_SIZE = int(os.getenv("ENTITY_LOOKUP_BATCH_SIZE", "200"))
+ENTITY_LOOKUP_CONCURRENCY = int(os.getenv("ENTITY_LOOKUP_CONCURRENCY", "10"))
+ENTITY_LOOKUP_TIMEOUT = float(os.getenv("ENTITY_LOOKUP_TIMEOUT", "5"))
+# Dopo un 404/405 su /lookup si usano le richieste singole per questi secondi, poi si riprova
+ENTITY_LOOKUP_BULK_RETRY = float(os.getenv("ENTITY_LOOKUP_BULK_RETRY", "60"))
+# Risorse dei servizi Users e Catalog che espongono /lookup e /{id}
+USERS_LOOKUP_URL = os.getenv("USERS_LOOKUP_URL", "http://users-service:8006/api/v1/users")
+SERVICES_LOOKUP_URL = os.getenv("SERVICES_LOOKUP_URL", "http://catalog-service:8003/api/v1/services")
+PROFESSIONALS_SEARCH_URL = os.getenv("PROFESSIONALS_SEARCH_URL", "http://users-service:8006/api/v1/professionals/search")
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def http_client() -> httpx.AsyncClient:
+    """Client condiviso dal processo, con connessioni riutilizzate tra le richieste."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            transport=TracedTransport(),
+            timeout=ENTITY_LOOKUP_TIMEOUT,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+class TTLCache:
+    """Cache LRU con scadenza per voce."""
+
+    def __init__(self, ttl: float = ENTITY_CACHE_TTL, max_size: int = ENTITY_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._items: "OrderedDict[Any, tuple]" = OrderedDict()
+
+    def get(self, key: Any) -> Any:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def set(self, key: Any, value: Any) -> None:
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+
+class EntityLookup:
+    """Recupera in blocco le entità di un servizio tramite `POST {base_url}/lookup`.
+
+    Se il servizio non espone l'endpoint di lookup (404/405) si ripiega su richieste
+    `GET {base_url}/{id}` parallele per ENTITY_LOOKUP_BULK_RETRY secondi, poi si riprova il lookup
+    in blocco: un 404 transitorio (es. durante un rilascio) non lo disattiva per sempre.
+    Gli id non trovati o non raggiungibili sono assenti dal risultato.
+    """
+
+    def __init__(self, base_url: str, fields: Iterable[str], cache: Optional[TTLCache] = None):
+        self.base_url = base_url.rstrip("/")
+        self.fields = list(fields)
+        self.cache = cache or TTLCache()
+        self._bulk_unavailable_at: Optional[float] = None
+
+    async def get_many(self, ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        found: Dict[int, Dict[str, Any]] = {}
+        missing: List[int] = []
+        for entity_id in dict.fromkeys(ids):
+            if entity_id is None:
+                continue
+            cached = self.cache.get(entity_id)
+            if cached is not None:
+                found[entity_id] = cached
+            else:
+                missing.append(entity_id)
+        if not missing:
+            return found
+
+        semaphore = asyncio.Semaphore(ENTITY_LOOKUP_CONCURRENCY)
+        batches = [missing[i:i + ENTITY_LOOKUP_BATCH_SIZE] for i in range(0, len(missing), ENTITY_LOOKUP_BATCH_SIZE)]
+        results = await asyncio.gather(*(self._fetch_batch(batch, semaphore) for batch in batches))
+        for entities in results:
+            for entity in entities:
+                self.cache.set(entity["id"], entity)
+                found[entity["id"]] = entity
+        return found
+
+    async def get(self, entity_id: int) -> Optional[Dict[str, Any]]:
+        return (await self.get_many([entity_id])).get(entity_id)
+
+    async def _fetch_batch(self, ids: List[int], semaphore: asyncio.Semaphore) -> List[Dict[str, Any]]:
+        unavailable_at = self._bulk_unavailable_at
+        if unavailable_at is None or time.monotonic() - unavailable_at >= ENTITY_LOOKUP_BULK_RETRY:
+            try:
+                async with semaphore:
+                    response = await http_client().post(
+                        f"{self.base_url}/lookup", json={"ids": ids, "fields": self.fields}
+                    )
+                if response.status_code in (404, 405):
+                    logger.info(f"Lookup in blocco non disponibile su {self.base_url}, uso le richieste singole")
+                    self._bulk_unavailable_at = time.monotonic()
+                else:
+                    response.raise_for_status()
+                    self._bulk_unavailable_at = None
+                    return [entity for entity in response.json() if "id" in entity]
+            except (httpx.HTTPError, ValueError) as e:
+                logger.warning(f"Lookup in blocco su {self.base_url} non riuscito: {str(e)}")
+                return []
+
+        entities = await asyncio.gather(*(self._fetch_one(entity_id, semaphore) for entity_id in ids))
+        return [entity for entity in entities if entity is not None]
+
+    async def _fetch_one(self, entity_id: int, semaphore: asyncio.Semaphore) -> Optional[Dict[str, Any]]:
+        try:
+            async with semaphore:
+                response = await http_client().get(f"{self.base_url}/{entity_id}")
+            if response.status_code == 200:
+                entity = response.json()
+                return {field: entity.get(field) for field in self.fields}
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning(f"Impossibile recuperare {self.base_url}/{entity_id}: {str(e)}")
+        return None
+
+
+# Lookup condivisi dal processo: nomi per arricchire le prenotazioni, durata dei servizi per le disponibilità
+user_lookup = EntityLookup(USERS_LOOKUP_URL, fields=["id", "name"])
+service_lookup = EntityLookup(SERVICES_LOOKUP_URL, fields=["id", "name", "duration"])
+
+# Id dei professionisti per (specialità, città, limite), dal servizio Users
+_search_cache = TTLCache()
+
+
+async def search_professionals(specialty: Optional[str], city: Optional[str], limit: int) -> List[int]:
+    """Id dei professionisti con la specialità e la città indicate; lista vuota se Users non risponde."""
+    key = (specialty, city, limit)
+    cached = _search_cache.get(key)
+    if cached is not None:
+        return cached
+    params = {"limit": limit}
+    if specialty:
+        params["specialty"] = specialty
+    if city:
+        params["location"] = city
+    try:
+        response = await http_client().get(PROFESSIONALS_SEARCH_URL, params=params)
+        response.raise_for_status()
+        professional_ids = [professional["id"] for professional in response.json()]
+    except (httpx.HTTPError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Ricerca dei professionisti non riuscita: {str(e)}")
+        return []
+    _search_cache.set(key, professional_ids)
+    return professional_ids
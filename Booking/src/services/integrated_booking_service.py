@@ -3,12 +3,21 @@
 # il servizio di notifica per inviare conferme e promemoria
 
 import httpx
+import base64
 from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, select, union
 from sqlalchemy.orm import Session
+from healthmatch_common.tracing import TracedTransport
 from src.models.booking_model import Booking, BookingSchema, BookingUpdateSchema
+from src.services.availability_service import (
+    ACTIVE_STATUSES, SlotUnavailable, availability_index, booking_interval, has_conflicting_booking, naive,
+    service_duration
+)
+from src.services.entity_lookup import service_lookup, user_lookup
+import asyncio
 import json
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 # Configurazione logger
 logging.basicConfig(level=logging.INFO)
@@ -19,21 +28,42 @@ NOTIFICATION_SERVICE_URL = "http://notification-service:8004/api/v1"
 PAYMENT_SERVICE_URL = "http://payment-service:8005/api/v1"
 USER_SERVICE_URL = "http://users-service:8006/api/v1"
 
+# Dimensione predefinita e massima delle pagine negli elenchi di prenotazioni
+BOOKINGS_PAGE_SIZE = 50
+BOOKINGS_MAX_PAGE_SIZE = 200
+
+def encode_cursor(booking: Booking) -> str:
+    """Cursore opaco della pagina successiva: data e id dell'ultima prenotazione restituita."""
+    raw = f"{booking.date_time.isoformat()}|{booking.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Solleva ValueError se il cursore non è valido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        date_time, booking_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(date_time), int(booking_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Cursore non valido") from e
+
 class IntegratedBookingService:
     def __init__(self, db_session: Session):
         self.db_session = db_session
         
-    async def create_booking(self, booking_data: BookingSchema, user_id: int) -> Dict[str, Any]:
+    async def create_booking(self, booking_data: BookingSchema, user_id: int,
+                             idempotency_key: Optional[str] = None) -> Dict[str, Any]:
         """
         Crea una prenotazione e invia le notifiche a cliente e professionista.
-        Restituisce la prenotazione creata.
+        Restituisce la prenotazione creata; se esiste già una prenotazione con la stessa
+        idempotency_key la restituisce senza crearne un'altra.
         """
         try:
-            # 1. Salva la prenotazione nel database
-            new_booking = Booking(**booking_data.dict())
-            self.db_session.add(new_booking)
-            self.db_session.commit()
-            self.db_session.refresh(new_booking)
+            existing = self.get_booking_by_key(idempotency_key) if idempotency_key else None
+            if existing is not None:
+                return self._created_response(existing)
+            
+            # 1. Salva la prenotazione nel database, rifiutando gli orari non disponibili
+            new_booking = await self._save_booking(booking_data, idempotency_key)
             
             # 2. Ottieni informazioni su cliente e professionista per le notifiche
             client_info = await self._get_user_info(booking_data.client_id)
@@ -49,21 +79,55 @@ class IntegratedBookingService:
             # 5. Programma un promemoria per il giorno prima dell'appuntamento
             await self._schedule_reminder(new_booking, client_info, professional_info, service_info)
             
-            return {
-                "id": new_booking.id,
-                "client_id": new_booking.client_id,
-                "professional_id": new_booking.professional_id,
-                "service_id": new_booking.service_id,
-                "date_time": new_booking.date_time.isoformat(),
-                "status": new_booking.status,
-                "message": "Prenotazione creata con successo"
-            }
+            return self._created_response(new_booking)
             
         except Exception as e:
             self.db_session.rollback()
             logger.error(f"Errore durante la creazione della prenotazione: {str(e)}")
             raise
     
+    def get_booking_by_key(self, idempotency_key: str) -> Optional[Booking]:
+        """Prenotazione creata con la idempotency_key indicata, se esiste."""
+        return self.db_session.query(Booking).filter(Booking.idempotency_key == idempotency_key).first()
+    
+    def _created_response(self, booking: Booking) -> Dict[str, Any]:
+        return {
+            "id": booking.id,
+            "client_id": booking.client_id,
+            "professional_id": booking.professional_id,
+            "service_id": booking.service_id,
+            "date_time": booking.date_time.isoformat(),
+            "status": booking.status,
+            "created_at": booking.created_at,
+            "updated_at": booking.updated_at,
+            "message": "Prenotazione creata con successo"
+        }
+    
+    async def _save_booking(self, booking_data: BookingSchema, idempotency_key: Optional[str] = None) -> Booking:
+        """
+        Salva la prenotazione solo se l'orario è in orario di lavoro e libero.
+        Verifica e inserimento avvengono sotto il lock del calendario del professionista; la
+        verifica ripetuta sul database dopo l'inserimento copre le prenotazioni di altri processi.
+        """
+        duration = await service_duration(booking_data.service_id)
+        start = naive(booking_data.date_time)
+        end = start + timedelta(minutes=duration)
+        calendar = availability_index.calendar(self.db_session, booking_data.professional_id)
+        with calendar.lock:
+            available, reason = calendar.check(start, end)
+            if not available:
+                raise SlotUnavailable(reason)
+            new_booking = Booking(**booking_data.dict(), duration=duration, idempotency_key=idempotency_key)
+            self.db_session.add(new_booking)
+            self.db_session.flush()
+            if has_conflicting_booking(self.db_session, booking_data.professional_id, start, end, exclude_id=new_booking.id):
+                self.db_session.rollback()
+                raise SlotUnavailable("Orario già prenotato")
+            self.db_session.commit()
+            self.db_session.refresh(new_booking)
+            availability_index.booking_changed(new_booking)
+        return new_booking
+    
     async def update_booking_status(self, booking_id: int, new_status: str, user_id: int) -> Dict[str, Any]:
         """
         Aggiorna lo stato di una prenotazione e invia le notifiche appropriate.
@@ -81,10 +145,20 @@ class IntegratedBookingService:
             
             old_status = booking.status
             
-            # 3. Aggiorna lo stato
-            booking.status = new_status
-            self.db_session.commit()
-            self.db_session.refresh(booking)
+            # 3. Aggiorna lo stato; una prenotazione annullata che torna attiva rioccupa il suo
+            # orario, quindi va verificato come una nuova prenotazione sotto il lock del calendario
+            calendar = availability_index.calendar(self.db_session, booking.professional_id)
+            with calendar.lock:
+                if new_status in ACTIVE_STATUSES and old_status not in ACTIVE_STATUSES:
+                    start, end = booking_interval(booking)
+                    if calendar.bookings.overlaps(start, end) or has_conflicting_booking(
+                        self.db_session, booking.professional_id, start, end, exclude_id=booking.id
+                    ):
+                        raise SlotUnavailable("Orario già prenotato")
+                booking.status = new_status
+                self.db_session.commit()
+                self.db_session.refresh(booking)
+                availability_index.booking_changed(booking)
             
             # 4. Ottieni informazioni per le notifiche
             client_info = await self._get_user_info(booking.client_id)
@@ -111,27 +185,96 @@ class IntegratedBookingService:
             logger.error(f"Errore durante l'aggiornamento della prenotazione: {str(e)}")
             raise
     
-    async def get_user_bookings(self, user_id: int, status: Optional[str] = None) -> List[Dict[str, Any]]:
+    def _user_bookings_query(
+        self,
+        user_id: int,
+        statuses: Optional[List[str]],
+        from_datetime: Optional[datetime],
+        cursor: Optional[Tuple[datetime, int]],
+        descending: bool,
+        limit: int
+    ):
+        """
+        Una pagina di prenotazioni in cui l'utente è cliente o professionista.
+        Invece di un OR tra due colonne, che impedisce l'uso degli indici, le due condizioni
+        sono due query separate unite con UNION: ciascuna scorre il proprio indice composito
+        (client_id, date_time) o (professional_id, date_time) e si ferma dopo `limit` righe.
+        """
+        def branch(column):
+            query = select(Booking.id, Booking.date_time).where(column == user_id)
+            if statuses:
+                # status || '' non è indicizzabile: il planner resta sull'indice dell'utente invece
+                # di scorrere (status, date_time) per tutti gli utenti
+                query = query.where(Booking.status.concat("").in_(statuses))
+            if from_datetime is not None:
+                query = query.where(Booking.date_time >= from_datetime)
+            if cursor is not None:
+                # Paginazione keyset su (date_time, id): nessun OFFSET da scorrere
+                cursor_date, cursor_id = cursor
+                if descending:
+                    query = query.where(Booking.date_time <= cursor_date, or_(
+                        Booking.date_time < cursor_date,
+                        and_(Booking.date_time == cursor_date, Booking.id < cursor_id)
+                    ))
+                else:
+                    query = query.where(Booking.date_time >= cursor_date, or_(
+                        Booking.date_time > cursor_date,
+                        and_(Booking.date_time == cursor_date, Booking.id > cursor_id)
+                    ))
+            order = (Booking.date_time.desc(), Booking.id.desc()) if descending else (Booking.date_time, Booking.id)
+            return query.order_by(*order).limit(limit).subquery()
+
+        as_client = branch(Booking.client_id)
+        as_professional = branch(Booking.professional_id)
+        page = union(
+            select(as_client.c.id, as_client.c.date_time),
+            select(as_professional.c.id, as_professional.c.date_time)
+        ).subquery()
+        order = (page.c.date_time.desc(), page.c.id.desc()) if descending else (page.c.date_time, page.c.id)
+        return self.db_session.query(Booking).join(page, Booking.id == page.c.id).order_by(*order).limit(limit)
+    
+    async def get_user_bookings(
+        self,
+        user_id: int,
+        status: Optional[str] = None,
+        limit: int = BOOKINGS_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        order: str = "desc",
+        from_datetime: Optional[datetime] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
         """
-        Recupera tutte le prenotazioni di un utente (sia come cliente che come professionista)
-        con possibilità di filtrare per stato.
+        Recupera una pagina delle prenotazioni di un utente (sia come cliente che come professionista)
+        con possibilità di filtrare per uno o più stati separati da virgola.
+        Restituisce le prenotazioni e il cursore della pagina successiva (None se è l'ultima).
         """
         try:
-            query = self.db_session.query(Booking).filter(
-                (Booking.client_id == user_id) | (Booking.professional_id == user_id)
+            limit = max(1, min(limit, BOOKINGS_MAX_PAGE_SIZE))
+            statuses = [item.strip() for item in status.split(",") if item.strip()] if status else None
+            query = self._user_bookings_query(
+                user_id,
+                statuses,
+                naive(from_datetime) if from_datetime else None,
+                decode_cursor(cursor) if cursor else None,
+                order != "asc",
+                limit + 1
             )
+            bookings = query.all()
+            next_cursor = encode_cursor(bookings[limit - 1]) if len(bookings) > limit else None
+            bookings = bookings[:limit]
             
-            if status:
-                query = query.filter(Booking.status == status)
-            
-            bookings = query.order_by(Booking.date_time.desc()).all()
+            # Arricchimento in blocco: una sola risoluzione per ogni utente e servizio distinto
+            users, services = await asyncio.gather(
+                user_lookup.get_many(
+                    [b.client_id for b in bookings] + [b.professional_id for b in bookings]
+                ),
+                service_lookup.get_many(b.service_id for b in bookings),
+            )
             
             result = []
             for booking in bookings:
-                # Recupera dettagli aggiuntivi per ogni prenotazione
-                client_info = await self._get_user_info(booking.client_id)
-                professional_info = await self._get_user_info(booking.professional_id)
-                service_info = await self._get_service_info(booking.service_id)
+                client_info = users.get(booking.client_id, {})
+                professional_info = users.get(booking.professional_id, {})
+                service_info = services.get(booking.service_id, {})
                 
                 result.append({
                     "id": booking.id,
@@ -145,10 +288,12 @@ class IntegratedBookingService:
                     "status": booking.status,
                     "payment_status": booking.payment_status,
                     "amount": booking.amount,
+                    "created_at": booking.created_at,
+                    "updated_at": booking.updated_at,
                     "is_client": booking.client_id == user_id
                 })
             
-            return result
+            return result, next_cursor
             
         except Exception as e:
             logger.error(f"Errore durante il recupero delle prenotazioni: {str(e)}")
@@ -158,27 +303,11 @@ class IntegratedBookingService:
     
     async def _get_user_info(self, user_id: int) -> Dict[str, Any]:
         """Recupera informazioni sull'utente dal servizio utenti."""
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{USER_SERVICE_URL}/users/{user_id}")
-                if response.status_code == 200:
-                    return response.json()
-                return {"id": user_id, "name": "Utente sconosciuto"}
-        except Exception as e:
-            logger.warning(f"Impossibile recuperare informazioni utente {user_id}: {str(e)}")
-            return {"id": user_id, "name": "Utente sconosciuto"}
+        return await user_lookup.get(user_id) or {"id": user_id, "name": "Utente sconosciuto"}
     
     async def _get_service_info(self, service_id: int) -> Dict[str, Any]:
         """Recupera informazioni sul servizio dal catalogo."""
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"http://catalog-service:8003/api/v1/services/{service_id}")
-                if response.status_code == 200:
-                    return response.json()
-                return {"id": service_id, "name": "Servizio sconosciuto"}
-        except Exception as e:
-            logger.warning(f"Impossibile recuperare informazioni servizio {service_id}: {str(e)}")
-            return {"id": service_id, "name": "Servizio sconosciuto"}
+        return await service_lookup.get(service_id) or {"id": service_id, "name": "Servizio sconosciuto"}
     
     async def _send_client_notification(self, booking, client_info, professional_info, service_info):
         """Invia una notifica al cliente per la prenotazione creata."""
@@ -197,7 +326,7 @@ class IntegratedBookingService:
                 })
             }
             
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(transport=TracedTransport()) as client:
                 await client.post(f"{NOTIFICATION_SERVICE_URL}/", json=notification_data)
         except Exception as e:
             logger.warning(f"Errore nell'invio della notifica al cliente: {str(e)}")
@@ -219,7 +348,7 @@ class IntegratedBookingService:
                 })
             }
             
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(transport=TracedTransport()) as client:
                 await client.post(f"{NOTIFICATION_SERVICE_URL}/", json=notification_data)
         except Exception as e:
             logger.warning(f"Errore nell'invio della notifica al professionista: {str(e)}")
@@ -252,7 +381,7 @@ class IntegratedBookingService:
                 })
             }
             
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(transport=TracedTransport()) as client:
                 await client.post(f"{NOTIFICATION_SERVICE_URL}/", json=notification_data)
         except Exception as e:
             logger.warning(f"Errore nell'invio della notifica di conferma: {str(e)}")
@@ -275,7 +404,7 @@ class IntegratedBookingService:
                     })
                 }
                 
-                async with httpx.AsyncClient() as client:
+                async with httpx.AsyncClient(transport=TracedTransport()) as client:
                     await client.post(f"{NOTIFICATION_SERVICE_URL}/", json=notification_data)
             
             # Se l'annullamento è stato fatto dal cliente, notifica il professionista
@@ -291,7 +420,7 @@ class IntegratedBookingService:
                     })
                 }
                 
-                async with httpx.AsyncClient() as client:
+                async with httpx.AsyncClient(transport=TracedTransport()) as client:
                     await client.post(f"{NOTIFICATION_SERVICE_URL}/", json=notification_data)
         except Exception as e:
             logger.warning(f"Errore nell'invio della notifica di annullamento: {str(e)}")
@@ -312,7 +441,7 @@ class IntegratedBookingService:
                 })
             }
             
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(transport=TracedTransport()) as client:
                 await client.post(f"{NOTIFICATION_SERVICE_URL}/", json=notification_data)
         except Exception as e:
             logger.warning(f"Errore nell'invio della notifica di completamento: {str(e)}")
@@ -0,0 +1,273 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.db.session import upgrade_schema
+from src.models.booking_model import Base, Booking
+from src.services.availability_service import (
+    IntervalIndex, ProfessionalCalendar, SlotUnavailable, availability_index, earliest_slots
+)
+from src.services import entity_lookup
+from src.services.entity_lookup import EntityLookup, TTLCache, service_lookup, user_lookup
+from src.services.integrated_booking_service import IntegratedBookingService
+
+# Configurazione del database di test
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Creazione delle tabelle nel database di test
+Base.metadata.create_all(bind=engine)
+
+# Un lunedì futuro: orario di lavoro predefinito 09:00-13:00 e 14:00-18:00
+MONDAY = datetime(2030, 1, 7)
+
+def at(hour, minute=0):
+    return MONDAY + timedelta(hours=hour, minutes=minute)
+
+def make_calendar(professional_id, bookings):
+    # Nessun orario settimanale: si applica l'orario predefinito dal lunedì al venerdì
+    calendar = ProfessionalCalendar(professional_id)
+    calendar.apply([], [], bookings)
+    return calendar
+
+# Fixture per un database vuoto a ogni test
+@pytest.fixture(scope="function")
+def db():
+    db = TestingSessionLocal()
+    yield db
+    db.query(Booking).delete()
+    db.commit()
+    db.close()
+
+# Test per l'indice degli intervalli prenotati
+def test_interval_index_add_remove_overlaps():
+    index = IntervalIndex()
+    index.add(1, at(9), at(10))
+    index.add(2, at(9, 30), at(11))
+    assert len(index) == 2
+
+    assert index.overlaps(at(10), at(10, 30))
+    assert index.overlaps(at(8), at(9, 1))
+    # Gli intervalli sono semiaperti: toccarsi non è una sovrapposizione
+    assert not index.overlaps(at(8), at(9))
+    assert not index.overlaps(at(11), at(12))
+    assert index.busy(at(8), at(12)) == [(at(9), at(11))]
+
+    index.remove(2)
+    assert not index.overlaps(at(10), at(10, 30))
+    assert index.overlaps(at(9, 30), at(9, 45))
+
+    # Aggiungere di nuovo lo stesso id sposta la prenotazione invece di duplicarla
+    index.add(1, at(12), at(12, 30))
+    assert len(index) == 1
+    assert not index.overlaps(at(9), at(10))
+    assert index.overlaps(at(12, 15), at(12, 20))
+
+    # Rimuovere un id sconosciuto non ha effetti
+    index.remove(99)
+    assert len(index) == 1
+
+# Test per la costruzione in blocco, equivalente agli inserimenti singoli
+def test_interval_index_bulk_matches_incremental():
+    intervals = [(at(9 + i % 5, 15 * (i % 4)), at(10 + i % 5, 15 * (i % 4)), i) for i in range(20)]
+    bulk = IntervalIndex(intervals)
+    incremental = IntervalIndex()
+    for start, end, booking_id in reversed(intervals):
+        incremental.add(booking_id, start, end)
+
+    for minute in range(0, 10 * 60, 10):
+        start = at(8) + timedelta(minutes=minute)
+        end = start + timedelta(minutes=20)
+        assert bulk.overlaps(start, end) == incremental.overlaps(start, end)
+        assert bulk.busy(start, end) == incremental.busy(start, end)
+
+# Test per la riattivazione di una prenotazione annullata su un orario ormai occupato
+def test_reactivation_conflict(db):
+    cancelled = Booking(client_id=1, professional_id=5, service_id=1, date_time=at(10), duration=30, status="cancelled")
+    confirmed = Booking(client_id=2, professional_id=5, service_id=1, date_time=at(10, 15), duration=30, status="confirmed")
+    db.add_all([cancelled, confirmed])
+    db.commit()
+    availability_index.invalidate(5)
+
+    service = IntegratedBookingService(db)
+    with pytest.raises(SlotUnavailable):
+        asyncio.run(service.update_booking_status(cancelled.id, "confirmed", 1))
+    assert db.query(Booking).filter(Booking.id == cancelled.id).one().status == "cancelled"
+
+# Test per i primi slot liberi tra più professionisti
+def test_earliest_slots_merge():
+    calendars = [
+        make_calendar(2, [(at(9), at(9, 30), 20)]),
+        make_calendar(1, [(at(9), at(10), 10)]),
+        make_calendar(3, [(at(9), at(13), 30)]),
+    ]
+    slots = earliest_slots(calendars, at(9), at(18), 30, 4)
+    assert slots == [
+        (at(9, 30), at(10), 2),
+        (at(9, 45), at(10, 15), 2),
+        (at(10), at(10, 30), 1),
+        (at(10), at(10, 30), 2),
+    ]
+
+    # Lo stesso risultato dell'ordinamento completo degli slot di tutti i calendari
+    everything = sorted(
+        (slot_start, slot_end, item.professional_id)
+        for item in calendars
+        for slot_start, slot_end in item.free_slots(at(9), at(18), 30, 1000)
+    )
+    assert earliest_slots(calendars, at(9), at(18), 30, 25) == everything[:25]
+
+# Test per il limite di slot per professionista
+def test_earliest_slots_per_professional():
+    calendars = [make_calendar(1, [(at(9), at(10), 10)]), make_calendar(2, []), make_calendar(3, [(at(9), at(13), 30)])]
+    slots = earliest_slots(calendars, at(9), at(18), 60, 10, per_professional=2)
+    assert slots == [
+        (at(9), at(10), 2),
+        (at(9, 15), at(10, 15), 2),
+        (at(10), at(11), 1),
+        (at(10, 15), at(11, 15), 1),
+        (at(14), at(15), 3),
+        (at(14, 15), at(15, 15), 3),
+    ]
+    assert earliest_slots(calendars, at(9), at(18), 60, 3, per_professional=2) == slots[:3]
+
+def read_all_pages(service, user_id, order, limit, status=None):
+    ids, cursor = [], None
+    while True:
+        page, cursor = asyncio.run(service.get_user_bookings(
+            user_id, status=status, limit=limit, cursor=cursor, order=order
+        ))
+        assert len(page) <= limit
+        ids.extend(item["id"] for item in page)
+        if cursor is None:
+            return ids
+
+# Test per la paginazione keyset delle prenotazioni di un utente
+def test_user_bookings_keyset_pagination(db):
+    # Nomi già in cache: l'arricchimento non interroga gli altri servizi
+    for user_id in (7, 8, 9):
+        user_lookup.cache.set(user_id, {"id": user_id, "name": f"Utente {user_id}"})
+    service_lookup.cache.set(1, {"id": 1, "name": "Visita", "duration": 30})
+
+    bookings = []
+    for i in range(13):
+        # Diverse prenotazioni con la stessa data: l'ordine è deciso dall'id
+        date_time = at(9) + timedelta(days=i // 3)
+        if i % 2:
+            bookings.append(Booking(client_id=7, professional_id=8, service_id=1, date_time=date_time, status="confirmed"))
+        else:
+            bookings.append(Booking(client_id=9, professional_id=7, service_id=1, date_time=date_time, status="pending"))
+        # Prenotazioni di altri utenti, che non devono comparire
+        bookings.append(Booking(client_id=9, professional_id=8, service_id=1, date_time=date_time, status="confirmed"))
+    db.add_all(bookings)
+    db.commit()
+
+    own = sorted((b for b in bookings if 7 in (b.client_id, b.professional_id)), key=lambda b: (b.date_time, b.id))
+    expected = [b.id for b in own]
+    service = IntegratedBookingService(db)
+
+    for limit in (1, 4, 13, 50):
+        assert read_all_pages(service, 7, "asc", limit) == expected
+        assert read_all_pages(service, 7, "desc", limit) == expected[::-1]
+
+    confirmed = [b.id for b in own if b.status == "confirmed"]
+    assert read_all_pages(service, 7, "asc", 2, status="confirmed") == confirmed
+    assert read_all_pages(service, 7, "desc", 2, status="confirmed") == confirmed[::-1]
+
+    page, _ = asyncio.run(service.get_user_bookings(7, limit=1, order="asc"))
+    assert page[0]["client_name"] == "Utente 9"
+    assert page[0]["professional_name"] == "Utente 7"
+    assert page[0]["service_name"] == "Visita"
+    assert not page[0]["is_client"]
+
+# Test per l'aggiornamento di un database creato prima delle nuove colonne
+def test_upgrade_schema_adds_missing_columns():
+    old_engine = create_engine("sqlite:///:memory:", poolclass=StaticPool)
+    with old_engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE bookings (id INTEGER NOT NULL, client_id INTEGER NOT NULL, "
+            "professional_id INTEGER NOT NULL, service_id INTEGER NOT NULL, date_time DATETIME NOT NULL, "
+            "status VARCHAR, payment_intent_id VARCHAR, payment_status VARCHAR, amount INTEGER, PRIMARY KEY (id))"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO bookings (id, client_id, professional_id, service_id, date_time, status) "
+            "VALUES (1, 1, 2, 3, '2030-01-07 10:00:00', 'confirmed')"
+        )
+
+    upgrade_schema(Base.metadata, old_engine)
+    # Una seconda esecuzione, come a ogni riavvio, non modifica nulla
+    upgrade_schema(Base.metadata, old_engine)
+
+    inspector = inspect(old_engine)
+    columns = {column["name"] for column in inspector.get_columns("bookings")}
+    assert {"duration", "idempotency_key", "created_at"} <= columns
+    indexes = {index["name"] for index in inspector.get_indexes("bookings")}
+    assert {"ix_bookings_client_date", "ix_bookings_idempotency_key"} <= indexes
+
+    db = sessionmaker(bind=old_engine)()
+    booking = db.query(Booking).one()
+    assert booking.duration is None and booking.status == "confirmed"
+    db.close()
+
+# Test per il lookup in blocco: ripiego sulle richieste singole, pausa e nuovo tentativo
+def test_entity_lookup_bulk_fallback_and_retry(monkeypatch):
+    requests = []
+    state = {"bulk": 404}
+
+    def handler(request):
+        requests.append((request.method, request.url.path))
+        if request.url.path.endswith("/lookup"):
+            if state["bulk"] != 200:
+                return httpx.Response(state["bulk"])
+            ids = httpx.Response(200, content=request.content).json()["ids"]
+            return httpx.Response(200, json=[{"id": entity_id, "name": f"Utente {entity_id}"} for entity_id in ids])
+        entity_id = int(request.url.path.rsplit("/", 1)[1])
+        if entity_id == 3:
+            return httpx.Response(404)
+        return httpx.Response(200, json={"id": entity_id, "name": f"Utente {entity_id}", "email": "x@example.com"})
+
+    monkeypatch.setattr(entity_lookup, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(entity_lookup, "ENTITY_LOOKUP_BATCH_SIZE", 2)
+    lookup = EntityLookup("http://users/api/v1/users", fields=["id", "name"], cache=TTLCache())
+
+    async def scenario():
+        # Endpoint di lookup assente: si ripiega sulle GET singole, gli id non trovati sono esclusi
+        found = await lookup.get_many([1, 2, 3, 1, None])
+        assert found == {1: {"id": 1, "name": "Utente 1"}, 2: {"id": 2, "name": "Utente 2"}}
+        assert requests[0] == ("POST", "/api/v1/users/lookup")
+        assert sorted(requests[1:]) == [("GET", "/api/v1/users/1"), ("GET", "/api/v1/users/2"), ("GET", "/api/v1/users/3")]
+
+        # Durante la pausa il lookup in blocco non viene ritentato; gli id in cache non generano richieste
+        requests.clear()
+        state["bulk"] = 200
+        assert set(await lookup.get_many([1, 4])) == {1, 4}
+        assert requests == [("GET", "/api/v1/users/4")]
+
+        # Trascorsa la pausa si torna al lookup in blocco, a blocchi di ENTITY_LOOKUP_BATCH_SIZE id
+        lookup._bulk_unavailable_at -= entity_lookup.ENTITY_LOOKUP_BULK_RETRY
+        requests.clear()
+        assert set(await lookup.get_many([5, 6, 7])) == {5, 6, 7}
+        assert requests == [("POST", "/api/v1/users/lookup")] * 2
+        assert lookup._bulk_unavailable_at is None
+
+        # Un errore del servizio non attiva il ripiego: gli id restano semplicemente assenti
+        requests.clear()
+        state["bulk"] = 500
+        assert await lookup.get_many([8]) == {}
+        assert requests == [("POST", "/api/v1/users/lookup")]
+        assert lookup._bulk_unavailable_at is None
+
+        await entity_lookup.close_http_client()
+
+    asyncio.run(scenario())
@@ -3,14 +3,23 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..db.session import get_db
 from ..services import catalog_service
+from .lookup_response import lookup_response, parse_csv
 from ..models.service_model import (
     ServiceCreate, ServiceUpdate, ServiceResponse,
     CategoryCreate, CategoryResponse,
-    SpecialtyCreate, SpecialtyResponse
+    SpecialtyCreate, SpecialtyResponse,
+    ServiceLookup
 )
 
 router = APIRouter()
 
+def _lookup_services(db: Session, ids: List[int], fields: Optional[List[str]]):
+    try:
+        ids, fields = catalog_service.prepare_services_lookup(ids, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return lookup_response(db, catalog_service.iter_services_by_ids(db, ids, fields), len(ids))
+
 # SERVICES ENDPOINTS
 @router.post("/services/", response_model=ServiceResponse)
 def create_service(service: ServiceCreate, db: Session = Depends(get_db)):
@@ -23,12 +32,25 @@ def get_services(
     limit: int = 100,
     specialty: Optional[str] = None,
     category: Optional[str] = None,
+    ids: Optional[str] = Query(None, description="Id separati da virgola da risolvere in blocco"),
+    fields: Optional[str] = Query(None, description="Colonne da restituire con ids, separate da virgola"),
     db: Session = Depends(get_db)
 ):
-    """Recupera l'elenco dei servizi con filtri opzionali."""
+    """Recupera l'elenco dei servizi con filtri opzionali, oppure i servizi con gli id indicati in `ids`."""
+    if ids is not None:
+        try:
+            service_ids = [int(service_id) for service_id in parse_csv(ids)]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Il parametro ids deve contenere interi separati da virgola")
+        return _lookup_services(db, service_ids, parse_csv(fields) or None)
     services = catalog_service.get_services(db, skip, limit, specialty, category)
     return services
 
+@router.post("/services/lookup")
+def lookup_services(lookup: ServiceLookup, db: Session = Depends(get_db)):
+    """Recupera in blocco i servizi con gli id indicati, limitandosi ai campi richiesti."""
+    return _lookup_services(db, lookup.ids, lookup.fields)
+
 @router.get("/services/{service_id}", response_model=ServiceResponse)
 def get_service(service_id: int, db: Session = Depends(get_db)):
     """Recupera un servizio specifico."""
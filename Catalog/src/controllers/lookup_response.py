@@ -0,0 +1,41 @@
+# Catalog/src/controllers/lookup_response.py
+# Risposte degli endpoint di lookup in blocco: parsing dei parametri e invio delle righe a blocchi
+
+import json
+from typing import Any, Dict, Iterator, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.orm import Session
+
+# Oltre questo numero di id la risposta di lookup viene inviata a blocchi
+LOOKUP_STREAM_THRESHOLD = 100
+
+
+def parse_csv(value: Optional[str]) -> List[str]:
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+def lookup_response(db: Session, chunks: Iterator[List[Dict[str, Any]]], count: int):
+    """Restituisce le righe come array JSON.
+
+    Con più di LOOKUP_STREAM_THRESHOLD id la risposta è in streaming: ogni blocco di righe viene
+    letto dal database solo quando il precedente è stato inviato. La sessione viene chiusa alla
+    fine dello streaming, dato che può terminare dopo la chiusura della dipendenza get_db.
+    """
+    if count <= LOOKUP_STREAM_THRESHOLD:
+        return JSONResponse(jsonable_encoder([row for chunk in chunks for row in chunk]))
+
+    def body():
+        try:
+            yield "["
+            separator = ""
+            for chunk in chunks:
+                if chunk:
+                    yield separator + ",".join(json.dumps(jsonable_encoder(row)) for row in chunk)
+                    separator = ","
+            yield "]"
+        finally:
+            db.close()
+
+    return StreamingResponse(body(), media_type="application/json")
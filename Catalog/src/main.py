@@ -1,6 +1,8 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from healthmatch_common.tracing import setup_tracing
 from .routes.catalog_routes import router as catalog_router
+from .middleware.etag_middleware import ETagMiddleware
 from .db.session import engine
 from .models.service_model import Base
 
@@ -20,6 +22,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ETag sulle risposte GET, per la revalidazione condizionale da parte del gateway
+app.add_middleware(ETagMiddleware)
+
+# Tracing distribuito (traceparent W3C) su richieste e query del database
+setup_tracing(app, "catalog", engine)
+
 # Registrazione del router principale
 app.include_router(catalog_router)
 
@@ -0,0 +1,34 @@
+# Catalog/src/middleware/etag_middleware.py
+# Aggiunge l'ETag alle risposte GET e risponde 304 quando il client ha già la versione corrente
+
+import hashlib
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+class ETagMiddleware(BaseHTTPMiddleware):
+    """Calcola un ETag debole sul corpo delle risposte GET andate a buon fine e di lunghezza nota."""
+
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        if request.method != "GET" or response.status_code != 200:
+            return response
+        # Le risposte in streaming (senza Content-Length, es. i lookup in blocco) non vengono
+        # raccolte in memoria per calcolarne l'hash: restano senza ETag
+        if "content-length" not in response.headers:
+            return response
+
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+        headers = dict(response.headers)
+        headers["etag"] = etag
+
+        if _etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers={"etag": etag})
+        return Response(content=body, status_code=200, headers=headers, media_type=response.media_type)
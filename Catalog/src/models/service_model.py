@@ -126,4 +126,9 @@ class SpecialtyResponse(SpecialtyBase):
     id: int
     
     class Config:
-        from_attributes = True  # Aggiornato da orm_mode = True
\ No newline at end of file
+        from_attributes = True  # Aggiornato da orm_mode = True
+
+class ServiceLookup(BaseModel):
+    """Richiesta di lookup in blocco: id da risolvere e, opzionalmente, le sole colonne da restituire."""
+    ids: List[int]
+    fields: Optional[List[str]] = None
@@ -1,6 +1,7 @@
+import os
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator, Tuple
 
 from ..models.service_model import (
     Service, Category, Specialty, Professional,
@@ -182,4 +183,40 @@ def remove_service_from_professional(db: Session, professional_id: int, service_
     
     professional.services.remove(service)
     db.commit()
-    return True
\ No newline at end of file
+    return True
+
+# LOOKUP IN BLOCCO
+# Numero massimo di id risolvibili con una sola richiesta
+LOOKUP_MAX_IDS = int(os.getenv("LOOKUP_MAX_IDS", "500"))
+LOOKUP_FIELDS = tuple(column.key for column in Service.__table__.columns)
+# Numero di id risolti con ciascuna query
+LOOKUP_CHUNK_SIZE = int(os.getenv("LOOKUP_CHUNK_SIZE", "100"))
+
+def prepare_services_lookup(ids: List[int], fields: Optional[List[str]] = None) -> Tuple[List[int], List[str]]:
+    """Valida un lookup in blocco e restituisce gli id senza duplicati e le colonne da leggere.
+
+    L'id è sempre incluso tra le colonne. Solleva ValueError se gli id sono troppi o se viene
+    richiesta una colonna sconosciuta.
+    """
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > LOOKUP_MAX_IDS:
+        raise ValueError(f"Troppi id: al massimo {LOOKUP_MAX_IDS} per richiesta")
+    fields = list(dict.fromkeys(["id"] + list(fields or LOOKUP_FIELDS)))
+    unknown = [field for field in fields if field not in LOOKUP_FIELDS]
+    if unknown:
+        raise ValueError(f"Campi non validi: {', '.join(unknown)}")
+    return ids, fields
+
+def iter_services_by_ids(db: Session, ids: List[int], fields: List[str]) -> Iterator[List[Dict[str, Any]]]:
+    """Servizi con gli id indicati, a blocchi di LOOKUP_CHUNK_SIZE: ogni blocco è una query IN
+    eseguita solo quando viene richiesto, così le righe non vengono caricate tutte insieme.
+    Gli id inesistenti vengono ignorati."""
+    columns = [getattr(Service, field) for field in fields]
+    for start in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+        rows = db.query(*columns).filter(Service.id.in_(ids[start:start + LOOKUP_CHUNK_SIZE])).all()
+        yield [dict(zip(fields, row)) for row in rows]
+
+def get_services_by_ids(db: Session, ids: List[int], fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Come iter_services_by_ids, con la validazione di prepare_services_lookup, in un'unica lista."""
+    ids, fields = prepare_services_lookup(ids, fields)
+    return [row for chunk in iter_services_by_ids(db, ids, fields) for row in chunk]
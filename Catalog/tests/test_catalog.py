@@ -7,6 +7,7 @@ from sqlalchemy.pool import StaticPool
 from src.main import app
 from src.db.session import get_db
 from src.models.service_model import Base, Service, Category, Specialty
+from src.services import catalog_service
 
 # Configurazione del database di test
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -139,4 +140,78 @@ def test_get_specialties():
     assert response.status_code == 200
     data = response.json()
     assert len(data) > 0
-    assert any(spec["name"] == "Specialità Test" for spec in data)
\ No newline at end of file
+    assert any(spec["name"] == "Specialità Test" for spec in data)
+
+# Test per la revalidazione condizionale tramite ETag
+def test_get_categories_etag():
+    response = client.get("/api/v1/categories/")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    
+    response = client.get("/api/v1/categories/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+# Funzione di supporto per creare servizi direttamente nel database di test
+def create_services(count):
+    db = TestingSessionLocal()
+    services = [
+        Service(name=f"Servizio Lookup {i}", duration=30, base_price=50.0 + i)
+        for i in range(count)
+    ]
+    db.add_all(services)
+    db.commit()
+    service_ids = [service.id for service in services]
+    db.close()
+    return service_ids
+
+# Test per il lookup in blocco con proiezione dei campi
+def test_lookup_services():
+    service_ids = create_services(3)
+    response = client.post(
+        "/api/v1/services/lookup",
+        json={"ids": service_ids + [999999], "fields": ["name"]},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert sorted(item["id"] for item in data) == sorted(service_ids)
+    assert all(set(item) == {"id", "name"} for item in data)
+
+# Test per il lookup in blocco tramite query string
+def test_get_services_by_ids():
+    service_ids = create_services(2)
+    ids = ",".join(str(service_id) for service_id in service_ids)
+    response = client.get(f"/api/v1/services/?ids={ids}&fields=name,base_price")
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 2
+    assert all(set(item) == {"id", "name", "base_price"} for item in data)
+
+# Test per le risposte di lookup di grandi dimensioni, inviate in streaming
+def test_lookup_services_streaming():
+    service_ids = create_services(150)
+    response = client.post("/api/v1/services/lookup", json={"ids": service_ids, "fields": ["name"]})
+    assert response.status_code == 200
+    assert "content-length" not in response.headers
+    assert len(response.json()) == 150
+
+# Test per i campi non validi nel lookup in blocco
+def test_lookup_services_invalid_field():
+    response = client.post("/api/v1/services/lookup", json={"ids": [1], "fields": ["password"]})
+    assert response.status_code == 400
+
+# Test per il lookup in streaming tramite query string: nessun ETag, righe lette a blocchi
+def test_get_services_by_ids_streaming():
+    service_ids = create_services(150)
+    ids = ",".join(str(service_id) for service_id in service_ids)
+    response = client.get(f"/api/v1/services/?ids={ids}&fields=name")
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+    assert "content-length" not in response.headers
+    assert sorted(item["id"] for item in response.json()) == sorted(service_ids)
+
+    db = TestingSessionLocal()
+    chunks = catalog_service.iter_services_by_ids(db, service_ids, ["id"])
+    assert len(next(chunks)) == catalog_service.LOOKUP_CHUNK_SIZE
+    assert len(next(chunks)) == 150 - catalog_service.LOOKUP_CHUNK_SIZE
+    db.close()
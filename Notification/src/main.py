@@ -1,5 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from healthmatch_common.tracing import setup_tracing
 from .routes.notification_routes import router as notification_router
 from .models.notification_model import Base, engine
 
@@ -19,6 +20,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Tracing distribuito (traceparent W3C) su richieste e query del database
+setup_tracing(app, "notification", engine)
+
 # Creazione delle tabelle nel database
 Base.metadata.create_all(bind=engine)
 
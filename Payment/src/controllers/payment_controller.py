@@ -1,9 +1,9 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Depends, Header, Request
 from stripe.error import StripeError
 import stripe
 from pydantic import BaseModel
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 router = APIRouter()
 
@@ -19,8 +19,12 @@ class PaymentIntentRequest(BaseModel):
     payment_method_id: str = None
 
 @router.post("/stripe/create-payment-intent", response_model=Dict[str, Any])
-async def create_payment_intent(payment_data: PaymentIntentRequest):
-    """Crea un intent di pagamento con Stripe."""
+async def create_payment_intent(
+    payment_data: PaymentIntentRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """Crea un intent di pagamento con Stripe.
+    Con l'header Idempotency-Key, Stripe restituisce lo stesso intent a una richiesta ripetuta."""
     try:
         payment_intent = stripe.PaymentIntent.create(
             amount=payment_data.amount * 100,  # Stripe usa i centesimi
@@ -32,6 +36,7 @@ async def create_payment_intent(payment_data: PaymentIntentRequest):
             },
             payment_method_types=["card"],
             payment_method=payment_data.payment_method_id if payment_data.payment_method_id else None,
+            idempotency_key=idempotency_key,
         )
         
         return {
@@ -42,6 +47,18 @@ async def create_payment_intent(payment_data: PaymentIntentRequest):
     except StripeError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/stripe/payment-intents/{payment_intent_id}/cancel", response_model=Dict[str, Any])
+async def cancel_payment_intent(payment_intent_id: str):
+    """Annulla un intent di pagamento non ancora completato."""
+    try:
+        payment_intent = stripe.PaymentIntent.cancel(payment_intent_id)
+        return {
+            "id": payment_intent.id,
+            "status": payment_intent.status
+        }
+    except StripeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.post("/stripe/webhook", status_code=200)
 async def stripe_webhook(request: Request):
     payload = await request.body()
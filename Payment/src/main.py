@@ -1,8 +1,12 @@
 from fastapi import FastAPI
+from healthmatch_common.tracing import setup_tracing
 from src.routes.payment_routes import router as payment_router
 
 app = FastAPI(title="HealthMatch Payment Service")
 
+# Tracing distribuito (traceparent W3C) sulle richieste
+setup_tracing(app, "payment")
+
 # Registra il router
 app.include_router(payment_router)
 
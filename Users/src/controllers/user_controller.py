@@ -12,12 +12,21 @@ from ..models.user_model import (
     ProfessionalInDB,
     SpecialtyCreate,
     SpecialtyUpdate,
-    SpecialtyInDB
+    SpecialtyInDB,
+    UserLookup
 )
 from ..services import user_service
+from .lookup_response import lookup_response, parse_csv
 
 router = APIRouter()
 
+def _lookup_users(db: Session, ids: List[int], fields: Optional[List[str]]):
+    try:
+        ids, fields = user_service.prepare_users_lookup(ids, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return lookup_response(db, user_service.iter_users_by_ids(db, ids, fields), len(ids))
+
 # Users endpoints
 @router.post("/users/", response_model=UserInDB)
 def create_user(user: UserCreate, db: Session = Depends(get_db)):
@@ -40,12 +49,25 @@ def read_users(
     skip: int = 0, 
     limit: int = 100, 
     user_type: Optional[str] = None,
+    ids: Optional[str] = Query(None, description="Id separati da virgola da risolvere in blocco"),
+    fields: Optional[str] = Query(None, description="Colonne da restituire con ids, separate da virgola"),
     db: Session = Depends(get_db)
 ):
-    """Recupera l'elenco degli utenti."""
+    """Recupera l'elenco degli utenti, oppure gli utenti con gli id indicati in `ids`."""
+    if ids is not None:
+        try:
+            user_ids = [int(user_id) for user_id in parse_csv(ids)]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Il parametro ids deve contenere interi separati da virgola")
+        return _lookup_users(db, user_ids, parse_csv(fields) or None)
     users = user_service.get_users(db, skip=skip, limit=limit, user_type=user_type)
     return users
 
+@router.post("/users/lookup")
+def lookup_users(lookup: UserLookup, db: Session = Depends(get_db)):
+    """Recupera in blocco gli utenti con gli id indicati, limitandosi ai campi richiesti."""
+    return _lookup_users(db, lookup.ids, lookup.fields)
+
 @router.get("/users/{user_id}", response_model=UserInDB)
 def read_user(user_id: int, db: Session = Depends(get_db)):
     """Recupera un utente specifico."""
@@ -1,5 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from healthmatch_common.tracing import setup_tracing
 from .routes.user_routes import router as user_router
 from .models.user_model import Base
 from .db.session import engine
@@ -21,6 +22,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Tracing distribuito (traceparent W3C) su richieste e query del database
+setup_tracing(app, "users", engine)
+
 # Registrazione del router principale
 app.include_router(user_router)
 
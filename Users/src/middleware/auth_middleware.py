@@ -0,0 +1,24 @@
+# Users/src/middleware/auth_middleware.py
+# Autenticazione delle richieste con verifica locale dei JWT emessi dal servizio Auth
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+
+from healthmatch_common.token_verifier import TokenError, token_verifier
+
+# Classe per la gestione del token di autenticazione
+security = HTTPBearer()
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """
+    Verifica il token JWT con le chiavi pubbliche di Auth e restituisce i claim dell'utente.
+    Da utilizzare con Depends() per proteggere le route che richiedono autenticazione.
+    """
+    try:
+        return await token_verifier.verify(credentials.credentials)
+    except TokenError:
+        raise HTTPException(
+            status_code=401,
+            detail="Token di autenticazione non valido o scaduto",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
@@ -129,4 +129,9 @@ class ProfessionalInDB(UserInDB):
     specialties: List[SpecialtyInDB] = []
     
     class Config:
-        from_attributes = True  # Aggiornato da orm_mode = True
\ No newline at end of file
+        from_attributes = True  # Aggiornato da orm_mode = True
+
+class UserLookup(BaseModel):
+    """Richiesta di lookup in blocco: id da risolvere e, opzionalmente, le sole colonne da restituire."""
+    ids: List[int]
+    fields: Optional[List[str]] = None
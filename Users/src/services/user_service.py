@@ -9,9 +9,11 @@ from datetime import datetime, timedelta
 from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Table
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, Session
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from pydantic import BaseModel
 
+from ..models.user_model import User
+
 # Configurazione logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -563,4 +565,43 @@ class HealthRecordsService:
 
 # Funzione factory per creare un'istanza del servizio
 def get_health_records_service(db: Session) -> HealthRecordsService:
-    return HealthRecordsService(db)
\ No newline at end of file
+    return HealthRecordsService(db)
+
+# Lookup in blocco degli utenti, usato dagli altri servizi per risolvere molti id con poche query IN
+# Numero massimo di id risolvibili con una sola richiesta
+LOOKUP_MAX_IDS = int(os.getenv("LOOKUP_MAX_IDS", "500"))
+LOOKUP_FIELDS = tuple(column.key for column in User.__table__.columns)
+# Numero di id risolti con ciascuna query
+LOOKUP_CHUNK_SIZE = int(os.getenv("LOOKUP_CHUNK_SIZE", "100"))
+
+
+def prepare_users_lookup(ids: List[int], fields: Optional[List[str]] = None) -> Tuple[List[int], List[str]]:
+    """Valida un lookup in blocco e restituisce gli id senza duplicati e le colonne da leggere.
+
+    L'id è sempre incluso tra le colonne. Solleva ValueError se gli id sono troppi o se viene
+    richiesta una colonna sconosciuta.
+    """
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > LOOKUP_MAX_IDS:
+        raise ValueError(f"Troppi id: al massimo {LOOKUP_MAX_IDS} per richiesta")
+    fields = list(dict.fromkeys(["id"] + list(fields or LOOKUP_FIELDS)))
+    unknown = [field for field in fields if field not in LOOKUP_FIELDS]
+    if unknown:
+        raise ValueError(f"Campi non validi: {', '.join(unknown)}")
+    return ids, fields
+
+
+def iter_users_by_ids(db: Session, ids: List[int], fields: List[str]) -> Iterator[List[Dict[str, Any]]]:
+    """Utenti con gli id indicati, a blocchi di LOOKUP_CHUNK_SIZE: ogni blocco è una query IN
+    eseguita solo quando viene richiesto, così le righe non vengono caricate tutte insieme.
+    Gli id inesistenti vengono ignorati."""
+    columns = [getattr(User, field) for field in fields]
+    for start in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+        rows = db.query(*columns).filter(User.id.in_(ids[start:start + LOOKUP_CHUNK_SIZE])).all()
+        yield [dict(zip(fields, row)) for row in rows]
+
+
+def get_users_by_ids(db: Session, ids: List[int], fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Come iter_users_by_ids, con la validazione di prepare_users_lookup, in un'unica lista."""
+    ids, fields = prepare_users_lookup(ids, fields)
+    return [row for chunk in iter_users_by_ids(db, ids, fields) for row in chunk]
@@ -7,6 +7,7 @@ from sqlalchemy.pool import StaticPool
 from src.main import app
 from src.db.session import get_db
 from src.models.user_model import Base, User, Specialty
+from src.services import user_service
 
 # Configurazione del database di test
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -202,4 +203,68 @@ def test_delete_user(init_test_data):
     
     # Verifichiamo che l'utente sia stato effettivamente eliminato
     response = client.get(f"/api/v1/users/{user_id}")
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+# Funzione di supporto per creare utenti direttamente nel database di test
+def create_users(count, prefix):
+    db = TestingSessionLocal()
+    users = [
+        User(email=f"{prefix}{i}@example.com", name=f"Lookup{i}", surname="User", user_type="client")
+        for i in range(count)
+    ]
+    db.add_all(users)
+    db.commit()
+    user_ids = [user.id for user in users]
+    db.close()
+    return user_ids
+
+# Test per il lookup in blocco con proiezione dei campi
+def test_lookup_users():
+    user_ids = create_users(3, "lookup")
+    response = client.post(
+        "/api/v1/users/lookup",
+        json={"ids": user_ids + [999999], "fields": ["name", "surname"]},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert sorted(item["id"] for item in data) == sorted(user_ids)
+    assert all(set(item) == {"id", "name", "surname"} for item in data)
+
+# Test per il lookup in blocco tramite query string
+def test_read_users_by_ids():
+    user_ids = create_users(2, "byids")
+    ids = ",".join(str(user_id) for user_id in user_ids)
+    response = client.get(f"/api/v1/users/?ids={ids}&fields=name")
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 2
+    assert all(set(item) == {"id", "name"} for item in data)
+
+# Test per le risposte di lookup di grandi dimensioni, inviate in streaming
+def test_lookup_users_streaming():
+    user_ids = create_users(150, "stream")
+    response = client.post("/api/v1/users/lookup", json={"ids": user_ids})
+    assert response.status_code == 200
+    assert "content-length" not in response.headers
+    data = response.json()
+    assert len(data) == 150
+    assert "created_at" in data[0]
+
+# Test per i parametri non validi nel lookup in blocco
+def test_lookup_users_invalid_request():
+    response = client.post("/api/v1/users/lookup", json={"ids": [1], "fields": ["unknown"]})
+    assert response.status_code == 400
+    response = client.get("/api/v1/users/?ids=1,abc")
+    assert response.status_code == 400
+
+# Test per la lettura a blocchi del lookup in blocco
+def test_iter_users_by_ids_chunks():
+    user_ids = create_users(150, "chunk")
+    db = TestingSessionLocal()
+    ids, fields = user_service.prepare_users_lookup(user_ids + user_ids[:5], ["name"])
+    assert ids == user_ids
+    assert fields == ["id", "name"]
+    chunks = list(user_service.iter_users_by_ids(db, ids, fields))
+    db.close()
+    assert [len(chunk) for chunk in chunks] == [100, 50]
+    assert sorted(row["id"] for chunk in chunks for row in chunk) == sorted(user_ids)
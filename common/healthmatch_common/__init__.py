@@ -0,0 +1,3 @@
+# common/healthmatch_common/__init__.py
+# Moduli condivisi dai microservizi, installati in ogni immagine Docker da common/
+# (in locale: pip install -e common)
@@ -0,0 +1,213 @@
+# common/healthmatch_common/token_verifier.py
+# Verifica locale dei JWT firmati dal servizio Auth (RS256 o EdDSA) con le chiavi pubbliche
+# pubblicate su /.well-known/jwks.json: nessuna chiamata ad Auth per token e nessun segreto condiviso.
+#
+# Configurazione tramite variabili d'ambiente:
+#   JWKS_URL                   endpoint JWKS di Auth (default http://auth-service:8001/.well-known/jwks.json)
+#   JWT_ALGORITHMS             algoritmi accettati (default RS256,EdDSA)
+#   JWKS_CACHE_TTL             secondi dopo i quali le chiavi vengono riscaricate (default 300)
+#   JWKS_MIN_REFRESH_INTERVAL  intervallo minimo tra due download (default 10), anche con kid sconosciuti
+#   JWT_REVOCATIONS_URL        elenco incrementale dei token revocati
+#                              (default http://auth-service:8001/api/v1/auth/revocations)
+#   JWT_REVOCATION_SYNC_INTERVAL  secondi tra due sincronizzazioni delle revoche (default 5, 0 le disattiva)
+# Se Auth non risponde si continuano a usare le ultime chiavi e revoche scaricate.
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, Optional
+
+import httpx
+import jwt
+
+from .tracing import TracedTransport
+
+logger = logging.getLogger(__name__)
+
+JWKS_URL = os.getenv("JWKS_URL", "http://auth-service:8001/.well-known/jwks.json")
+JWT_ALGORITHMS = [alg.strip() for alg in os.getenv("JWT_ALGORITHMS", "RS256,EdDSA").split(",") if alg.strip()]
+JWKS_CACHE_TTL = float(os.getenv("JWKS_CACHE_TTL", "300"))
+JWKS_MIN_REFRESH_INTERVAL = float(os.getenv("JWKS_MIN_REFRESH_INTERVAL", "10"))
+JWT_REVOCATIONS_URL = os.getenv("JWT_REVOCATIONS_URL", "http://auth-service:8001/api/v1/auth/revocations")
+JWT_REVOCATION_SYNC_INTERVAL = float(os.getenv("JWT_REVOCATION_SYNC_INTERVAL", "5"))
+
+
+class TokenError(Exception):
+    """Token non valido, scaduto, revocato o firmato con una chiave sconosciuta."""
+
+
+class TokenVerifier:
+    """Verifica firma e scadenza dei token con le chiavi JWKS, tenute in cache per `kid`.
+
+    Le chiavi vengono riscaricate alla scadenza della cache oppure quando arriva un token con
+    un kid sconosciuto (es. subito dopo una rotazione), al più una volta ogni
+    `min_refresh_interval` secondi. I jti revocati vengono tenuti in memoria fino alla scadenza
+    del token e aggiornati in modo incrementale ogni `revocation_sync_interval` secondi.
+    """
+
+    def __init__(
+        self,
+        jwks_url: str = JWKS_URL,
+        algorithms: Iterable[str] = JWT_ALGORITHMS,
+        cache_ttl: float = JWKS_CACHE_TTL,
+        min_refresh_interval: float = JWKS_MIN_REFRESH_INTERVAL,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        timeout: float = 5.0,
+        revocations_url: str = JWT_REVOCATIONS_URL,
+        revocation_sync_interval: float = JWT_REVOCATION_SYNC_INTERVAL,
+    ):
+        self.jwks_url = jwks_url
+        self.algorithms = set(algorithms)
+        self.cache_ttl = cache_ttl
+        self.min_refresh_interval = min_refresh_interval
+        # Trasporto alternativo per le chiamate a JWKS_URL (es. servizi simulati nei test)
+        self.transport = transport
+        self.timeout = timeout
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._fetched_at: Optional[float] = None
+        self._last_attempt: Optional[float] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self.revocations_url = revocations_url
+        self.revocation_sync_interval = revocation_sync_interval
+        # jti revocato -> scadenza del token (epoch)
+        self._revoked: Dict[str, float] = {}
+        self._revocations_seq = 0
+        self._revocations_synced_at: Optional[float] = None
+        self._revocations_syncing = False
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        """Verifica il token con le sole chiavi già in cache e ne restituisce i claim."""
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.PyJWTError:
+            raise TokenError("Token malformato")
+        key = self._keys.get(header.get("kid"))
+        if key is None:
+            raise TokenError("Chiave di firma sconosciuta")
+        if key.algorithm_name not in self.algorithms or header.get("alg") != key.algorithm_name:
+            raise TokenError("Algoritmo di firma non ammesso")
+        try:
+            claims = jwt.decode(
+                token,
+                key.key,
+                algorithms=[key.algorithm_name],
+                options={"require": ["exp", "sub"]},
+            )
+        except jwt.PyJWTError as exc:
+            raise TokenError(str(exc))
+        if self.is_revoked(claims):
+            raise TokenError("Token revocato")
+        return claims
+
+    def is_revoked(self, claims: Dict[str, Any]) -> bool:
+        """Controlla i claim di un token già verificato contro le revoche note."""
+        return claims.get("jti") in self._revoked
+
+    def mark_revoked(self, claims: Dict[str, Any]) -> None:
+        """Registra subito una revoca nota localmente, senza attendere la sincronizzazione."""
+        if claims.get("jti"):
+            self._revoked[claims["jti"]] = float(claims["exp"])
+
+    async def check_revoked(self, claims: Dict[str, Any]) -> None:
+        """Come is_revoked, ma aggiorna prima le revoche se è il momento; solleva TokenError se revocato."""
+        await self.sync_revocations()
+        if self.is_revoked(claims):
+            raise TokenError("Token revocato")
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """Verifica il token, scaricando le chiavi se la cache è scaduta o il kid è sconosciuto."""
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except jwt.PyJWTError:
+            raise TokenError("Token malformato")
+        if kid not in self._keys or self._is_stale():
+            await self.refresh(kid)
+        await self.sync_revocations()
+        return self.decode(token)
+
+    def _is_stale(self) -> bool:
+        return self._fetched_at is None or time.monotonic() - self._fetched_at >= self.cache_ttl
+
+    async def refresh(self, kid: Optional[str] = None) -> None:
+        """Scarica le chiavi da JWKS_URL; le richieste concorrenti attendono un solo download."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Un'altra richiesta potrebbe aver già aggiornato le chiavi mentre si attendeva il lock
+            if not self._is_stale() and (kid is None or kid in self._keys):
+                return
+            now = time.monotonic()
+            if self._last_attempt is not None and now - self._last_attempt < self.min_refresh_interval:
+                return
+            self._last_attempt = now
+
+            try:
+                response = await self._http_client().get(self.jwks_url)
+                response.raise_for_status()
+                jwks = response.json()
+            except (httpx.HTTPError, ValueError) as exc:
+                logger.warning("Download delle chiavi JWKS non riuscito: %s", exc)
+                return
+
+            keys = {}
+            for jwk in jwks.get("keys", []):
+                if jwk.get("use", "sig") != "sig" or not jwk.get("kid"):
+                    continue
+                try:
+                    keys[jwk["kid"]] = jwt.PyJWK(jwk)
+                except jwt.PyJWTError:
+                    # Tipo di chiave o algoritmo non supportato
+                    continue
+            self._keys = keys
+            self._fetched_at = now
+
+    def _http_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(transport=TracedTransport(self.transport), timeout=self.timeout)
+        return self._client
+
+    async def sync_revocations(self) -> None:
+        """Scarica le revoche successive all'ultima ricevuta; una sola richiesta alla volta se ne occupa,
+        le altre proseguono con l'elenco attuale."""
+        if self.revocation_sync_interval <= 0 or not self.revocations_url or self._revocations_syncing:
+            return
+        now = time.monotonic()
+        if self._revocations_synced_at is not None and now - self._revocations_synced_at < self.revocation_sync_interval:
+            return
+        self._revocations_syncing = True
+        # Aggiornato subito: se Auth non risponde si riprova solo al prossimo intervallo
+        self._revocations_synced_at = now
+        try:
+            while True:
+                response = await self._http_client().get(
+                    self.revocations_url, params={"since": self._revocations_seq}
+                )
+                response.raise_for_status()
+                page = response.json()
+                if page["last_seq"] < self._revocations_seq:
+                    # L'elenco di Auth è ripartito da capo (es. database ricreato): sincronizzazione completa
+                    self._revoked = {}
+                    self._revocations_seq = 0
+                    continue
+                for revocation in page["revocations"]:
+                    self._revoked[revocation["jti"]] = float(revocation["exp"])
+                    self._revocations_seq = max(self._revocations_seq, revocation["seq"])
+                if not page.get("more"):
+                    break
+        except (httpx.HTTPError, ValueError, KeyError, TypeError) as exc:
+            logger.warning("Sincronizzazione delle revoche non riuscita: %s", exc)
+        finally:
+            self._revocations_syncing = False
+        # Le revoche di token ormai scaduti non servono più
+        wall_now = time.time()
+        self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > wall_now}
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+token_verifier = TokenVerifier()
@@ -0,0 +1,342 @@
+# common/healthmatch_common/tracing.py
+# Propagazione del contesto W3C (header traceparent) e registrazione degli span della richiesta,
+# delle chiamate httpx in uscita e delle query SQLAlchemy.
+#
+# Configurazione tramite variabili d'ambiente:
+#   TRACE_EXPORTER        none (default), file oppure otlp
+#   TRACE_SAMPLE_RATIO    frazione delle nuove trace registrate (default 0.1); le richieste con
+#                         traceparent seguono la decisione del chiamante
+#   TRACE_FILE            file JSON lines per l'exporter file (default data/traces.jsonl)
+#   TRACE_OTLP_ENDPOINT   endpoint OTLP/HTTP JSON (default http://localhost:4318/v1/traces)
+# Con TRACE_EXPORTER=none il contesto viene comunque propagato, ma nessuno span viene registrato.
+
+import atexit
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import httpx
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+TRACE_SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", "0.1"))
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join("data", "traces.jsonl"))
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_EXPORT_INTERVAL = float(os.getenv("TRACE_EXPORT_INTERVAL", "5"))
+TRACE_MAX_QUEUE = int(os.getenv("TRACE_MAX_QUEUE", "2048"))
+
+# Tipi di span secondo OTLP
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+_processor: Optional["BatchSpanProcessor"] = None
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """Restituisce (trace_id, parent_id, sampled) da un header traceparent valido."""
+    match = _TRACEPARENT.match((value or "").strip().lower())
+    if match is None or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+class Span:
+    """Operazione misurata all'interno di una trace. Gli span non campionati servono solo alla propagazione."""
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "sampled",
+                 "attributes", "start_ns", "end_ns", "error", "_token")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool,
+                 kind: int = KIND_INTERNAL, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = dict(attributes or {}) if sampled else {}
+        self.start_ns = time.time_ns() if sampled else 0
+        self.end_ns = 0
+        self.error: Optional[str] = None
+        self._token = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if self.sampled:
+            self.attributes[key] = value
+
+    def set_error(self, message: str) -> None:
+        self.error = message
+
+    def end(self) -> None:
+        if not self.sampled or self.end_ns:
+            return
+        self.end_ns = time.time_ns()
+        if _processor is not None:
+            _processor.on_end(self)
+
+    def __enter__(self) -> "Span":
+        self._token = current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc is not None and self.error is None:
+            self.set_error(f"{exc_type.__name__}: {exc}")
+        current_span.reset(self._token)
+        self.end()
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def start_span(name: str, kind: int = KIND_INTERNAL, attributes: Optional[Dict[str, Any]] = None,
+               parent: Optional[Tuple[str, str, bool]] = None) -> Span:
+    """Crea uno span figlio del contesto indicato o, in mancanza, dello span corrente."""
+    if parent is None:
+        current = current_span.get()
+        if current is not None:
+            parent = (current.trace_id, current.span_id, current.sampled)
+    if parent is not None:
+        trace_id, parent_id, sampled = parent
+    else:
+        # Nuova trace: la decisione di campionamento viene presa qui e propagata ai servizi chiamati
+        trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+        sampled = _processor is not None and random.random() < TRACE_SAMPLE_RATIO
+    return Span(name, trace_id, parent_id, sampled and _processor is not None, kind, attributes)
+
+
+class SpanExporter:
+    """Interfaccia degli exporter: ricevono un documento OTLP JSON (resourceSpans) per ogni lotto di span."""
+
+    def export(self, payload: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class FileExporter(SpanExporter):
+    """Scrive ogni lotto di span come una riga JSON in formato OTLP, utilizzabile anche offline."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, payload: Dict[str, Any]) -> None:
+        with open(self.path, "a", encoding="utf-8") as trace_file:
+            trace_file.write(json.dumps(payload, separators=(",", ":")) + "\n")
+
+
+class OTLPHttpExporter(SpanExporter):
+    """Invia gli span a un collector OpenTelemetry tramite OTLP/HTTP con codifica JSON."""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self._client = httpx.Client(timeout=timeout)
+
+    def export(self, payload: Dict[str, Any]) -> None:
+        response = self._client.post(self.endpoint, json=payload)
+        response.raise_for_status()
+
+    def shutdown(self) -> None:
+        self._client.close()
+
+
+class BatchSpanProcessor:
+    """Accoda gli span terminati e li esporta a lotti da un thread separato, fuori dal percorso della richiesta.
+
+    La coda ha dimensione fissa: se l'exporter non tiene il passo, gli span più vecchi vengono scartati.
+    """
+
+    def __init__(self, exporter: SpanExporter, service_name: str,
+                 interval: float = 5.0, max_queue: int = 2048, max_batch: int = 512):
+        self.exporter = exporter
+        self.service_name = service_name
+        self.interval = interval
+        self.max_batch = max_batch
+        self._queue: Deque[Span] = deque(maxlen=max_queue)
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def on_end(self, span: Span) -> None:
+        self._queue.append(span)
+        if len(self._queue) >= self.max_batch:
+            self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        while self._queue:
+            batch: List[Span] = []
+            while self._queue and len(batch) < self.max_batch:
+                batch.append(self._queue.popleft())
+            try:
+                self.exporter.export(self._payload(batch))
+            except Exception:
+                logger.exception("Esportazione di %d span non riuscita", len(batch))
+
+    def _payload(self, spans: List[Span]) -> Dict[str, Any]:
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+            "scopeSpans": [{"scope": {"name": "healthmatch.tracing"}, "spans": [span.to_otlp() for span in spans]}],
+        }]}
+
+    def shutdown(self) -> None:
+        self._stopped = True
+        self._wakeup.set()
+        self._thread.join(timeout=self.interval)
+        self.flush()
+        self.exporter.shutdown()
+
+
+class TracingMiddleware:
+    """Middleware ASGI che apre uno span server per ogni richiesta, proseguendo la trace del chiamante."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        parent = parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+        span = start_span(f"{scope['method']} {scope['path']}", KIND_SERVER, parent=parent)
+        span.set_attribute("http.method", scope["method"])
+        span.set_attribute("http.target", scope["path"])
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    span.set_error(f"HTTP {message['status']}")
+            await send(message)
+
+        with span:
+            await self.app(scope, receive, send_wrapper)
+            route = scope.get("route")
+            if span.sampled and getattr(route, "path", None):
+                span.set_attribute("http.route", route.path)
+
+
+class TracedTransport(httpx.AsyncBaseTransport):
+    """Trasporto httpx che registra uno span client per ogni chiamata e propaga il traceparent."""
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.wrapped = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if current_span.get() is None:
+            return await self.wrapped.handle_async_request(request)
+
+        with start_span(f"HTTP {request.method}", KIND_CLIENT, {
+            "http.method": request.method,
+            "http.url": str(request.url.copy_with(query=None)),
+        }) as span:
+            request.headers["traceparent"] = span.traceparent
+            response = await self.wrapped.handle_async_request(request)
+            span.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                span.set_error(f"HTTP {response.status_code}")
+            return response
+
+    async def aclose(self) -> None:
+        await self.wrapped.aclose()
+
+
+def instrument_engine(engine) -> None:
+    """Registra uno span per ogni query eseguita sul motore SQLAlchemy, se la richiesta è campionata."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        current = current_span.get()
+        if current is None or not current.sampled:
+            return
+        span = start_span("db.query", KIND_CLIENT, {
+            "db.system": engine.dialect.name,
+            "db.statement": statement[:1000],
+        })
+        if context is not None:
+            context._tracing_span = span
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        span = getattr(context, "_tracing_span", None)
+        if span is not None:
+            span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        span = getattr(exception_context.execution_context, "_tracing_span", None)
+        if span is not None:
+            span.set_error(str(exception_context.original_exception))
+            span.end()
+
+
+def _create_exporter() -> Optional[SpanExporter]:
+    if TRACE_EXPORTER == "file":
+        return FileExporter(TRACE_FILE)
+    if TRACE_EXPORTER == "otlp":
+        return OTLPHttpExporter(TRACE_OTLP_ENDPOINT)
+    return None
+
+
+def setup_tracing(app, service_name: str, engine=None) -> None:
+    """Attiva il tracing sull'applicazione: middleware, exporter configurato e, se indicato, le query del database."""
+    global _processor
+    exporter = _create_exporter()
+    if exporter is not None and _processor is None:
+        _processor = BatchSpanProcessor(exporter, service_name, TRACE_EXPORT_INTERVAL, TRACE_MAX_QUEUE)
+        atexit.register(_processor.shutdown)
+    app.add_middleware(TracingMiddleware)
+    if engine is not None:
+        instrument_engine(engine)
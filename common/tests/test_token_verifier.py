@@ -0,0 +1,162 @@
+import asyncio
+import time
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+from healthmatch_common.token_verifier import TokenError, TokenVerifier
+
+JWKS_URL = "http://auth/.well-known/jwks.json"
+
+# Chiavi generate una sola volta: la generazione RSA è lenta
+RSA_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+NEW_RSA_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+ED25519_KEY = ed25519.Ed25519PrivateKey.generate()
+
+def public_jwk(kid, private_key):
+    algorithm, name = (OKPAlgorithm, "EdDSA") if isinstance(private_key, ed25519.Ed25519PrivateKey) else (RSAAlgorithm, "RS256")
+    jwk = algorithm.to_jwk(private_key.public_key(), as_dict=True)
+    jwk.update({"kid": kid, "alg": name, "use": "sig"})
+    return jwk
+
+def make_token(kid, private_key, algorithm="RS256", expires_in=600, **claims):
+    payload = {"sub": "user@example.com", "exp": int(time.time()) + expires_in, **claims}
+    return jwt.encode(payload, private_key, algorithm=algorithm, headers={"kid": kid})
+
+# Servizio Auth simulato: pubblica le chiavi presenti in `keys` e conta i download
+class FakeJWKS:
+    def __init__(self, **keys):
+        self.keys = keys
+        self.fetches = 0
+
+    def handler(self, request):
+        self.fetches += 1
+        return httpx.Response(200, json={"keys": [public_jwk(kid, key) for kid, key in self.keys.items()]})
+
+    def verifier(self, **options):
+        options.setdefault("min_refresh_interval", 0)
+        return TokenVerifier(
+            jwks_url=JWKS_URL,
+            transport=httpx.MockTransport(self.handler),
+            revocation_sync_interval=0,
+            **options,
+        )
+
+def verify_all(verifier, *tokens):
+    """Verifica i token in ordine; restituisce i claim oppure l'eccezione sollevata per ciascuno."""
+    async def scenario():
+        results = []
+        try:
+            for token in tokens:
+                try:
+                    results.append(await verifier.verify(token))
+                except TokenError as exc:
+                    results.append(exc)
+        finally:
+            await verifier.aclose()
+        return results
+
+    return asyncio.run(scenario())
+
+# Test per la verifica di token firmati con RS256 ed EdDSA
+def test_verify_valid_tokens():
+    auth = FakeJWKS(rsa=RSA_KEY, ed=ED25519_KEY)
+    rsa_claims, ed_claims, again = verify_all(
+        auth.verifier(),
+        make_token("rsa", RSA_KEY),
+        make_token("ed", ED25519_KEY, algorithm="EdDSA"),
+        make_token("rsa", RSA_KEY, role="admin"),
+    )
+    assert rsa_claims["sub"] == ed_claims["sub"] == "user@example.com"
+    assert again["role"] == "admin"
+    # Le chiavi in cache bastano per tutti i token
+    assert auth.fetches == 1
+
+# Test per un token firmato con una chiave non pubblicata
+def test_unknown_kid():
+    auth = FakeJWKS(rsa=RSA_KEY)
+    valid, unknown, forged = verify_all(
+        auth.verifier(min_refresh_interval=60),
+        make_token("rsa", RSA_KEY),
+        make_token("missing", NEW_RSA_KEY),
+        make_token("other", NEW_RSA_KEY),
+    )
+    assert valid["sub"] == "user@example.com"
+    assert isinstance(unknown, TokenError) and isinstance(forged, TokenError)
+    # I kid sconosciuti non causano più di un download per intervallo minimo
+    assert auth.fetches == 1
+
+# Test per un token scaduto
+def test_expired_token():
+    auth = FakeJWKS(rsa=RSA_KEY)
+    (expired,) = verify_all(auth.verifier(), make_token("rsa", RSA_KEY, expires_in=-60))
+    assert isinstance(expired, TokenError)
+    assert "expired" in str(expired)
+
+# Test per token con un algoritmo diverso da quello della chiave o non ammesso
+def test_wrong_algorithm():
+    auth = FakeJWKS(rsa=RSA_KEY, ed=ED25519_KEY)
+    # Token HS256 con il kid di una chiave RSA: l'algoritmo dell'header non corrisponde alla chiave
+    hs256 = jwt.encode(
+        {"sub": "attacker", "exp": int(time.time()) + 600},
+        "shared-secret",
+        algorithm="HS256",
+        headers={"kid": "rsa"},
+    )
+    # Token EdDSA che dichiara il kid di una chiave RSA
+    mismatch = make_token("rsa", ED25519_KEY, algorithm="EdDSA")
+    results = verify_all(auth.verifier(), hs256, mismatch)
+    assert all(isinstance(result, TokenError) for result in results)
+    assert all("Algoritmo" in str(result) for result in results)
+
+    # Una chiave valida ma con un algoritmo escluso dalla configurazione
+    (disabled,) = verify_all(auth.verifier(algorithms=["EdDSA"]), make_token("rsa", RSA_KEY))
+    assert isinstance(disabled, TokenError)
+
+# Test per la verifica dopo una rotazione delle chiavi di Auth
+def test_key_rotation():
+    auth = FakeJWKS(old=RSA_KEY)
+    verifier = auth.verifier()
+    old_token = make_token("old", RSA_KEY)
+    new_token = make_token("new", NEW_RSA_KEY)
+
+    async def scenario():
+        try:
+            assert (await verifier.verify(old_token))["sub"] == "user@example.com"
+            # Auth ruota la chiave e pubblica entrambe durante la sovrapposizione
+            auth.keys["new"] = NEW_RSA_KEY
+            assert (await verifier.verify(new_token))["sub"] == "user@example.com"
+            assert auth.fetches == 2
+            assert (await verifier.verify(old_token))["sub"] == "user@example.com"
+            assert auth.fetches == 2
+
+            # Terminata la sovrapposizione la vecchia chiave sparisce al download successivo
+            del auth.keys["old"]
+            verifier.cache_ttl = 0
+            with pytest.raises(TokenError):
+                await verifier.verify(old_token)
+            assert (await verifier.verify(new_token))["sub"] == "user@example.com"
+        finally:
+            await verifier.aclose()
+
+    asyncio.run(scenario())
+
+# Test per le chiavi già in cache quando Auth non risponde
+def test_keeps_keys_when_auth_is_down():
+    auth = FakeJWKS(rsa=RSA_KEY)
+    verifier = auth.verifier(cache_ttl=0)
+    token = make_token("rsa", RSA_KEY)
+
+    async def scenario():
+        try:
+            await verifier.verify(token)
+            verifier.transport = httpx.MockTransport(lambda request: httpx.Response(503))
+            await verifier.aclose()
+            return await verifier.verify(token)
+        finally:
+            await verifier.aclose()
+
+    assert asyncio.run(scenario())["sub"] == "user@example.com"
@@ -0,0 +1,119 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from healthmatch_common import tracing
+from healthmatch_common.tracing import (
+    BatchSpanProcessor, SpanExporter, TracedTransport, TracingMiddleware, parse_traceparent, start_span
+)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+# Exporter di prova: conserva gli span esportati
+class CollectingExporter(SpanExporter):
+    def __init__(self):
+        self.spans = []
+
+    def export(self, payload):
+        for resource in payload["resourceSpans"]:
+            for scope in resource["scopeSpans"]:
+                self.spans.extend(scope["spans"])
+
+@pytest.fixture
+def exporter(monkeypatch):
+    exporter = CollectingExporter()
+    processor = BatchSpanProcessor(exporter, "test", interval=60)
+    monkeypatch.setattr(tracing, "_processor", processor)
+    yield exporter
+    processor.shutdown()
+
+# Test per il parsing dell'header traceparent
+def test_parse_traceparent():
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (TRACE_ID, PARENT_ID, True)
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-00") == (TRACE_ID, PARENT_ID, False)
+    assert parse_traceparent(f" 00-{TRACE_ID.upper()}-{PARENT_ID}-03 ") == (TRACE_ID, PARENT_ID, True)
+
+    for invalid in (
+        None,
+        "",
+        "garbage",
+        f"01-{TRACE_ID}-{PARENT_ID}-01",
+        f"00-{'0' * 32}-{PARENT_ID}-01",
+        f"00-{TRACE_ID}-{'0' * 16}-01",
+        f"00-{TRACE_ID[:-1]}-{PARENT_ID}-01",
+    ):
+        assert parse_traceparent(invalid) is None
+
+# Test per la decisione di campionamento delle nuove trace
+def test_sample_ratio(exporter, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATIO", 0.0)
+    assert not any(start_span("root").sampled for _ in range(50))
+
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATIO", 1.0)
+    assert all(start_span("root").sampled for _ in range(50))
+
+    # Con un contesto in arrivo si segue la decisione del chiamante
+    assert not start_span("child", parent=(TRACE_ID, PARENT_ID, False)).sampled
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATIO", 0.0)
+    assert start_span("child", parent=(TRACE_ID, PARENT_ID, True)).sampled
+
+# Test per il campionamento senza exporter configurato: nessuno span registrato
+def test_no_sampling_without_exporter(monkeypatch):
+    monkeypatch.setattr(tracing, "_processor", None)
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATIO", 1.0)
+    assert not start_span("root").sampled
+    assert not start_span("child", parent=(TRACE_ID, PARENT_ID, True)).sampled
+
+# Test per la propagazione del traceparent sulle chiamate in uscita
+def test_traced_transport_propagates_traceparent(exporter, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATIO", 1.0)
+    received = []
+
+    def handler(request):
+        received.append(request.headers.get("traceparent"))
+        return httpx.Response(200)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=TracedTransport(httpx.MockTransport(handler))) as client:
+            # Fuori da una richiesta non c'è contesto da propagare
+            await client.get("http://users/api")
+            with start_span("request", parent=(TRACE_ID, PARENT_ID, True)) as span:
+                await client.get("http://users/api")
+            return span
+
+    span = asyncio.run(scenario())
+
+    assert received[0] is None
+    trace_id, parent_id, sampled = parse_traceparent(received[1])
+    assert trace_id == TRACE_ID
+    assert sampled
+    # Il servizio chiamato è figlio dello span client, a sua volta figlio della richiesta
+    tracing._processor.flush()
+    client_span = next(item for item in exporter.spans if item["name"] == "HTTP GET")
+    assert client_span["spanId"] == parent_id
+    assert client_span["parentSpanId"] == span.span_id
+
+# Test per il middleware: la richiesta prosegue la trace del chiamante
+def test_tracing_middleware_continues_trace(exporter):
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    client = TestClient(app)
+    response = client.get("/items/1", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+    assert response.status_code == 200
+
+    tracing._processor.flush()
+    server_span = exporter.spans[-1]
+    assert server_span["traceId"] == TRACE_ID
+    assert server_span["parentSpanId"] == PARENT_ID
+    attributes = {item["key"]: item["value"] for item in server_span["attributes"]}
+    assert attributes["http.route"] == {"stringValue": "/items/{item_id}"}
+    assert attributes["http.status_code"] == {"intValue": "200"}